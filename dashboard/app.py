@@ -1,10 +1,28 @@
 import os
 import io
 import json
+import hashlib
+import time
+import random
+import shutil
+import weakref
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import NamedTuple
 import requests
+from requests.adapters import HTTPAdapter
+import numpy as np
 import pandas as pd
 import streamlit as st
 
+try:
+    import pyarrow as pa  # Parquet para resultados de lotes grandes
+    import pyarrow.dataset as pa_dataset
+    import pyarrow.parquet as pa_parquet
+except ImportError:
+    pa = pa_dataset = pa_parquet = None
+
 
 st.set_page_config(page_title="Churn Alert Dashboard", page_icon="📊", layout="wide")
 st.title("Churn Alert Dashboard")
@@ -16,6 +34,11 @@ def get_api_base_url():
     return st.sidebar.text_input("API base URL", value=default_url, help="Ej: http://localhost:8080")
 
 
+def get_ds_base_url():
+    default_url = os.getenv("CHURN_DS_URL", "http://localhost:8000")
+    return st.sidebar.text_input("DS base URL", value=default_url, help="Servicio de modelo, para jobs por lotes. Ej: http://localhost:8000")
+
+
 def get_auth_token():
     preset = st.session_state.get("token") or ""
     return st.sidebar.text_input(
@@ -49,7 +72,7 @@ def login_quick(api_url: str):
         password = st.text_input("Password", value="Admin123!", type="password", key="login_password")
         if st.button("Obtener token", key="login_btn"):
             try:
-                resp = requests.post(
+                resp = get_http_session().post(
                     f"{api_url}/api/auth/login",
                     headers={"Content-Type": "application/json"},
                     data=json.dumps({"email": email, "password": password}),
@@ -71,38 +94,435 @@ def login_quick(api_url: str):
                 st.error(f"Error de red al hacer login: {e}")
 
 
+class ApiResponse(NamedTuple):
+    """Lo que guardamos en caché de una respuesta GET (un requests.Response no es reutilizable)."""
+    status_code: int
+    text: str
+
+    def json(self):
+        return json.loads(self.text)
+
+
+class TTLCache:
+    """Caché compartida entre sesiones para GET de solo lectura; segura para usar desde hilos."""
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._data: dict = {}
+        self._lock = threading.Lock()
+
+    def get_or_fetch(self, key, fetch):
+        now = time.monotonic()
+        with self._lock:
+            hit = self._data.get(key)
+            if hit is not None and hit[0] > now:
+                return hit[1]
+        value = fetch()
+        # Solo se guardan respuestas correctas; un error se reintenta en el siguiente rerun
+        if value.status_code == 200:
+            with self._lock:
+                self._data[key] = (now + self.ttl, value)
+        return value
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+
+API_CACHE_TTL = float(os.getenv("DASHBOARD_CACHE_TTL", "30"))
+
+
+@st.cache_resource
+def get_api_cache() -> TTLCache:
+    return TTLCache(API_CACHE_TTL)
+
+
+def invalidate_api_cache() -> None:
+    # Tras escribir en la base (predicción, lote, limpieza) las estadísticas en caché quedan viejas
+    get_api_cache().invalidate()
+
+
+def _cached_get(session: requests.Session, cache: TTLCache, api_url: str, path: str, token: str | None,
+                timeout: float) -> ApiResponse:
+    def fetch():
+        resp = session.get(f"{api_url}{path}", headers=build_headers(token), timeout=timeout)
+        return ApiResponse(resp.status_code, resp.text)
+
+    return cache.get_or_fetch((api_url, path, _normalize_token(token)), fetch)
+
+
 def call_predict(api_url: str, payload: dict, token: str | None):
     try:
-        resp = requests.post(f"{api_url}/api/churn/predict", headers=build_headers(token), data=json.dumps(payload), timeout=15)
+        resp = get_http_session().post(f"{api_url}/api/churn/predict", headers=build_headers(token), data=json.dumps(payload), timeout=15)
         return resp
     except requests.RequestException as e:
         st.error(f"Error de red al llamar predict: {e}")
         return None
 
 
-def call_stats(api_url: str, token: str | None):
+def fetch_stats_and_top_risk(api_url: str, token: str | None, with_stats: bool = True):
+    """Pide stats y top-risk a la vez (desde la caché si están frescas). Devuelve ((resp, error), (resp, error))."""
+    session = get_http_session()
+    cache = get_api_cache()
+
+    def outcome(fut):
+        if fut is None:
+            return None, None
+        try:
+            return fut.result(), None
+        except requests.RequestException as e:
+            return None, str(e)
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        stats_fut = executor.submit(_cached_get, session, cache, api_url, "/api/churn/stats", token, 10) if with_stats else None
+        top_fut = executor.submit(_cached_get, session, cache, api_url, "/api/churn/predictions/top-risk", token, 60)
+        return outcome(stats_fut), outcome(top_fut)
+
+
+UPLOAD_CONCURRENCY = int(os.getenv("DASHBOARD_UPLOAD_CONCURRENCY", "4"))
+UPLOAD_RETRIES = int(os.getenv("DASHBOARD_UPLOAD_RETRIES", "3"))
+UPLOAD_BACKOFF = float(os.getenv("DASHBOARD_UPLOAD_BACKOFF", "0.5"))
+# Estados que vale la pena reintentar (saturación o caída momentánea del backend)
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+
+@st.cache_resource
+def get_http_session(pool_size: int = 16) -> requests.Session:
+    # Sesión compartida: reutiliza conexiones keep-alive entre chunks y reruns
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def post_batch_chunk(session: requests.Session, api_url: str, csv_bytes: bytes, filename: str, token: str | None,
+                     retries: int = UPLOAD_RETRIES, backoff: float = UPLOAD_BACKOFF):
+    """Envía un chunk a batch/csv con reintentos. Devuelve (data, error, intentos).
+
+    Corre en hilos del pool, así que no llama a `st.*`.
+    """
+    headers = {}
+    norm = _normalize_token(token)
+    if norm:
+        headers["Authorization"] = f"Bearer {norm}"
+    error = None
+    for attempt in range(retries + 1):
+        delay = backoff * (2 ** attempt)
+        try:
+            files = {"file": (filename, io.BytesIO(csv_bytes), "text/csv")}
+            resp = session.post(f"{api_url}/api/churn/predict/batch/csv", headers=headers, files=files, timeout=300)
+            if resp.status_code == 200:
+                return resp.json(), None, attempt + 1
+            error = f"Error {resp.status_code}: {resp.text}"
+            if resp.status_code not in RETRY_STATUS:
+                return None, error, attempt + 1
+            retry_after = resp.headers.get("Retry-After", "")
+            if retry_after.isdigit():
+                delay = max(delay, float(retry_after))
+        except (requests.RequestException, ValueError) as e:
+            error = f"Error de red: {e}"
+        if attempt < retries:
+            time.sleep(delay + random.uniform(0, backoff))
+    return None, error, retries + 1
+
+
+def _chunk_csv_bytes(df: pd.DataFrame, start: int, chunk_size: int) -> bytes:
+    csv_buffer = io.StringIO()
+    df.iloc[start : start + chunk_size].to_csv(csv_buffer, index=False)
+    return csv_buffer.getvalue().encode("utf-8")
+
+
+def items_to_frame(items: list, first_row: int) -> pd.DataFrame:
+    """Aplana los `items` de un chunk a columnas tipadas; los textos repetidos como categorías."""
+    preds = [it.get("prediction") or {} for it in items]
+    return pd.DataFrame({
+        "row": pd.array(range(first_row, first_row + len(items)), dtype="int32"),
+        "prevision": pd.Categorical([it.get("prevision") for it in items]),
+        "probabilidad": pd.array([it.get("probabilidad") for it in items], dtype="Float64"),
+        "risk_level": pd.Categorical([p.get("risk_level") for p in preds]),
+        "will_churn": pd.array([p.get("will_churn") for p in preds], dtype="Int8"),
+        "confidence_score": pd.array([p.get("confidence_score") for p in preds], dtype="Float64"),
+        "suggested_action": pd.Categorical([(it.get("business_logic") or {}).get("suggested_action") for it in items]),
+        "top_features": pd.Categorical([", ".join(it.get("topFeatures") or it.get("top_features") or []) for it in items]),
+        "model_version": pd.Categorical([(it.get("metadata") or {}).get("model_version") for it in items]),
+        # Filas rechazadas por el DS: sin predicción, con "campo: mensaje"
+        "errors": pd.Categorical(["; ".join(f"{k}: {v}" for k, v in (it.get("errors") or {}).items()) for it in items]),
+    })
+
+
+# Columnas de items_to_frame en Parquet. Un esquema fijo para todos los chunks: el de pandas depende
+# de los valores (un chunk todo rechazado deja categorías vacías; más de 127 distintas cambian el índice)
+# y el dataset no podría leer los chunks juntos.
+_TEXT = pa.dictionary(pa.int32(), pa.string()) if pa is not None else None
+BATCH_SCHEMA = pa.schema([
+    ("row", pa.int32()),
+    ("prevision", _TEXT),
+    ("probabilidad", pa.float64()),
+    ("risk_level", _TEXT),
+    ("will_churn", pa.int8()),
+    ("confidence_score", pa.float64()),
+    ("suggested_action", _TEXT),
+    ("top_features", _TEXT),
+    ("model_version", _TEXT),
+    ("errors", _TEXT),
+]) if pa is not None else None
+
+
+class BatchResults:
+    """Resultados de un lote por chunk: Parquet en un directorio temporal (o DataFrames tipados sin pyarrow).
+
+    Nunca se guarda la lista de dicts por fila; el directorio se borra cuando la sesión suelta el objeto.
+    """
+
+    def __init__(self):
+        self.frames: dict = {}
+        self.levels: set = set()
+        self.dir = None
+        if pa_dataset is not None:
+            self.dir = tempfile.mkdtemp(prefix="churn-batch-")
+            weakref.finalize(self, shutil.rmtree, self.dir, True)
+
+    def put(self, index: int, frame: pd.DataFrame) -> None:
+        # Niveles de riesgo vistos, para el filtro sin releer el dataset en cada rerun
+        self.levels.update(frame["risk_level"].dropna().unique().tolist())
+        if self.dir is not None:
+            table = pa.Table.from_pandas(frame, schema=BATCH_SCHEMA, preserve_index=False).replace_schema_metadata(None)
+            pa_parquet.write_table(table, os.path.join(self.dir, f"chunk_{index:06d}.parquet"))
+        else:
+            self.frames[index] = frame
+
+    def load(self, risk_levels: list | None = None, sort: str | None = None) -> pd.DataFrame:
+        """Filas filtradas por nivel de riesgo y ordenadas por probabilidad (o por fila del archivo)."""
+        if self.dir is not None:
+            if not os.listdir(self.dir):
+                return pd.DataFrame()
+            dataset = pa_dataset.dataset(self.dir, format="parquet", schema=BATCH_SCHEMA)
+            flt = pa_dataset.field("risk_level").isin(risk_levels) if risk_levels else None
+            # Enteros y decimales con nulos como en items_to_frame (sin esto, float64 con NaN)
+            dtypes = {pa.float64(): pd.Float64Dtype(), pa.int8(): pd.Int8Dtype()}
+            df = dataset.to_table(filter=flt).to_pandas(types_mapper=dtypes.get)
+        else:
+            if not self.frames:
+                return pd.DataFrame()
+            df = pd.concat([self.frames[i] for i in sorted(self.frames)], ignore_index=True)
+            if risk_levels:
+                df = df[df["risk_level"].isin(risk_levels)]
+        if sort == "desc":
+            return df.sort_values("probabilidad", ascending=False, kind="stable", ignore_index=True)
+        if sort == "asc":
+            return df.sort_values("probabilidad", ascending=True, kind="stable", ignore_index=True)
+        return df.sort_values("row", kind="stable", ignore_index=True)
+
+    def risk_levels(self) -> list:
+        return sorted(self.levels)
+
+    def csv_file(self, risk_levels: list | None = None, sort: str | None = None):
+        # Se escribe a disco por bloques y se entrega como archivo, sin armar el CSV entero en memoria
+        out = tempfile.TemporaryFile()
+        df = self.load(risk_levels, sort)
+        for start in range(0, max(len(df), 1), 50000):
+            df.iloc[start:start + 50000].to_csv(out, index=False, header=(start == 0), encoding="utf-8")
+        out.seek(0)
+        return out
+
+
+def _upload_chunk(session, api_url, df, start, chunk_size, filename, token, retries, results: BatchResults):
+    # Serializa dentro del hilo: el siguiente chunk se prepara mientras otros están en vuelo
+    data, error, attempts = post_batch_chunk(session, api_url, _chunk_csv_bytes(df, start, chunk_size), filename, token, retries)
+    if data is None:
+        return None, error, attempts
+    # Los items se pasan a columnas en el hilo y solo se conserva el resumen del chunk
+    results.put(start // chunk_size, items_to_frame(data.get("items", []), start))
+    return {"total": data.get("total", 0), "cancelaciones": data.get("cancelaciones", 0)}, None, attempts
+
+
+def run_batch_upload(api_url: str, df: pd.DataFrame, filename: str, token: str | None, chunk_size: int,
+                     concurrency: int, retries: int, job: dict, progress_bar, status_text):
+    """Sube los chunks pendientes de `job` con hasta `concurrency` en vuelo.
+
+    `job["done"]` guarda el resumen de cada chunk por índice, `job["results"]` sus filas en columnas
+    y `job["failed"]` el último error; así un reintento solo reenvía lo que falló.
+    """
+    num_chunks = (len(df) + chunk_size - 1) // chunk_size
+    todo = iter([i for i in range(num_chunks) if i not in job["done"]])
+    rows_pending = sum(min(chunk_size, len(df) - i * chunk_size) for i in range(num_chunks) if i not in job["done"])
+    session = get_http_session(max(16, concurrency))
+    rows_sent = 0
+    retried = 0
+    started = time.perf_counter()
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        in_flight = {}
+
+        def submit_next():
+            i = next(todo, None)
+            if i is not None:
+                fut = executor.submit(_upload_chunk, session, api_url, df, i * chunk_size, chunk_size, filename, token,
+                                      retries, job["results"])
+                in_flight[fut] = i
+
+        for _ in range(concurrency):
+            submit_next()
+        while in_flight:
+            finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for fut in finished:
+                i = in_flight.pop(fut)
+                data, error, attempts = fut.result()
+                retried += attempts - 1
+                if data is not None:
+                    job["done"][i] = data
+                    job["failed"].pop(i, None)
+                else:
+                    job["failed"][i] = error
+                rows_sent += min(chunk_size, len(df) - i * chunk_size)
+                submit_next()
+
+            # Progreso, throughput y ETA (solo el hilo principal toca la UI)
+            elapsed = time.perf_counter() - started
+            rate = rows_sent / elapsed if elapsed > 0 else 0.0
+            eta = (rows_pending - rows_sent) / rate if rate > 0 else 0.0
+            progress_bar.progress((len(job["done"]) + len(job["failed"])) / num_chunks)
+            status_text.text(
+                f"Chunks {len(job['done'])}/{num_chunks} · {rate:,.0f} filas/s · ETA {eta:,.0f} s"
+                f" · en vuelo {len(in_flight)} · reintentos {retried} · fallidos {len(job['failed'])}"
+            )
+
+
+def call_submit_job(ds_url: str, csv_bytes: bytes, filename: str, chunk_size: int):
+    try:
+        files = {"file": (filename, io.BytesIO(csv_bytes), "text/csv")}
+        return get_http_session().post(f"{ds_url}/jobs", params={"chunk_size": chunk_size}, files=files, timeout=300)
+    except requests.RequestException as e:
+        st.error(f"Error de red al crear el job: {e}")
+        return None
+
+
+def call_job_status(ds_url: str, job_id: str):
     try:
-        resp = requests.get(f"{api_url}/api/churn/stats", headers=build_headers(token), timeout=10)
-        return resp
+        return get_http_session().get(f"{ds_url}/jobs/{job_id}", timeout=10)
     except requests.RequestException as e:
-        st.error(f"Error de red al llamar stats: {e}")
+        st.error(f"Error de red al consultar el job: {e}")
         return None
 
 
-def call_batch_csv(api_url: str, csv_bytes: bytes, filename: str, token: str | None):
+def call_job_results(ds_url: str, job_id: str, offset: int, limit: int):
     try:
-        headers = {}
-        norm = _normalize_token(token)
-        if norm:
-            headers["Authorization"] = f"Bearer {norm}"
-        files = {"file": (filename, io.BytesIO(csv_bytes), "text/csv")}
-        resp = requests.post(f"{api_url}/api/churn/predict/batch/csv", headers=headers, files=files, timeout=300)
-        return resp
+        return get_http_session().get(f"{ds_url}/jobs/{job_id}/results", params={"offset": offset, "limit": limit}, timeout=60)
+    except requests.RequestException as e:
+        st.error(f"Error de red al leer resultados: {e}")
+        return None
+
+
+def call_job_results_csv(ds_url: str, job_id: str):
+    try:
+        return get_http_session().get(f"{ds_url}/jobs/{job_id}/results", params={"format": "csv"}, timeout=300)
+    except requests.RequestException as e:
+        st.error(f"Error de red al descargar resultados: {e}")
+        return None
+
+
+def call_delete_job(ds_url: str, job_id: str):
+    try:
+        return get_http_session().delete(f"{ds_url}/jobs/{job_id}", timeout=10)
     except requests.RequestException as e:
-        st.error(f"Error de red al llamar batch CSV: {e}")
+        st.error(f"Error de red al eliminar el job: {e}")
         return None
 
 
+JOB_ACTIVE_STATES = ("queued", "running")
+
+
+def render_job_progress(ds_url: str, job_id: str):
+    resp = call_job_status(ds_url, job_id)
+    if resp is None:
+        return None
+    if resp.status_code != 200:
+        st.error(f"Error {resp.status_code}: {resp.text}")
+        return None
+    job = resp.json()
+    total = job.get("total_rows")
+    st.progress(min(max(job.get("progress", 0.0), 0.0), 1.0))
+    st.text(f"Estado: {job.get('state')} · filas {job.get('rows_done', 0)}/{total if total is not None else '?'}"
+            f" · chunks {job.get('chunks_done', 0)}")
+    if job.get("error"):
+        st.error(f"El job falló: {job['error']}")
+    return job
+
+
+def render_batch_job(ds_url: str):
+    """Batch como job del DS: el ID queda en la URL, así que recargar la pestaña retoma el seguimiento."""
+    job_id = st.query_params.get("job")
+    uploaded_job = st.file_uploader("Subir CSV", type=["csv"], key="job_csv")
+    if uploaded_job is not None:
+        job_chunk = int(st.number_input("Filas por chunk (checkpoint)", min_value=100, max_value=50000, value=5000, step=100))
+        if st.button("Enviar como job"):
+            resp = call_submit_job(ds_url, uploaded_job.getvalue(), uploaded_job.name, job_chunk)
+            if resp is not None and resp.status_code == 202:
+                job_id = resp.json()["job_id"]
+                st.query_params["job"] = job_id
+            elif resp is not None:
+                st.error(f"Error {resp.status_code}: {resp.text}")
+
+    if not job_id:
+        return
+    st.caption(f"Job `{job_id}`. El progreso se guarda en el DS; puedes recargar o cerrar la pestaña.")
+
+    # Mientras el job avanza, solo este fragmento se refresca cada 2 s
+    state = st.session_state.get(f"job_state:{job_id}", "queued")
+
+    @st.fragment(run_every=2 if state in JOB_ACTIVE_STATES else None)
+    def poll():
+        job = render_job_progress(ds_url, job_id)
+        new_state = job.get("state") if job else None
+        if new_state and new_state != st.session_state.get(f"job_state:{job_id}"):
+            st.session_state[f"job_state:{job_id}"] = new_state
+            if new_state not in JOB_ACTIVE_STATES:
+                st.rerun()
+
+    poll()
+
+    col_size, col_page = st.columns(2)
+    with col_size:
+        page_size = int(st.selectbox("Filas por página", options=[100, 500, 1000, 5000], index=2, key="job_page_size"))
+    with col_page:
+        page = int(st.number_input("Página", min_value=1, value=1, step=1, key="job_page"))
+    resp = call_job_results(ds_url, job_id, (page - 1) * page_size, page_size)
+    if resp is not None and resp.status_code == 200:
+        data = resp.json()
+        items = data.get("items", [])
+        st.caption(f"Filas disponibles: {data.get('rows_available', 0)}")
+        if items:
+            st.dataframe(pd.DataFrame([{
+                "row": it.get("row"),
+                "prevision": it.get("prevision"),
+                "probabilidad": it.get("probabilidad"),
+                "risk_level": it.get("prediction", {}).get("risk_level"),
+                "suggested_action": it.get("business_logic", {}).get("suggested_action"),
+                "top_features": ", ".join(it.get("top_features") or []),
+                "model_version": it.get("metadata", {}).get("model_version"),
+                # Filas rechazadas por el DS: sin predicción, con "campo: mensaje"
+                "errors": "; ".join(f"{k}: {v}" for k, v in (it.get("errors") or {}).items()),
+            } for it in items]), use_container_width=True)
+        else:
+            st.info("Aún no hay resultados en esta página.")
+    elif resp is not None:
+        st.error(f"Error {resp.status_code}: {resp.text}")
+
+    col_dl, col_del = st.columns(2)
+    with col_dl:
+        if st.button("Preparar descarga CSV"):
+            resp_csv = call_job_results_csv(ds_url, job_id)
+            if resp_csv is not None and resp_csv.status_code == 200:
+                st.download_button("Descargar resultados", data=resp_csv.content,
+                                   file_name=f"job_{job_id}.csv", mime="text/csv")
+    with col_del:
+        if st.button("Eliminar job"):
+            call_delete_job(ds_url, job_id)
+            st.query_params.pop("job", None)
+            st.rerun()
+
+
 def call_evaluate_csv(api_url: str, csv_bytes: bytes, filename: str, token: str | None):
     try:
         headers = {}
@@ -110,31 +530,96 @@ def call_evaluate_csv(api_url: str, csv_bytes: bytes, filename: str, token: str
         if norm:
             headers["Authorization"] = f"Bearer {norm}"
         files = {"file": (filename, io.BytesIO(csv_bytes), "text/csv")}
-        resp = requests.post(f"{api_url}/api/churn/evaluate/batch/csv", headers=headers, files=files, timeout=60)
+        resp = get_http_session().post(f"{api_url}/api/churn/evaluate/batch/csv", headers=headers, files=files, timeout=60)
         return resp
     except requests.RequestException as e:
         st.error(f"Error de red al llamar evaluación CSV: {e}")
         return None
 
-def call_top_risk(api_url: str, token: str | None):
-     try:
-         resp = requests.get(
-             f"{api_url}/api/churn/predictions/top-risk",
-             headers=build_headers(token),
-             timeout=60
-         )
-         return resp
-     except requests.RequestException as e:
-         st.error(f"Error al llamar top-risk: {e}")
-         return None
+def call_ds_predict_csv(ds_url: str, csv_bytes: bytes, filename: str):
+    # Predicción por lotes directa al DS (no se guarda en la base), resultado en CSV
+    try:
+        files = {"file": (filename, io.BytesIO(csv_bytes), "text/csv")}
+        return get_http_session().post(f"{ds_url}/predict/csv", params={"format": "csv"}, files=files, timeout=600)
+    except requests.RequestException as e:
+        st.error(f"Error de red al llamar al DS: {e}")
+        return None
+
+
+def read_csv_head(csv_bytes: bytes, rows: int = 20) -> pd.DataFrame:
+    # Solo se parsean las primeras filas: la vista previa no necesita el archivo completo
+    return pd.read_csv(io.BytesIO(csv_bytes), nrows=rows)
+
+
+def churn_labels(csv_bytes: bytes) -> np.ndarray:
+    """Columna Churn como booleano (Yes/1 = cancela), con las mismas reglas que la API."""
+    col = pd.read_csv(io.BytesIO(csv_bytes), usecols=lambda c: c.strip().lower() == "churn", dtype=str)
+    if col.shape[1] == 0:
+        raise ValueError("El CSV de evaluación debe incluir columna 'Churn' con valores 'Yes'/'No'.")
+    values = col.iloc[:, 0].fillna("").str.strip()
+    return (values.str.lower().eq("yes") | values.eq("1")).to_numpy()
+
+
+def confusion_metrics(y_true: np.ndarray, y_pred: np.ndarray) -> dict:
+    tp = int(np.count_nonzero(y_true & y_pred))
+    tn = int(np.count_nonzero(~y_true & ~y_pred))
+    fp = int(np.count_nonzero(~y_true & y_pred))
+    fn = int(np.count_nonzero(y_true & ~y_pred))
+    total = int(y_true.size)
+    precision = tp / (tp + fp) if tp + fp else 0.0
+    recall = tp / (tp + fn) if tp + fn else 0.0
+    return {
+        "total": total, "tp": tp, "tn": tn, "fp": fp, "fn": fn,
+        "accuracy": (tp + tn) / total if total else 0.0,
+        "precision": precision,
+        "recall": recall,
+        "f1": 2 * precision * recall / (precision + recall) if precision + recall else 0.0,
+    }
+
+
+def render_eval_metrics(data: dict):
+    st.success("Métricas de evaluación")
+    if data.get("rejected"):
+        st.warning(f"{data['rejected']} filas rechazadas por validación no se incluyen en las métricas.")
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        st.metric("Accuracy", f"{data.get('accuracy', 0):.3f}")
+        st.metric("Total", data.get("total", 0))
+    with col2:
+        st.metric("Precision", f"{data.get('precision', 0):.3f}")
+        st.metric("TP", data.get("tp", 0))
+    with col3:
+        st.metric("Recall", f"{data.get('recall', 0):.3f}")
+        st.metric("TN", data.get("tn", 0))
+    with col4:
+        st.metric("F1", f"{data.get('f1', 0):.3f}")
+        st.metric("FP/FN", f"{data.get('fp', 0)}/{data.get('fn', 0)}")
+    st.code(json.dumps(data, ensure_ascii=False, indent=2), language="json")
+
+
+EVAL_MEMO_SIZE = 8
+
+
+def eval_memo() -> dict:
+    # Resultados por (hash del contenido, modo, URL): un rerun no vuelve a evaluar el mismo archivo
+    return st.session_state.setdefault("eval_memo", {})
+
+
+def remember_eval(key, value) -> None:
+    memo = eval_memo()
+    memo[key] = value
+    while len(memo) > EVAL_MEMO_SIZE:
+        memo.pop(next(iter(memo)))
+
 
 def call_clear_predictions(api_url: str, token: str | None):
     try:
-        resp = requests.delete(
+        resp = get_http_session().delete(
             f"{api_url}/api/churn/predictions/clear",
             headers=build_headers(token),
             timeout=30
         )
+        invalidate_api_cache()
         return resp
     except requests.RequestException as e:
         st.error(f"Error al limpiar datos: {e}")
@@ -142,6 +627,7 @@ def call_clear_predictions(api_url: str, token: str | None):
 
 
 api_url = get_api_base_url()
+ds_url = get_ds_base_url()
 login_quick(api_url)
 token = get_auth_token()
 
@@ -212,6 +698,7 @@ with tab_individual:
             st.stop()
 
         if resp.status_code == 200:
+            invalidate_api_cache()
             data = resp.json()
             # Campos legacy
             prevision = data.get("prevision")
@@ -263,72 +750,94 @@ with tab_batch:
     st.caption(
         "Encabezados requeridos: gender,SeniorCitizen,Partner,Dependents,tenure,PhoneService,MultipleLines,InternetService,OnlineSecurity,OnlineBackup,DeviceProtection,TechSupport,StreamingTV,StreamingMovies,Contract,PaperlessBilling,PaymentMethod,MonthlyCharges,TotalCharges"
     )
-    # Requiere autenticación para el endpoint protegido
-    if not _normalize_token(token):
-        st.info("Este endpoint requiere autenticación. Usa 'Login rápido' en la barra lateral para obtener un token o pégalo manualmente.")
-        st.stop()
-    uploaded = st.file_uploader("Subir CSV", type=["csv"])
-
-    if uploaded is not None:
-
-        # Vista previa local
-        try:
-            df = pd.read_csv(uploaded)
-            st.dataframe(df.head(20), use_container_width=True)
-        except Exception as e:
-            st.warning(f"No se pudo leer el CSV para vista previa: {e}")
+    batch_modes = ["Chunks vía API", "Job reanudable en el DS"]
+    batch_mode = st.radio("Modo de procesamiento", batch_modes, horizontal=True,
+                          index=1 if st.query_params.get("job") else 0)
+    if batch_mode == batch_modes[1]:
+        render_batch_job(ds_url)
+    else:
+        # Requiere autenticación para el endpoint protegido
+        if not _normalize_token(token):
+            st.info("Este endpoint requiere autenticación. Usa 'Login rápido' en la barra lateral para obtener un token o pégalo manualmente.")
             st.stop()
+        uploaded = st.file_uploader("Subir CSV", type=["csv"])
 
-        if st.button("Iniciar procesamiento de lote"):
-            #tamaño de fragmento a procesar en dataset grandes
-            chunk_size = 800
-            results = []
-            total = 0
-            cancelaciones = 0
-
-            num_chunks = (len(df) + chunk_size - 1) // chunk_size
-            progress_bar = st.progress(0)
-            status_text = st.empty()
-
-            for i, start in enumerate(range(0, len(df), chunk_size)):
-                df_chunk = df.iloc[start : start + chunk_size]
-
-                # Convertir a CSV en memoria
-                csv_buffer = io.StringIO()
-                df_chunk.to_csv(csv_buffer, index=False)
-                csv_bytes = csv_buffer.getvalue().encode("utf-8")
+        if uploaded is not None:
 
-                # Enviar al backend **dentro del bucle**
-                resp = call_batch_csv(api_url, csv_bytes, uploaded.name, token)
-                if resp is None:
-                    st.stop()
-
-                if resp.status_code == 200:
-                    data = resp.json()
-                    items = data.get("items", [])
-                    results.extend(items)
-                    total += data.get("total", 0)
-                    cancelaciones += data.get("cancelaciones", 0)
-                elif resp.status_code == 400:
-                    try:
-                        err = resp.json()
-                        st.error(f"Error al procesar CSV en chunk {i+1}")
-                        st.code(json.dumps(err, ensure_ascii=False, indent=2), language="json")
-                    except Exception:
-                        st.error(f"Solicitud inválida: {resp.text}")
-                else:
-                    st.error(f"Error {resp.status_code} en chunk {i+1}: {resp.text}")
-
-                # Actualizar barra de progreso
-                progress_bar.progress((i + 1) / num_chunks)
-                status_text.text(f"Procesando chunk {i + 1} de {num_chunks}...")
-
-            # Mostrar resultados finales
-            st.success(f"Batch completo procesado: Total={total}, Cancelaciones={cancelaciones}")
+            # Vista previa local
             try:
-                st.dataframe(pd.DataFrame(results), use_container_width=True)
-            except Exception:
-                st.write(results)
+                df = pd.read_csv(uploaded)
+                st.dataframe(df.head(20), use_container_width=True)
+            except Exception as e:
+                st.warning(f"No se pudo leer el CSV para vista previa: {e}")
+                st.stop()
+
+            col_size, col_conc, col_retry = st.columns(3)
+            with col_size:
+                #tamaño de fragmento a procesar en dataset grandes
+                chunk_size = int(st.number_input("Filas por chunk", min_value=50, max_value=20000, value=800, step=50))
+            with col_conc:
+                concurrency = int(st.slider("Chunks en paralelo", min_value=1, max_value=16, value=UPLOAD_CONCURRENCY,
+                                            help="1 = envío secuencial"))
+            with col_retry:
+                retries = int(st.number_input("Reintentos por chunk", min_value=0, max_value=10, value=UPLOAD_RETRIES))
+
+            # Progreso por archivo y tamaño de chunk: sobrevive a reruns y permite reintentar solo lo fallido
+            job_key = f"batch_job:{uploaded.name}:{uploaded.size}:{chunk_size}"
+            job = st.session_state.get(job_key)
+
+            col_start, col_retry_failed = st.columns(2)
+            with col_start:
+                start_clicked = st.button("Iniciar procesamiento de lote")
+            with col_retry_failed:
+                retry_clicked = bool(job and job["failed"]) and st.button(f"Reintentar {len(job['failed'])} chunks fallidos")
+
+            if start_clicked or retry_clicked:
+                if start_clicked or job is None:
+                    job = {"done": {}, "failed": {}, "results": BatchResults()}
+                    st.session_state[job_key] = job
+                progress_bar = st.progress(0)
+                status_text = st.empty()
+                run_batch_upload(api_url, df, uploaded.name, token, chunk_size, concurrency, retries, job,
+                                 progress_bar, status_text)
+                if job["done"]:
+                    invalidate_api_cache()
+
+            if job and (job["done"] or job["failed"]):
+                for i, error in sorted(job["failed"].items()):
+                    st.error(f"Chunk {i + 1} falló: {error}")
+
+                total = sum(d.get("total", 0) for d in job["done"].values())
+                cancelaciones = sum(d.get("cancelaciones", 0) for d in job["done"].values())
+                if job["failed"]:
+                    st.warning(f"Batch parcial: Total={total}, Cancelaciones={cancelaciones}. Reintenta los chunks fallidos.")
+                else:
+                    st.success(f"Batch completo procesado: Total={total}, Cancelaciones={cancelaciones}")
+
+                # Solo la página visible llega al navegador; filtro y orden se hacen aquí sobre las columnas
+                results = job["results"]
+                col_risk, col_sort, col_psize = st.columns(3)
+                with col_risk:
+                    risk_filter = st.multiselect("Nivel de riesgo", options=results.risk_levels(), key="batch_risk")
+                with col_sort:
+                    sort_labels = {"Orden del archivo": None, "Probabilidad (mayor primero)": "desc",
+                                   "Probabilidad (menor primero)": "asc"}
+                    sort = sort_labels[st.selectbox("Ordenar por", options=list(sort_labels), key="batch_sort")]
+                with col_psize:
+                    page_size = int(st.selectbox("Filas por página", options=[100, 500, 1000, 5000], index=1,
+                                                 key="batch_page_size"))
+                view = results.load(risk_filter, sort)
+                num_pages = max(1, (len(view) + page_size - 1) // page_size)
+                page = int(st.number_input(f"Página (de {num_pages})", min_value=1, max_value=num_pages, value=1,
+                                           step=1, key="batch_page"))
+                st.caption(f"{len(view)} filas")
+                st.dataframe(view.iloc[(page - 1) * page_size : page * page_size], use_container_width=True)
+                st.download_button(
+                    "Descargar resultados (CSV)",
+                    data=lambda: results.csv_file(risk_filter, sort),
+                    file_name=f"resultados_{os.path.splitext(uploaded.name)[0]}.csv",
+                    mime="text/csv",
+                )
 
 
 
@@ -337,48 +846,87 @@ with tab_evaluate:
     st.caption(
         "Sube un CSV extendido con las 20 columnas canónicas y la columna 'Churn' (Yes/No)."
     )
-    if not _normalize_token(token):
+    eval_modes = ["API (servidor)", "Local (predicciones del DS)"]
+    eval_mode = st.radio("Modo de evaluación", eval_modes, horizontal=True,
+                         help="Local: pide las predicciones por lotes al DS y calcula la matriz de confusión aquí.")
+    if eval_mode == eval_modes[0] and not _normalize_token(token):
         st.info("Este endpoint requiere autenticación. Usa 'Login rápido' en la barra lateral para obtener un token o pégalo manualmente.")
         st.stop()
     uploaded_eval = st.file_uploader("Subir CSV etiquetado", type=["csv"], key="eval_csv")
     if uploaded_eval is not None:
+        eval_bytes = uploaded_eval.getvalue()
         try:
-            df_preview = pd.read_csv(uploaded_eval)
-            st.dataframe(df_preview.head(20), use_container_width=True)
+            st.dataframe(read_csv_head(eval_bytes), use_container_width=True)
         except Exception as e:
             st.warning(f"No se pudo leer el CSV para vista previa: {e}")
 
-        resp = call_evaluate_csv(api_url, uploaded_eval.getvalue(), uploaded_eval.name, token)
-        if resp is None:
-            st.stop()
-        if resp.status_code == 200:
-            data = resp.json()
-            st.success("Métricas de evaluación")
-            col1, col2, col3, col4 = st.columns(4)
-            with col1:
-                st.metric("Accuracy", f"{data.get('accuracy', 0):.3f}")
-                st.metric("Total", data.get("total", 0))
-            with col2:
-                st.metric("Precision", f"{data.get('precision', 0):.3f}")
-                st.metric("TP", data.get("tp", 0))
-            with col3:
-                st.metric("Recall", f"{data.get('recall', 0):.3f}")
-                st.metric("TN", data.get("tn", 0))
-            with col4:
-                st.metric("F1", f"{data.get('f1', 0):.3f}")
-                st.metric("FP/FN", f"{data.get('fp', 0)}/{data.get('fn', 0)}")
-            st.code(json.dumps(data, ensure_ascii=False, indent=2), language="json")
-        elif resp.status_code == 400:
-            try:
-                err = resp.json()
-                st.error("Error de evaluación")
-                st.code(json.dumps(err, ensure_ascii=False, indent=2), language="json")
-            except Exception:
-                st.error(f"Solicitud inválida: {resp.text}")
-        elif resp.status_code == 401:
-            st.error("No autorizado. Verifica el token en la barra lateral.")
+        digest = hashlib.sha256(eval_bytes).hexdigest()
+        if eval_mode == eval_modes[0]:
+            memo_key = (digest, "api", api_url)
         else:
-            st.error(f"Error {resp.status_code}: {resp.text}")
+            memo_key = (digest, "local", ds_url)
+        result = eval_memo().get(memo_key)
+        if result is None:
+            if st.button("Evaluar"):
+                if eval_mode == eval_modes[0]:
+                    with st.spinner("Evaluando en el servidor..."):
+                        resp = call_evaluate_csv(api_url, eval_bytes, uploaded_eval.name, token)
+                    if resp is None:
+                        st.stop()
+                    result = {"status_code": resp.status_code, "text": resp.text}
+                    # Solo se memoriza un resultado válido; los errores se pueden reintentar
+                    if resp.status_code == 200:
+                        remember_eval(memo_key, result)
+                else:
+                    try:
+                        y_true = churn_labels(eval_bytes)
+                    except ValueError as e:
+                        st.error(str(e))
+                        st.stop()
+                    with st.spinner("Obteniendo predicciones del DS..."):
+                        resp = call_ds_predict_csv(ds_url, eval_bytes, uploaded_eval.name)
+                    if resp is None:
+                        st.stop()
+                    if resp.status_code != 200:
+                        st.error(f"Error {resp.status_code}: {resp.text}")
+                        st.stop()
+                    probs = pd.read_csv(io.BytesIO(resp.content), usecols=lambda c: c in ("row", "probabilidad", "errors"),
+                                        dtype={"errors": "string"}).sort_values("row")
+                    if len(probs) != len(y_true):
+                        st.error(f"El DS devolvió {len(probs)} predicciones para {len(y_true)} filas etiquetadas.")
+                        st.stop()
+                    # Filas rechazadas por validación: sin probabilidad, fuera de la matriz (como `rejected` en /evaluate)
+                    scored = probs["probabilidad"].notna().to_numpy()
+                    if "errors" in probs:
+                        scored = scored & probs["errors"].fillna("").str.strip().eq("").to_numpy()
+                    result = {"y_true": y_true[scored], "probs": probs["probabilidad"].to_numpy(dtype=float)[scored],
+                              "rejected": int(np.count_nonzero(~scored))}
+                    remember_eval(memo_key, result)
+            else:
+                st.caption("Pulsa Evaluar para procesar el archivo. El resultado queda guardado para este contenido.")
+        else:
+            st.caption("Resultado guardado para este archivo (mismo contenido); no se vuelve a evaluar.")
+
+        if result is not None and "probs" in result:
+            # Umbral ajustable: la matriz se recalcula con NumPy sin volver a pedir predicciones
+            threshold = st.slider("Umbral de cancelación", min_value=0.05, max_value=0.95, value=0.5, step=0.05)
+            render_eval_metrics({**confusion_metrics(result["y_true"], result["probs"] >= threshold),
+                                 "threshold": threshold, "rejected": result.get("rejected", 0)})
+        elif result is not None:
+            status_code = result["status_code"]
+            if status_code == 200:
+                render_eval_metrics(json.loads(result["text"]))
+            elif status_code == 400:
+                try:
+                    err = json.loads(result["text"])
+                    st.error("Error de evaluación")
+                    st.code(json.dumps(err, ensure_ascii=False, indent=2), language="json")
+                except Exception:
+                    st.error(f"Solicitud inválida: {result['text']}")
+            elif status_code == 401:
+                st.error("No autorizado. Verifica el token en la barra lateral.")
+            else:
+                st.error(f"Error {status_code}: {result['text']}")
 
 
 with tab_stats:
@@ -418,6 +966,11 @@ with tab_stats:
 
     st.divider()
 
+    # Stats y top-risk son independientes: se piden en paralelo y con caché de corta duración
+    (resp_stats, stats_error), (resp_top, top_error) = fetch_stats_and_top_risk(
+        api_url, token, with_stats=st.session_state.get("df_csv") is None
+    )
+
     if st.session_state.get("df_csv") is not None:
         df = st.session_state["df_csv"]
         st.success("Mostrando datos desde CSV (modo prueba)")
@@ -444,7 +997,9 @@ with tab_stats:
     else:
         st.info("Mostrando datos desde la base de datos")
 
-        resp = call_stats(api_url, token)
+        resp = resp_stats
+        if stats_error:
+            st.error(f"Error de red al llamar stats: {stats_error}")
         if not resp or resp.status_code != 200:
             st.warning("No se pudieron obtener estadísticas")
             st.stop()
@@ -492,7 +1047,9 @@ with tab_stats:
     st.subheader("Top 20 clientes con mayor riesgo de cancelación")
 
 
-    resp = call_top_risk(api_url, token)
+    resp = resp_top
+    if top_error:
+        st.error(f"Error al llamar top-risk: {top_error}")
 
     if resp and resp.status_code == 200:
         data = resp.json()
@@ -1,17 +1,73 @@
 import os
+import io
+import csv
+import json
+import itertools
 import math
-from typing import Tuple, List, Optional
+import time
+import tempfile
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Dict, Tuple, List, Optional, Iterator, NamedTuple, Union
 
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, stream_with_context, g
+
+import wire
+from jobs import JobStore
+from schema import SCHEMA
+from parallel import MissingColumnsError, ParallelScorer
+from evaluate import churn_labels, evaluate_scores, find_label_column, threshold_grid, DEFAULT_BINS
 
 try:
     import joblib  # type: ignore
 except Exception:
     joblib = None
 
+try:
+    import prometheus_client  # type: ignore
+    from prometheus_client import Counter, Gauge, Histogram
+except Exception:
+    prometheus_client = None
+
 app = Flask(__name__)
 
 
+# Metrics (Prometheus). Under Gunicorn, PROMETHEUS_MULTIPROC_DIR aggregates all workers.
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+ROWS_BUCKETS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 5000, 10000, 50000)
+
+if prometheus_client is not None:
+    STAGE_SECONDS = Histogram("ds_stage_seconds", "Time spent per scoring stage",
+                              ["stage", "model_version"], buckets=LATENCY_BUCKETS)
+    REQUEST_SECONDS = Histogram("ds_request_seconds", "End-to-end request latency",
+                                ["endpoint", "status"], buckets=LATENCY_BUCKETS)
+    PREDICTIONS = Counter("ds_predictions_total", "Rows scored by source (model, heuristic, cache)",
+                          ["source", "model_version"])
+    MODEL_ERRORS = Counter("ds_model_errors_total", "Model calls that failed and fell back to the heuristic",
+                           ["model_version"])
+    ENCODE_FAILURES = Counter("ds_encode_failures_total", "Rows the encoder rejected (scored by the heuristic)",
+                              ["model_version"])
+    INVALID_ROWS = Counter("ds_invalid_rows_total", "Rows rejected by schema validation, by failing field",
+                           ["field"])
+    BATCH_ROWS = Histogram("ds_batch_rows", "Rows per model call", ["model_version"], buckets=ROWS_BUCKETS)
+    MICROBATCH_ROWS = Histogram("ds_microbatch_rows", "Requests coalesced per micro-batch", buckets=ROWS_BUCKETS)
+    CACHE_LOOKUPS = Counter("ds_cache_lookups_total", "Prediction cache lookups", ["result"])
+    CACHE_SIZE = Gauge("ds_cache_entries", "Entries in the prediction cache", multiprocess_mode="livesum")
+    MODEL_INFO = Gauge("ds_model_info", "Model version served by this process", ["model_version"],
+                       multiprocess_mode="liveall")
+
+
+@contextmanager
+def _stage(stage: str, version: str):
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        if prometheus_client is not None:
+            STAGE_SECONDS.labels(stage, version).observe(time.perf_counter() - t0)
+
+
 # Heuristic fallback model (canonical fields)
 def heuristic_score(features: dict) -> Tuple[str, float, List[str]]:
     tenure = float(features.get("tenure", 0) or 0)
@@ -41,13 +97,59 @@ def heuristic_score(features: dict) -> Tuple[str, float, List[str]]:
     return label, p, top
 
 
-# Optional trained model loading
-MODEL = None
-FEATURE_NAMES: Optional[List[str]] = None
-MODEL_VERSION: str = "v1.0"
+HEURISTIC_FIELDS = ("tenure", "MonthlyCharges", "TotalCharges", "SeniorCitizen", "Contract", "OnlineSecurity")
+HEURISTIC_TOP = ("tenure", "Contract", "OnlineSecurity")
+
+
+def heuristic_columns(rows: List[dict]) -> dict:
+    """Column-oriented view of the fields the heuristic reads (missing keys become None)."""
+    return {field: [r.get(field) for r in rows] for field in HEURISTIC_FIELDS}
+
+
+def _heuristic_column(columns: dict, field: str, n: int, empty):
+    import numpy as np
+    # Object column with the scalar path's `value or default` applied
+    col = np.empty(n, dtype=object)
+    values = columns.get(field)
+    col[:] = values if values is not None else None
+    col[np.equal(col, None) | np.equal(col, "") | np.equal(col, 0)] = empty
+    return col
+
+
+def heuristic_score_batch(columns: dict):
+    """Vectorized `heuristic_score` over a column-oriented batch (see `heuristic_columns`).
+
+    Returns (probabilities, labels, top features) with the same values as calling
+    `heuristic_score` row by row, and raises ValueError on the same unparseable input.
+    """
+    import numpy as np
+    n = max((len(v) for v in columns.values() if v is not None), default=0)
+    tenure = _heuristic_column(columns, "tenure", n, 0).astype(float)
+    monthly = _heuristic_column(columns, "MonthlyCharges", n, 0.0).astype(float)
+    total = _heuristic_column(columns, "TotalCharges", n, 0.0).astype(float)
+    senior = _heuristic_column(columns, "SeniorCitizen", n, 0).astype(np.int64)
+    contract = _heuristic_column(columns, "Contract", n, "")
+    online_security = _heuristic_column(columns, "OnlineSecurity", n, "")
+
+    c_tenure = -0.03 * tenure
+    c_monthly = -0.01 * monthly
+    c_total = -0.005 * total
+    c_senior = np.where(senior == 1, 0.1, 0.0)
+    c_contract = np.where(contract == "Month-to-month", 0.15, np.where(contract == "Two year", -0.05, 0.0))
+    c_security = np.where(online_security == "No", 0.08, 0.0)
 
+    # Same left-to-right summation order as the scalar path, so every z is bit-identical
+    z = -1.0 + c_tenure + c_monthly + c_total + c_senior + c_contract + c_security
+    # np.exp can differ from math.exp in the last ulp; map the libm exp to stay exact
+    e = np.fromiter(map(math.exp, (-z).tolist()), dtype=float, count=n)
+    p = 1.0 / (1.0 + e)
+    labels = np.where(p >= 0.5, "Va a cancelar", "Va a continuar").tolist()
 
-# plan no longer used
+    # Descending by |contribution|, ties keep HEURISTIC_TOP order (like the stable sorted())
+    contrib = np.abs(np.stack([c_tenure, c_contract, c_security], axis=1))
+    order = np.argsort(-contrib, axis=1, kind="stable")
+    names = np.array(HEURISTIC_TOP, dtype=object)
+    return p, labels, names[order].tolist()
 
 
 def _to_vector(features: dict, names: List[str]) -> List[float]:
@@ -62,227 +164,1080 @@ def _to_vector(features: dict, names: List[str]) -> List[float]:
     return vec
 
 
-def load_model():
-    global MODEL, FEATURE_NAMES, MODEL_VERSION
-    model_dir = os.getenv("CHURN_MODEL_DIR", "/models")
-    v2_path = os.path.join(model_dir, "pipeline_churn_v2.joblib")
+# The v2 pipeline expects these exact 32 features based on its feature_names_in_
+EXPECTED_COLS: List[str] = [
+    'tenure', 'MonthlyCharges', 'TotalCharges', 'gender_Male', 'SeniorCitizen_1',
+    'SeniorCitizen_No', 'SeniorCitizen_Yes', 'Partner_Yes', 'Dependents_Yes',
+    'PhoneService_Yes', 'MultipleLines_No phone service', 'MultipleLines_Yes',
+    'InternetService_Fiber optic', 'InternetService_No',
+    'OnlineSecurity_No internet service', 'OnlineSecurity_Yes',
+    'OnlineBackup_No internet service', 'OnlineBackup_Yes',
+    'DeviceProtection_No internet service', 'DeviceProtection_Yes',
+    'TechSupport_No internet service', 'TechSupport_Yes',
+    'StreamingTV_No internet service', 'StreamingTV_Yes',
+    'StreamingMovies_No internet service', 'StreamingMovies_Yes',
+    'Contract_One year', 'Contract_Two year', 'PaperlessBilling_Yes',
+    'PaymentMethod_Credit card (automatic)', 'PaymentMethod_Electronic check',
+    'PaymentMethod_Mailed check'
+]
+
+DEFAULT_TOP_FEATURES: List[str] = ["tenure", "Contract", "OnlineSecurity"]
+
+# Canonical CSV schema shared with /api/churn/predict/batch/csv (extra columns are ignored)
+CANONICAL_FIELDS: List[str] = [
+    "gender", "SeniorCitizen", "Partner", "Dependents", "tenure", "PhoneService", "MultipleLines",
+    "InternetService", "OnlineSecurity", "OnlineBackup", "DeviceProtection", "TechSupport",
+    "StreamingTV", "StreamingMovies", "Contract", "PaperlessBilling", "PaymentMethod",
+    "MonthlyCharges", "TotalCharges"
+]
+
+
+class FeatureEncoder:
+    """Precompiled (field, value) -> column index mapping for the v2 pipeline.
+
+    Built once per loaded model and writes straight into a preallocated NumPy
+    row/matrix. Produces exactly the same values as the original dict mapping,
+    including the SeniorCitizen_1/_No/_Yes quirks.
+    """
+
+    NUMERIC_DEFAULTS = {"tenure": 0, "MonthlyCharges": 0.0, "TotalCharges": 0.0}
+    # SeniorCitizen is matched case-insensitively and sets more than one dummy
+    SENIOR_ALIASES = {
+        "1": ("SeniorCitizen_1", "SeniorCitizen_Yes"),
+        "1.0": ("SeniorCitizen_1", "SeniorCitizen_Yes"),
+        "yes": ("SeniorCitizen_Yes",),
+        "0": ("SeniorCitizen_No",),
+        "no": ("SeniorCitizen_No",),
+        "0.0": ("SeniorCitizen_No",),
+    }
+
+    def __init__(self, columns: List[str]):
+        self.columns = list(columns)
+        index = {c: i for i, c in enumerate(self.columns)}
+        self.numeric: List[Tuple[str, float, int]] = [
+            (c, self.NUMERIC_DEFAULTS[c], i) for i, c in enumerate(self.columns) if c in self.NUMERIC_DEFAULTS
+        ]
+        tables: dict = {}
+        for i, col in enumerate(self.columns):
+            if col in self.NUMERIC_DEFAULTS or "_" not in col:
+                continue
+            field, value = col.split("_", 1)
+            if field == "SeniorCitizen":
+                continue
+            tables.setdefault(field, {}).setdefault(value, []).append(i)
+        # (field, lowercase lookup?, value -> column indexes)
+        self.categorical: List[Tuple[str, bool, dict]] = [
+            (field, False, {v: tuple(ix) for v, ix in table.items()}) for field, table in tables.items()
+        ]
+        senior = {}
+        for raw, cols in self.SENIOR_ALIASES.items():
+            ix = tuple(index[c] for c in cols if c in index)
+            if ix:
+                senior[raw] = ix
+        if senior:
+            self.categorical.append(("SeniorCitizen", True, senior))
+        self.width = len(self.columns)
+
+    def encode_into(self, features: dict, out) -> None:
+        # `out` must be a zeroed row; raises ValueError/TypeError on bad numerics
+        for field, default, i in self.numeric:
+            v = features.get(field)
+            out[i] = float(default if v is None else v)
+        for field, lower, table in self.categorical:
+            v = features.get(field)
+            s = "" if v is None else str(v)
+            hit = table.get(s.lower() if lower else s)
+            if hit:
+                for i in hit:
+                    out[i] = 1.0
+
+    def encode(self, rows: List[dict]):
+        """Encode a list of feature dicts; returns (matrix, positions of encoded rows)."""
+        import numpy as np
+        X = np.zeros((len(rows), self.width), dtype=np.float64)
+        positions: List[int] = []
+        n = 0
+        for i, features in enumerate(rows):
+            try:
+                self.encode_into(features, X[n])
+            except (TypeError, ValueError):
+                X[n] = 0.0
+                continue
+            positions.append(i)
+            n += 1
+        return X[:n], positions
+
+
+def _model_input(X, model, encoder: FeatureEncoder):
+    # Pipelines fitted on a DataFrame select columns by name; wrap the matrix without copying
+    if hasattr(model, "feature_names_in_"):
+        import pandas as pd
+        return pd.DataFrame(X, columns=encoder.columns, copy=False)
+    return X
+
+
+class PredictionCache:
+    """Thread-safe LRU of (label, probability, top features) keyed on the canonical feature tuple.
+
+    Entries expire after `ttl` seconds; `maxsize` 0 disables the cache.
+    """
+
+    NUMERIC_FIELDS = ("tenure", "MonthlyCharges", "TotalCharges")
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data: "OrderedDict[tuple, Tuple[float, Tuple[str, float, List[str]]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def key(self, features: dict, generation: int) -> tuple:
+        parts = []
+        for f in CANONICAL_FIELDS:
+            v = features.get(f)
+            if f in self.NUMERIC_FIELDS and v is not None:
+                try:
+                    v = float(v)
+                except (TypeError, ValueError):
+                    v = str(v)
+            else:
+                v = "" if v is None else str(v)
+            parts.append(v)
+        return (generation, tuple(parts))
+
+    def get(self, key: tuple) -> Optional[Tuple[str, float, List[str]]]:
+        if self.maxsize <= 0:
+            return None
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._data[key]
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key: tuple, value: Tuple[str, float, List[str]]) -> None:
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"size": len(self._data), "maxsize": self.maxsize, "ttl": self.ttl,
+                    "hits": self.hits, "misses": self.misses}
+
+
+PREDICTION_CACHE = PredictionCache(
+    maxsize=int(os.getenv("DS_CACHE_SIZE", "10000")),
+    ttl=float(os.getenv("DS_CACHE_TTL", "300")),
+)
+
+
+
+def _probabilities(X, model) -> List[float]:
+    # One model call for the whole matrix/DataFrame
+    if hasattr(model, "predict_proba"):
+        proba = model.predict_proba(X)
+        col = 1 if proba.shape[1] > 1 else 0
+        return [float(p) for p in proba[:, col]]
+    if hasattr(model, "decision_function"):
+        return [1.0 / (1.0 + math.exp(-float(z))) for z in model.decision_function(X)]
+    return [0.8 if int(pred) == 1 else 0.2 for pred in model.predict(X)]
+
+
+def base_col(name: str) -> str:
+    # Improved mapping for OneHotEncoder (cat__col_val) or others
+    tail = name.split("__", 1)[1] if "__" in name else name
+    return tail.split("_", 1)[0]
+
+
+class AttributionEngine:
+    """Per-model top-feature attribution computed on the already transformed matrix.
+
+    The transformed-column -> base-feature grouping is folded once into a
+    (n_transformed x n_groups) matrix of |weight|, so a whole batch is
+    attributed with a single matrix product: |X_tr| @ M.
+    """
+
+    def __init__(self, preproc, clf, weights):
+        import numpy as np
+        fnames = list(preproc.get_feature_names_out())
+        n = min(len(fnames), len(weights))
+        self.preproc = preproc
+        self.clf = clf
+        self.groups: List[str] = []
+        index: dict = {}
+        for name in fnames[:n]:
+            b = base_col(name)
+            if b not in index:
+                index[b] = len(self.groups)
+                self.groups.append(b)
+        self.n_features = n
+        self.matrix = np.zeros((n, len(self.groups)), dtype=np.float64)
+        for i, name in enumerate(fnames[:n]):
+            self.matrix[i, index[base_col(name)]] = abs(float(weights[i]))
+
+    @classmethod
+    def from_pipeline(cls, pipe) -> Optional["AttributionEngine"]:
+        named = getattr(pipe, "named_steps", {})
+        preproc = named.get("preprocessor") or named.get("columntransformer")
+        clf = named.get("logisticregression") or named.get("classifier") or named.get("model")
+        steps = getattr(pipe, "steps", None)
+        if preproc is None and steps and len(steps) > 1:
+            # Generic Pipeline: everything but the final estimator is preprocessing
+            preproc = pipe[:-1]
+            clf = clf or steps[-1][1]
+        if preproc is None or clf is None or not hasattr(preproc, "get_feature_names_out"):
+            return None
+        # Try to get weights/importances
+        weights = None
+        if hasattr(clf, "coef_"):
+            weights = clf.coef_[0]
+        elif hasattr(clf, "feature_importances_"):
+            weights = clf.feature_importances_
+        if weights is None:
+            print(f"Classifier {type(clf)} has no coef_ or feature_importances_")
+            return None
+        return cls(preproc, clf, weights)
+
+    def transform(self, X):
+        return self.preproc.transform(X)
+
+    def top_features(self, X_tr, k: int = 3) -> List[List[str]]:
+        import numpy as np
+        if hasattr(X_tr, "toarray"):
+            contrib = abs(X_tr[:, :self.n_features]) @ self.matrix
+            contrib = np.asarray(contrib)
+        else:
+            contrib = np.abs(np.asarray(X_tr, dtype=np.float64)[:, :self.n_features]) @ self.matrix
+        # Stable sort keeps first-seen order on ties, like the original grouping
+        order = np.argsort(-contrib, axis=1, kind="stable")[:, :k]
+        return [[self.groups[j] for j in row] for row in order]
+
+
+class LinearKernel:
+    """Linear pipeline folded into per-field lookup tables: logit = intercept + sum of field terms.
+
+    Compiled once per loaded model from the affine preprocessor (scalers, passthrough) and the
+    classifier coefficients. A categorical field contributes table[value]; a numeric one
+    slope * value + offset. Contributions are taken in the transformed space, so each is the
+    field's exact share of the logit and the top features are the largest |contribution|.
+    Small requests go through the tables; large batches use the same terms as one product
+    of the encoded matrix with `matrix` (n_encoded x n_fields).
+    """
+
+    name = "linear-lut"
+    # Up to this many rows the dict lookups beat encoding a matrix
+    LOOKUP_ROWS = 32
+
+    def __init__(self, encoder: FeatureEncoder, fields: List[str], matrix, offsets, intercept: float):
+        self.encoder = encoder
+        # Field order is the first-seen order of the transformed columns (top-feature tie-break)
+        self.fields = fields
+        self.matrix = matrix
+        self.offsets = offsets
+        self.intercept = intercept
+        col = {f: k for k, f in enumerate(fields)}
+        # (field, default, slope, offset, position) and (field, lowercase?, value -> term, miss term, position)
+        self.numeric = [(f, d, float(matrix[i, col[f]]), float(offsets[col[f]]), col[f])
+                        for f, d, i in encoder.numeric if f in col]
+        self.categorical = [
+            (f, lower, {v: float(offsets[col[f]] + matrix[list(hit), col[f]].sum()) for v, hit in table.items()},
+             float(offsets[col[f]]), col[f])
+            for f, lower, table in encoder.categorical if f in col
+        ]
+
+    @classmethod
+    def compile(cls, model, encoder: Optional[FeatureEncoder], attribution: Optional[AttributionEngine]
+                ) -> Optional["LinearKernel"]:
+        """Kernel for a linear model, or None (the caller keeps the full pipeline)."""
+        import numpy as np
+        if attribution is None or encoder is None:
+            return None
+        preproc, clf = attribution.preproc, attribution.clf
+        coef = getattr(clf, "coef_", None)
+        intercept = getattr(clf, "intercept_", getattr(clf, "intercept", None))
+        if coef is None or intercept is None or np.asarray(coef).ndim > 1 and np.asarray(coef).shape[0] != 1:
+            return None
+        w = np.asarray(coef, dtype=np.float64).reshape(-1)
+        if hasattr(preproc, "A"):
+            A, b = np.asarray(preproc.A, dtype=np.float64), np.asarray(preproc.b, dtype=np.float64)
+        else:
+            from fast_model import fold_affine
+            A, b = fold_affine(preproc, encoder.columns)
+        names = [str(n) for n in preproc.get_feature_names_out()]
+        if A.shape != (encoder.width, w.size) or len(names) != w.size:
+            return None
+        # Transformed column j belongs to field base_col(name_j); each field may only read its own inputs
+        field_of_out = [base_col(n) for n in names]
+        field_of_in = {i: field for field, _, i in encoder.numeric}
+        for field, _, table in encoder.categorical:
+            field_of_in.update((i, field) for hit in table.values() for i in hit)
+        for i, j in zip(*np.nonzero(A)):
+            if i in field_of_in and field_of_in[i] != field_of_out[j]:
+                return None
+        # Fields the preprocessor drops contribute nothing; constants go into the intercept
+        inputs = set(field_of_in.values())
+        fields = [f for f in dict.fromkeys(field_of_out) if f in inputs]
+        matrix = np.zeros((encoder.width, len(fields)))
+        offsets = np.zeros(len(fields))
+        for k, f in enumerate(fields):
+            j = np.array([c for c, g in enumerate(field_of_out) if g == f])
+            matrix[:, k] = A[:, j] @ w[j]
+            offsets[k] = b[j] @ w[j]
+        rest = np.array([c for c, g in enumerate(field_of_out) if g not in inputs], dtype=np.int64)
+        bias = float(np.ravel(intercept)[0]) + (float(b[rest] @ w[rest]) if rest.size else 0.0)
+        kernel = cls(encoder, fields, matrix, offsets, bias)
+        return kernel if kernel._matches(model) else None
+
+    def _matches(self, model, tol: float = 1e-9) -> bool:
+        # Compare both paths with the full pipeline on every table value, with spread-out numerics
+        import numpy as np
+        rng = np.random.default_rng(0)
+        rows = [dict(r) for r in WARMUP_ROWS]
+        longest = max([len(t) for _, _, t, _, _ in self.categorical] or [1])
+        for k in range(max(longest, 8)):
+            row = {f: round(float(rng.uniform(0, 8000 if f == "TotalCharges" else 120)), 2)
+                   for f, *_ in self.numeric}
+            for field, _, table, _, _ in self.categorical:
+                values = sorted(table)
+                row[field] = values[k % len(values)]
+            rows.append(row)
+        X, positions = self.encoder.encode(rows)
+        if len(positions) != len(rows):
+            return False
+        ref = np.asarray(_probabilities(_model_input(X, model, self.encoder), model), dtype=np.float64)
+        lookup = np.array([out[1] for out in self.score_rows(rows)])
+        matrix = self.score_matrix(X)[0]
+        return bool(np.max(np.abs(ref - lookup)) <= tol and np.max(np.abs(ref - matrix)) <= tol)
+
+    def _top(self, terms: List[float], k: int) -> List[str]:
+        # Stable: equal |contribution| keeps field order, like AttributionEngine
+        return [self.fields[j] for j in sorted(range(len(terms)), key=lambda j: -abs(terms[j]))[:k]]
+
+    def score_rows(self, rows: List[dict], k: int = 3) -> List[Optional[Tuple[str, float, List[str]]]]:
+        """Table lookups per row; None where a numeric field can't be read as a float."""
+        results: List[Optional[Tuple[str, float, List[str]]]] = []
+        for features in rows:
+            terms = [0.0] * len(self.fields)
+            try:
+                for field, default, slope, offset, k_ in self.numeric:
+                    v = features.get(field)
+                    terms[k_] = slope * float(default if v is None else v) + offset
+            except (TypeError, ValueError):
+                results.append(None)
+                continue
+            for field, lower, table, missing, k_ in self.categorical:
+                v = features.get(field)
+                s = "" if v is None else str(v)
+                terms[k_] = table.get(s.lower() if lower else s, missing)
+            z = self.intercept + sum(terms)
+            if not math.isfinite(z):
+                results.append(None)
+                continue
+            p1 = 1.0 / (1.0 + math.exp(-z)) if z > -700 else 0.0
+            label = "Va a cancelar" if p1 >= 0.5 else "Va a continuar"
+            results.append((label, p1, self._top(terms, k)))
+        return results
+
+    def score_matrix(self, X, k: int = 3):
+        """(probabilities, top features) for rows already encoded by the bundle's encoder."""
+        import numpy as np
+        terms = X @ self.matrix + self.offsets
+        z = self.intercept + terms.sum(axis=1)
+        with np.errstate(over="ignore"):
+            probs = 1.0 / (1.0 + np.exp(-z))
+        order = np.argsort(-np.abs(terms), axis=1, kind="stable")[:, :k].tolist()
+        fields = self.fields
+        return probs, [[fields[j] for j in row] for row in order]
+
+    def probabilities(self, rows: List[dict]):
+        """Churn probability per row (NaN where the row can't be encoded)."""
+        import numpy as np
+        probs = np.full(len(rows), np.nan)
+        X, positions = self.encoder.encode(rows)
+        if positions:
+            probs[positions] = self.score_matrix(X)[0]
+        return probs
+
+    def score(self, rows: List[dict], k: int = 3, explain: bool = True
+              ) -> List[Optional[Tuple[str, float, List[str]]]]:
+        # Contributions are a by-product of the logit, so `explain` costs nothing here
+        if len(rows) <= self.LOOKUP_ROWS:
+            return self.score_rows(rows, k)
+        X, positions = self.encoder.encode(rows)
+        results: List[Optional[Tuple[str, float, List[str]]]] = [None] * len(rows)
+        if positions:
+            probs, tops = self.score_matrix(X, k)
+            for pos, p1, top in zip(positions, probs.tolist(), tops):
+                if math.isfinite(p1):
+                    results[pos] = ("Va a cancelar" if p1 >= 0.5 else "Va a continuar", p1, top)
+        return results
+
+
+class BoosterKernel:
+    """Native XGBoost scoring for pipelines whose classifier is a gradient-boosted booster.
+
+    The preprocessor is folded into an affine map (checked against the pipeline at load), so
+    a batch is encoded, transformed with one matrix product and scored with the booster's
+    in-place prediction, without pandas or the sklearn wrappers. Top features come from
+    batched per-row contributions (`pred_contribs`), summed per canonical field: a
+    per-customer explanation instead of the global feature_importances_ ranking.
+
+    By default (DS_XGB_CONTRIBS=approx) those are the per-path (Saabas) contributions, which
+    keep batch scoring fast. `exact` is TreeSHAP: precise, but it costs far more than the
+    prediction itself (~30x slower batches). `global` is the previous importance ranking.
+    """
+
+    name = "xgboost-native"
+    CONTRIBS = ("exact", "approx", "global")
+
+    def __init__(self, booster, encoder: FeatureEncoder, attribution: AttributionEngine, A, b,
+                 group_matrix, iteration_range: Tuple[int, int], threads: int, contribs: str = "approx"):
+        import numpy as np
+        self.booster = booster
+        self.encoder = encoder
+        self.attribution = attribution
+        self.A = A
+        self.b = b
+        # Which transformed columns each input feeds, to carry NaN (missing) through like the scaler
+        self.reads = (A != 0).astype(np.float64)
+        self.contribs = contribs
+        # Transformed column -> canonical field (0/1), in first-seen order of the columns
+        self.groups = attribution.groups
+        self.group_matrix = group_matrix
+        self.iteration_range = iteration_range
+        self.threads = threads
+
+    @classmethod
+    def compile(cls, model, encoder: Optional[FeatureEncoder], attribution: Optional[AttributionEngine]
+                ) -> Optional["BoosterKernel"]:
+        """Kernel for an XGBoost classifier behind an affine preprocessor, or None."""
+        import numpy as np
+        if attribution is None or encoder is None or not hasattr(attribution.clf, "get_booster"):
+            return None
+        clf = attribution.clf
+        if getattr(clf, "n_classes_", 2) != 2:
+            return None
+        import xgboost
+        from fast_model import fold_affine
+        booster = clf.get_booster()
+        if booster.feature_names:
+            # Plain arrays carry no names; score by position like the pipeline's transform output
+            booster = booster.copy()
+            booster.feature_names = None
+            booster.feature_types = None
+        threads = int(os.getenv("DS_XGB_THREADS", os.getenv("OMP_NUM_THREADS", "0")))
+        if threads > 0:
+            booster.set_param({"nthread": threads})
+        try:
+            best = clf.best_iteration
+            iteration_range = (0, int(best) + 1)
+        except AttributeError:
+            iteration_range = (0, 0)
+        A, b = fold_affine(attribution.preproc, encoder.columns)
+        names = [str(n) for n in attribution.preproc.get_feature_names_out()]
+        index = {g: i for i, g in enumerate(attribution.groups)}
+        group_matrix = np.zeros((len(names), len(index)))
+        for j, name in enumerate(names):
+            group_matrix[j, index[base_col(name)]] = 1.0
+        contribs = os.getenv("DS_XGB_CONTRIBS", "approx")
+        if contribs not in cls.CONTRIBS:
+            raise ValueError(f"DS_XGB_CONTRIBS must be one of {', '.join(cls.CONTRIBS)}")
+        kernel = cls(booster, encoder, attribution, A, b, group_matrix, iteration_range, threads, contribs)
+        print(f"XGBoost {xgboost.__version__} native scoring ({threads or 'default'} threads, {contribs} contributions).")
+        return kernel if kernel._matches(model) else None
+
+    def _matches(self, model, tol: float = 1e-6) -> bool:
+        # Same probabilities as the full pipeline on the warm-up rows and random encoded rows
+        import numpy as np
+        X, positions = self.encoder.encode([dict(r) for r in WARMUP_ROWS])
+        rng = np.random.default_rng(0)
+        probe = rng.integers(0, 2, size=(64, self.encoder.width)).astype(np.float64)
+        for _, _, i in self.encoder.numeric:
+            probe[:, i] = np.round(rng.uniform(0, 120, size=64), 2)
+        X = np.vstack([X, probe])
+        ref = np.asarray(_probabilities(_model_input(X, model, self.encoder), model))
+        return len(positions) == len(WARMUP_ROWS) and float(np.max(np.abs(ref - self._predict(X)))) <= tol
+
+    def _transform(self, X):
+        import numpy as np
+        missing = np.isnan(X)
+        if not missing.any():
+            return np.ascontiguousarray(X @ self.A + self.b, dtype=np.float32)
+        X_tr = np.where(missing, 0.0, X) @ self.A + self.b
+        X_tr[(missing @ self.reads) > 0] = np.nan
+        return np.ascontiguousarray(X_tr, dtype=np.float32)
+
+    def _predict(self, X, X_tr=None):
+        import numpy as np
+        X_tr = self._transform(X) if X_tr is None else X_tr
+        return np.asarray(self.booster.inplace_predict(X_tr, iteration_range=self.iteration_range,
+                                                       missing=np.nan, validate_features=False)).reshape(-1)
+
+    def contributions(self, X_tr):
+        """Per-row contributions per canonical field (n_rows x n_fields), in margin units.
+
+        Saabas per-path contributions with DS_XGB_CONTRIBS=approx, TreeSHAP values with exact.
+        """
+        import numpy as np
+        import xgboost
+        dm = xgboost.DMatrix(X_tr, missing=np.nan, nthread=self.threads or None)
+        shap = self.booster.predict(dm, pred_contribs=True, approx_contribs=self.contribs == "approx",
+                                    iteration_range=self.iteration_range)
+        # Last column is the bias term
+        return shap[:, :-1] @ self.group_matrix
+
+    def probabilities(self, rows: List[dict]):
+        import numpy as np
+        probs = np.full(len(rows), np.nan)
+        X, positions = self.encoder.encode(rows)
+        if positions:
+            probs[positions] = self._predict(X)
+        return probs
+
+    def score(self, rows: List[dict], k: int = 3, explain: bool = True
+              ) -> List[Optional[Tuple[str, float, List[str]]]]:
+        import numpy as np
+        results: List[Optional[Tuple[str, float, List[str]]]] = [None] * len(rows)
+        X, positions = self.encoder.encode(rows)
+        if not positions:
+            return results
+        X_tr = self._transform(X)
+        probs = self._predict(X, X_tr).tolist()
+        tops = None
+        if explain:
+            try:
+                if self.contribs == "global":
+                    tops = self.attribution.top_features(X_tr, k)
+                else:
+                    contrib = self.contributions(X_tr)
+                    # Stable sort keeps field order on ties, like AttributionEngine
+                    order = np.argsort(-np.abs(contrib), axis=1, kind="stable")[:, :k].tolist()
+                    tops = [[self.groups[j] for j in row] for row in order]
+            except Exception as e:
+                print(f"Error calculating top features: {e}")
+        for n, (pos, p1) in enumerate(zip(positions, probs)):
+            label = "Va a cancelar" if p1 >= 0.5 else "Va a continuar"
+            results[pos] = (label, p1, tops[n] if tops is not None else list(DEFAULT_TOP_FEATURES))
+        return results
+
+
+class ModelBundle(NamedTuple):
+    """Everything one loaded artifact needs to score, swapped as a single immutable unit.
+
+    Requests grab the current bundle once and use it to the end, so a reload
+    never mixes the old encoder with the new model (or vice versa).
+    """
+    model: object
+    feature_names: Optional[List[str]]
+    encoder: Optional[FeatureEncoder]
+    attribution: Optional[AttributionEngine]
+    version: str
+    path: Optional[str]
+    mtime: Optional[float]
+    loaded_at: float
+    # Lookup-table kernel for linear models, native booster for XGBoost; None = full pipeline
+    kernel: Optional[Union[LinearKernel, BoosterKernel]] = None
+    # Set by _swap_bundle, unique per swap: the version string is reused by retrained artifacts
+    generation: int = 0
+
+
+MODEL_DIR = os.getenv("CHURN_MODEL_DIR", "/models")
+V2_ARTIFACT = "pipeline_churn_v2.joblib"
+
+# A few canonical rows to exercise a freshly loaded artifact before it takes traffic
+WARMUP_ROWS: List[dict] = [
+    {"gender": "Female", "SeniorCitizen": 0, "Partner": "Yes", "Dependents": "No", "tenure": 24,
+     "PhoneService": "Yes", "MultipleLines": "No", "InternetService": "DSL", "OnlineSecurity": "Yes",
+     "OnlineBackup": "No", "DeviceProtection": "No", "TechSupport": "No", "StreamingTV": "No",
+     "StreamingMovies": "No", "Contract": "One year", "PaperlessBilling": "Yes",
+     "PaymentMethod": "Electronic check", "MonthlyCharges": 29.85, "TotalCharges": 1889.50},
+    {"gender": "Male", "SeniorCitizen": 1, "Partner": "No", "Dependents": "No", "tenure": 2,
+     "PhoneService": "Yes", "MultipleLines": "Yes", "InternetService": "Fiber optic", "OnlineSecurity": "No",
+     "OnlineBackup": "No", "DeviceProtection": "No", "TechSupport": "No", "StreamingTV": "Yes",
+     "StreamingMovies": "Yes", "Contract": "Month-to-month", "PaperlessBilling": "Yes",
+     "PaymentMethod": "Mailed check", "MonthlyCharges": 99.65, "TotalCharges": 199.30},
+    {"gender": "Female", "SeniorCitizen": 0, "Partner": "Yes", "Dependents": "Yes", "tenure": 70,
+     "PhoneService": "No", "MultipleLines": "No phone service", "InternetService": "No",
+     "OnlineSecurity": "No internet service", "OnlineBackup": "No internet service",
+     "DeviceProtection": "No internet service", "TechSupport": "No internet service",
+     "StreamingTV": "No internet service", "StreamingMovies": "No internet service",
+     "Contract": "Two year", "PaperlessBilling": "No", "PaymentMethod": "Credit card (automatic)",
+     "MonthlyCharges": 19.95, "TotalCharges": 1396.50},
+]
+
+
+def _compile_kernel(model, encoder: FeatureEncoder, attribution: Optional[AttributionEngine]
+                    ) -> Optional[Union[LinearKernel, BoosterKernel]]:
+    kernels = [(LinearKernel, "DS_LINEAR_KERNEL"), (BoosterKernel, "DS_XGB_NATIVE")]
+    for kernel_cls, flag in kernels:
+        if os.getenv(flag, "1") == "0":
+            continue
+        try:
+            kernel = kernel_cls.compile(model, encoder, attribution)
+        except Exception as e:
+            print(f"{kernel_cls.__name__} disabled: {e}")
+            continue
+        if kernel is not None:
+            print(f"Scoring kernel: {kernel.name}.")
+            return kernel
+    print("No scoring kernel for this model; scoring through the full pipeline.")
+    return None
+
+
+def _empty_bundle(version: str) -> ModelBundle:
+    return ModelBundle(None, None, None, None, version, None, None, time.time())
+
+
+def _load_fast_bundle(model_dir: str, artifact: str, joblib_path: str,
+                      version: Optional[str]) -> Optional[ModelBundle]:
+    # Memory-mapped artifact exported by fast_model.py; scores without importing sklearn
+    if os.getenv("DS_FAST_ARTIFACT", "1") == "0":
+        return None
+    try:
+        from fast_model import FastModel, fast_artifact_path, MANIFEST
+    except ImportError:
+        return None
+    path = fast_artifact_path(model_dir, artifact)
+    manifest_path = os.path.join(path, MANIFEST)
+    if not os.path.exists(manifest_path):
+        return None
+    try:
+        with open(manifest_path, encoding="utf-8") as fh:
+            kind = json.load(fh).get("kind")
+        if (kind == "trees" and os.getenv("DS_XGB_CONTRIBS", "approx") != "global"
+                and os.getenv("DS_XGB_NATIVE", "1") != "0"):
+            # The flattened trees only carry the global importance ranking; the joblib's booster
+            # gives the per-row contributions DS_XGB_CONTRIBS asks for
+            print(f"Fast artifact {path} has no per-row contributions; using joblib "
+                  f"(DS_XGB_CONTRIBS=global serves it).")
+            return None
+        print(f"Loading fast model from {path}...")
+        model = FastModel.load(path)
+        source_mtime = model.manifest.get("source_mtime") or 0
+        if os.path.exists(joblib_path) and os.path.getmtime(joblib_path) > source_mtime + 1:
+            print(f"Fast artifact {path} is older than {joblib_path}; re-run fast_model.py export. Using joblib.")
+            return None
+        encoder = FeatureEncoder(model.columns)
+        attribution = AttributionEngine.from_pipeline(model)
+        kernel = _compile_kernel(model, encoder, attribution)
+        print("Fast model loaded successfully.")
+        return ModelBundle(model, None, encoder, attribution, version or model.version,
+                           manifest_path, os.path.getmtime(manifest_path), time.time(), kernel)
+    except Exception as e:
+        print(f"Error loading fast model, falling back to joblib: {e}")
+        return None
+
+
+def build_bundle(model_dir: str = MODEL_DIR, artifact: Optional[str] = None,
+                 version: Optional[str] = None) -> ModelBundle:
+    """Load an artifact into a new bundle without touching the one serving traffic."""
+    v2_path = os.path.join(model_dir, artifact or V2_ARTIFACT)
     pipeline_path = os.path.join(model_dir, "churn_pipeline.pkl")
     features_path = os.path.join(model_dir, "feature_names.pkl")
+    version = version or os.getenv("CHURN_MODEL_VERSION")
+    fast = _load_fast_bundle(model_dir, artifact or V2_ARTIFACT, v2_path, version)
+    if fast is not None:
+        return fast
     if not joblib:
-        return
+        return _empty_bundle("v1.0")
     try:
         # Prefer v2 pipeline if available
         if os.path.exists(v2_path):
             print(f"Loading V2 model from {v2_path}...")
-            MODEL = joblib.load(v2_path)
-            FEATURE_NAMES = None  # DataFrame-based pipeline doesn’t require explicit feature names
-            MODEL_VERSION = "v2.0"
+            model = joblib.load(v2_path)
+            encoder = FeatureEncoder(list(getattr(model, "feature_names_in_", EXPECTED_COLS)))
+            try:
+                attribution = AttributionEngine.from_pipeline(model)
+            except Exception as e:
+                print(f"Top features disabled: {e}")
+                attribution = None
+            kernel = _compile_kernel(model, encoder, attribution)
             print("V2 model loaded successfully.")
-            return
+            # DataFrame-based pipeline doesn’t require explicit feature names
+            return ModelBundle(model, None, encoder, attribution, version or "v2.0",
+                               v2_path, os.path.getmtime(v2_path), time.time(), kernel)
+        if artifact:
+            raise FileNotFoundError(v2_path)
         # Fallback to legacy artifacts
+        model = None
+        feature_names = None
         if os.path.exists(pipeline_path):
             print(f"Loading V1 model from {pipeline_path}...")
-            MODEL = joblib.load(pipeline_path)
+            model = joblib.load(pipeline_path)
         if os.path.exists(features_path):
             print(f"Loading feature names from {features_path}...")
-            FEATURE_NAMES = joblib.load(features_path)
-        MODEL_VERSION = "v1.0"
+            feature_names = joblib.load(features_path)
+        mtime = os.path.getmtime(pipeline_path) if model is not None else None
+        return ModelBundle(model, feature_names, None, None, version or "v1.0",
+                           pipeline_path if model is not None else None, mtime, time.time())
     except Exception as e:
         # Keep fallback if loading fails
         print(f"Error loading model: {e}")
-        MODEL = None
-        FEATURE_NAMES = None
-        MODEL_VERSION = "v1.0-fallback"
+        return _empty_bundle("v1.0-fallback")
+
+
+BUNDLE: ModelBundle = _empty_bundle("v1.0")
+_RELOAD_LOCK = threading.Lock()
+
+
+_GENERATIONS = itertools.count(1)
 
 
-load_model()
+def current_bundle() -> ModelBundle:
+    return BUNDLE
 
 
-def predict_with_model(features: dict) -> Optional[Tuple[str, float, List[str]]]:
-    if MODEL is None:
+def _swap_bundle(bundle: ModelBundle) -> None:
+    global BUNDLE
+    # Single reference assignment: in-flight requests keep the bundle they already hold
+    previous, BUNDLE = BUNDLE, bundle._replace(generation=next(_GENERATIONS))
+    # Cached scores belong to the previous artifact. Requests still scoring on it may put more
+    # afterwards, but under the previous generation, which no new lookup uses.
+    PREDICTION_CACHE.clear()
+    if prometheus_client is not None:
+        MODEL_INFO.labels(previous.version).set(0)
+        MODEL_INFO.labels(bundle.version).set(1)
+
+
+def load_model() -> ModelBundle:
+    with _RELOAD_LOCK:
+        _swap_bundle(build_bundle())
+        return BUNDLE
+
+
+def reload_model(artifact: Optional[str] = None, version: Optional[str] = None) -> Tuple[bool, str]:
+    """Load, warm up and atomically swap in a new artifact; the old bundle stays on failure."""
+    with _RELOAD_LOCK:
+        bundle = build_bundle(artifact=artifact, version=version)
+        if bundle.model is None and BUNDLE.model is not None:
+            return False, "No se pudo cargar el artefacto; se mantiene el modelo actual"
+        if bundle.model is not None:
+            outs = predict_batch_with_model(WARMUP_ROWS, bundle)
+            if not outs or any(o is None for o in outs):
+                return False, "El artefacto nuevo falló en el calentamiento; se mantiene el modelo actual"
+        _swap_bundle(bundle)
+        print(f"Model bundle swapped to {bundle.version} ({bundle.path})")
+        return True, bundle.version
+
+
+# Under Gunicorn, /admin/reload publishes its artifact here and every worker follows it
+# (watcher tick, and at worker start since the master still holds the preloaded bundle)
+MODEL_STATE_PATH = os.getenv("DS_MODEL_STATE")
+# Stamp of the published state this process has applied
+_APPLIED_STATE: Optional[float] = None
+
+
+def _read_model_state() -> Optional[dict]:
+    if not MODEL_STATE_PATH:
         return None
+    try:
+        with open(MODEL_STATE_PATH, encoding="utf-8") as fh:
+            return json.load(fh)
+    except (OSError, ValueError):
+        return None
+
+
+def publish_model_state(artifact: Optional[str], version: Optional[str]) -> None:
+    global _APPLIED_STATE
+    if not MODEL_STATE_PATH:
+        return
+    state = {"artifact": artifact, "version": version, "stamp": time.time()}
+    tmp = f"{MODEL_STATE_PATH}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as fh:
+        json.dump(state, fh)
+    os.replace(tmp, MODEL_STATE_PATH)
+    _APPLIED_STATE = state["stamp"]
+
+
+def sync_model_state() -> bool:
+    """Load the artifact of the last published /admin/reload if this process hasn't yet."""
+    global _APPLIED_STATE
+    state = _read_model_state()
+    if state is None or state.get("stamp") == _APPLIED_STATE:
+        return False
+    ok, msg = reload_model(state.get("artifact"), state.get("version"))
+    # Applied even on failure: the same broken state isn't retried on every tick
+    _APPLIED_STATE = state.get("stamp")
+    if not ok:
+        print(f"Model state sync: {msg}")
+    return ok
+
+
+def reload_all_workers(artifact: Optional[str] = None, version: Optional[str] = None) -> Tuple[bool, str]:
+    """reload_model here, then publish it so the other workers (and recycled ones) follow."""
+    ok, msg = reload_model(artifact, version)
+    if ok:
+        publish_model_state(artifact, version)
+    return ok, msg
+
+
+def _watch_model_dir(interval: float) -> None:
+    global BUNDLE
+    # The initial load belongs to the startup pipeline
+    _READY.wait()
+    while True:
+        time.sleep(interval)
+        if sync_model_state():
+            continue
+        bundle = BUNDLE
+        path = bundle.path or os.path.join(MODEL_DIR, V2_ARTIFACT)
+        try:
+            mtime = os.path.getmtime(path)
+        except OSError:
+            continue
+        if bundle.mtime is not None and mtime <= bundle.mtime:
+            continue
+        # Let the writer finish copying before loading
+        time.sleep(min(interval, 2.0))
+        artifact = os.path.basename(path) if path.endswith(".joblib") else None
+        ok, msg = reload_model(artifact=artifact)
+        if not ok:
+            print(f"Model watcher: {msg}")
+            # Don't retry the same broken file on every tick
+            with _RELOAD_LOCK:
+                if BUNDLE is bundle:
+                    BUNDLE = bundle._replace(mtime=mtime)
+
+
+_WATCHER: Optional[threading.Thread] = None
+
+
+def start_model_watcher() -> None:
+    """Poll CHURN_MODEL_DIR every DS_MODEL_WATCH_SECONDS and hot-reload changed artifacts.
+
+    It also applies the reloads other workers publish in DS_MODEL_STATE. Threads don't
+    survive fork, so under Gunicorn this is started per worker (post_worker_init).
+    """
+    global _WATCHER
+    interval = float(os.getenv("DS_MODEL_WATCH_SECONDS", "0"))
+    if interval <= 0 or (_WATCHER is not None and _WATCHER.is_alive()):
+        return
+    _WATCHER = threading.Thread(target=_watch_model_dir, args=(interval,), name="model-watcher", daemon=True)
+    _WATCHER.start()
+
+
+def predict_batch_with_model(rows: List[dict], bundle: Optional[ModelBundle] = None
+                             ) -> Optional[List[Optional[Tuple[str, float, List[str]]]]]:
+    """Score many canonical feature dicts with a single model call.
+
+    Returns None when no model is usable; rows that cannot be encoded come back
+    as None so the caller can fall back to the heuristic for just those rows.
+    """
+    bundle = bundle or BUNDLE
+    model = bundle.model
+    if model is None:
+        return None
+    results: List[Optional[Tuple[str, float, List[str]]]] = [None] * len(rows)
+    version = bundle.version
+    if prometheus_client is not None:
+        BATCH_ROWS.labels(version).observe(len(rows))
     try:
         # If legacy feature names exist, use numeric vector path
-        if FEATURE_NAMES is not None:
-            vec = _to_vector(features, FEATURE_NAMES)
+        if bundle.feature_names is not None:
             import numpy as np  # local import to avoid hard dependency on startup
-            X = np.array(vec, dtype=float).reshape(1, -1)
-            if hasattr(MODEL, "predict_proba"):
-                proba = MODEL.predict_proba(X)[0]
-                p1 = float(proba[1]) if len(proba) > 1 else float(proba[0])
-            else:
-                if hasattr(MODEL, "decision_function"):
-                    z = float(MODEL.decision_function(X)[0])
-                    p1 = 1.0 / (1.0 + math.exp(-z))
-                else:
-                    pred = MODEL.predict(X)[0]
-                    p1 = 0.8 if int(pred) == 1 else 0.2
-            label = "Va a cancelar" if p1 >= 0.5 else "Va a continuar"
-            top = FEATURE_NAMES[:3]
-            return label, p1, top
+            names = bundle.feature_names
+            X = np.array([_to_vector(f, names) for f in rows], dtype=float).reshape(len(rows), -1)
+            for i, p1 in enumerate(_probabilities(X, model) if len(rows) else []):
+                label = "Va a cancelar" if p1 >= 0.5 else "Va a continuar"
+                results[i] = (label, p1, names[:3])
+            return results
 
-        # v2: build DataFrame with encoded columns expected by the pipeline
-        import pandas as pd
-        
-        # The model expects these exact 32 features based on its feature_names_in_
-        expected_cols = [
-            'tenure', 'MonthlyCharges', 'TotalCharges', 'gender_Male', 'SeniorCitizen_1',
-            'SeniorCitizen_No', 'SeniorCitizen_Yes', 'Partner_Yes', 'Dependents_Yes',
-            'PhoneService_Yes', 'MultipleLines_No phone service', 'MultipleLines_Yes',
-            'InternetService_Fiber optic', 'InternetService_No',
-            'OnlineSecurity_No internet service', 'OnlineSecurity_Yes',
-            'OnlineBackup_No internet service', 'OnlineBackup_Yes',
-            'DeviceProtection_No internet service', 'DeviceProtection_Yes',
-            'TechSupport_No internet service', 'TechSupport_Yes',
-            'StreamingTV_No internet service', 'StreamingTV_Yes',
-            'StreamingMovies_No internet service', 'StreamingMovies_Yes',
-            'Contract_One year', 'Contract_Two year', 'PaperlessBilling_Yes',
-            'PaymentMethod_Credit card (automatic)', 'PaymentMethod_Electronic check',
-            'PaymentMethod_Mailed check'
-        ]
+        # Linear tables or native booster; both include per-row top features
+        if bundle.kernel is not None:
+            with _stage("kernel", version):
+                results = bundle.kernel.score(rows, explain=bundle.attribution is not None)
+            if prometheus_client is not None:
+                ENCODE_FAILURES.labels(model_version=version).inc(sum(out is None for out in results))
+            return results
+
+        # v2: encode every row into one matrix with the precompiled encoder
+        with _stage("encode", version):
+            X, positions = bundle.encoder.encode(rows)
+            X_in = _model_input(X, model, bundle.encoder) if positions else None
+        if prometheus_client is not None:
+            ENCODE_FAILURES.labels(model_version=version).inc(len(rows) - len(positions))
+        if not positions:
+            return results
 
-        # Helper to get raw value with defaults
-        def get_raw(key, default=""):
-            val = features.get(key)
-            return val if val is not None else default
-
-        # Map raw fields to expanded binary features
-        row = {}
-        # Numeric
-        row['tenure'] = float(get_raw('tenure', 0))
-        row['MonthlyCharges'] = float(get_raw('MonthlyCharges', 0.0))
-        row['TotalCharges'] = float(get_raw('TotalCharges', 0.0))
-        
-        # Categorical mapping
-        gender = str(get_raw('gender'))
-        row['gender_Male'] = 1 if gender == "Male" else 0
-        
-        sc = str(get_raw('SeniorCitizen'))
-        row['SeniorCitizen_1'] = 1 if sc in ("1", "1.0", 1) else 0
-        row['SeniorCitizen_No'] = 1 if sc.lower() in ("0", "no", "0.0") else 0
-        row['SeniorCitizen_Yes'] = 1 if sc.lower() in ("1", "yes", "1.0") else 0
-        
-        row['Partner_Yes'] = 1 if str(get_raw('Partner')) == "Yes" else 0
-        row['Dependents_Yes'] = 1 if str(get_raw('Dependents')) == "Yes" else 0
-        row['PhoneService_Yes'] = 1 if str(get_raw('PhoneService')) == "Yes" else 0
-        
-        ml = str(get_raw('MultipleLines'))
-        row['MultipleLines_No phone service'] = 1 if ml == "No phone service" else 0
-        row['MultipleLines_Yes'] = 1 if ml == "Yes" else 0
-        
-        isrv = str(get_raw('InternetService'))
-        row['InternetService_Fiber optic'] = 1 if isrv == "Fiber optic" else 0
-        row['InternetService_No'] = 1 if isrv == "No" else 0
-        
-        # Patterns for service-related dummies
-        for feat, key, target in [
-            ('OnlineSecurity_No internet service', 'OnlineSecurity', 'No internet service'),
-            ('OnlineSecurity_Yes', 'OnlineSecurity', 'Yes'),
-            ('OnlineBackup_No internet service', 'OnlineBackup', 'No internet service'),
-            ('OnlineBackup_Yes', 'OnlineBackup', 'Yes'),
-            ('DeviceProtection_No internet service', 'DeviceProtection', 'No internet service'),
-            ('DeviceProtection_Yes', 'DeviceProtection', 'Yes'),
-            ('TechSupport_No internet service', 'TechSupport', 'No internet service'),
-            ('TechSupport_Yes', 'TechSupport', 'Yes'),
-            ('StreamingTV_No internet service', 'StreamingTV', 'No internet service'),
-            ('StreamingTV_Yes', 'StreamingTV', 'Yes'),
-            ('StreamingMovies_No internet service', 'StreamingMovies', 'No internet service'),
-            ('StreamingMovies_Yes', 'StreamingMovies', 'Yes')
-        ]:
-            row[feat] = 1 if str(get_raw(key)) == target else 0
-            
-        cntr = str(get_raw('Contract'))
-        row['Contract_One year'] = 1 if cntr == "One year" else 0
-        row['Contract_Two year'] = 1 if cntr == "Two year" else 0
-        
-        row['PaperlessBilling_Yes'] = 1 if str(get_raw('PaperlessBilling')) == "Yes" else 0
-        
-        pm = str(get_raw('PaymentMethod'))
-        row['PaymentMethod_Credit card (automatic)'] = 1 if pm == "Credit card (automatic)" else 0
-        row['PaymentMethod_Electronic check'] = 1 if pm == "Electronic check" else 0
-        row['PaymentMethod_Mailed check'] = 1 if pm == "Mailed check" else 0
-
-        X_df = pd.DataFrame([row], columns=expected_cols)
-
-        # Probability
-        if hasattr(MODEL, "predict_proba"):
-            proba = MODEL.predict_proba(X_df)[0]
-            p1 = float(proba[1]) if len(proba) > 1 else float(proba[0])
-        elif hasattr(MODEL, "decision_function"):
-            z = float(MODEL.decision_function(X_df)[0])
-            p1 = 1.0 / (1.0 + math.exp(-z))
+        attribution = bundle.attribution
+        if attribution is None:
+            with _stage("predict_proba", version):
+                probs = _probabilities(X_in, model)
+            tops = [list(DEFAULT_TOP_FEATURES) for _ in positions]
         else:
-            pred = MODEL.predict(X_df)[0]
-            p1 = 0.8 if int(pred) == 1 else 0.2
+            # Transform once; the classifier and the attribution share X_tr
+            with _stage("predict_proba", version):
+                X_tr = attribution.transform(X_in)
+                probs = _probabilities(X_tr, attribution.clf)
+            try:
+                with _stage("attribution", version):
+                    tops = attribution.top_features(X_tr)
+            except Exception as e:
+                print(f"Error calculating top features: {e}")
+                tops = [list(DEFAULT_TOP_FEATURES) for _ in positions]
+        for pos, p1, top in zip(positions, probs, tops):
+            label = "Va a cancelar" if p1 >= 0.5 else "Va a continuar"
+            results[pos] = (label, p1, top)
+        return results
+    except Exception as e:
+        # Counted so silent fallbacks to the heuristic show up in /metrics
+        if prometheus_client is not None:
+            MODEL_ERRORS.labels(model_version=version).inc()
+        print(f"Model prediction failed, using heuristic: {e}")
+        return None
 
-        label = "Va a cancelar" if p1 >= 0.5 else "Va a continuar"
 
-        # Top features via transformed contributions (if available)
-        top: List[str] = ["tenure", "Contract", "OnlineSecurity"]
+def predict_probabilities(rows: List[dict], bundle: Optional[ModelBundle] = None):
+    """Churn probability per row as a NumPy array, skipping attribution and the cache.
+
+    Same model/heuristic split as score_batch; used by evaluation and benchmarks.
+    """
+    import numpy as np
+    bundle = bundle or BUNDLE
+    probs = np.full(len(rows), np.nan)
+    model = bundle.model
+    if model is not None and rows:
         try:
-            pipe = MODEL
-            named = getattr(pipe, "named_steps", {})
-            preproc = named.get("preprocessor") or named.get("columntransformer")
-            clf = named.get("logisticregression") or named.get("classifier") or named.get("model") or pipe
-            if preproc is not None and hasattr(preproc, "get_feature_names_out"):
-                import numpy as np
-                fnames = list(preproc.get_feature_names_out())
-                X_tr = preproc.transform(X_df)
-                
-                # Try to get weights/importances
-                weights = None
-                if hasattr(clf, "coef_"):
-                    weights = clf.coef_[0]
-                elif hasattr(clf, "feature_importances_"):
-                    weights = clf.feature_importances_
-                
-                if weights is not None:
-                    xvec = X_tr[0].toarray()[0] if hasattr(X_tr, "toarray") else np.array(X_tr[0]).ravel()
-
-                    def base_col(name: str) -> str:
-                        # Improved mapping for OneHotEncoder (cat__col_val) or others
-                        tail = name.split("__", 1)[1] if "__" in name else name
-                        return tail.split("_", 1)[0]
-
-                    grouped: dict[str, float] = {}
-                    for i in range(min(len(fnames), len(weights), len(xvec))):
-                        b = base_col(fnames[i])
-                        # use weight * value for contribution
-                        grouped[b] = grouped.get(b, 0.0) + float(abs(weights[i] * xvec[i]))
-                    top = [k for k, _ in sorted(grouped.items(), key=lambda t: t[1], reverse=True)[:3]]
-                else:
-                    print(f"Classifier {type(clf)} has no coef_ or feature_importances_")
+            if bundle.feature_names is not None:
+                X = np.array([_to_vector(f, bundle.feature_names) for f in rows], dtype=float).reshape(len(rows), -1)
+                probs[:] = _probabilities(X, model)
+            elif bundle.kernel is not None:
+                with _stage("kernel", bundle.version):
+                    probs[:] = bundle.kernel.probabilities(rows)
+            else:
+                with _stage("encode", bundle.version):
+                    X, positions = bundle.encoder.encode(rows)
+                if positions:
+                    with _stage("predict_proba", bundle.version):
+                        probs[positions] = _probabilities(_model_input(X, model, bundle.encoder), model)
         except Exception as e:
-            print(f"Error calculating top features: {e}")
-            pass
+            if prometheus_client is not None:
+                MODEL_ERRORS.labels(model_version=bundle.version).inc()
+            print(f"Model prediction failed, using heuristic: {e}")
+            probs[:] = np.nan
+    rest = np.flatnonzero(np.isnan(probs))
+    if rest.size:
+        probs[rest] = heuristic_score_batch(heuristic_columns([rows[i] for i in rest]))[0]
+    return probs
 
-        return label, p1, top
-    except Exception:
-        return None
 
+def predict_with_model(features: dict, bundle: Optional[ModelBundle] = None
+                       ) -> Optional[Tuple[str, float, List[str]]]:
+    out = predict_batch_with_model([features], bundle)
+    return out[0] if out else None
 
-@app.route("/predict", methods=["POST"])
-def predict():
-    payload = request.get_json(silent=True) or {}
-    feats = payload.get("features") or payload
-    # Enforce input rules: case-sensitive strings, TotalCharges null->0.0
-    if "TotalCharges" in feats and (feats["TotalCharges"] is None or feats["TotalCharges"] == ""):
+
+def _normalize_features(feats: dict) -> dict:
+    # Enforce input rules: case-sensitive strings, TotalCharges null/blank->0.0
+    total = feats.get("TotalCharges")
+    if total is None or (isinstance(total, str) and not total.strip()):
         feats["TotalCharges"] = 0.0
+    return feats
 
-    # Try model first, fallback to heuristic
-    out = predict_with_model(feats)
-    if out is None:
-        out = heuristic_score(feats)
-    label, prob, top = out
 
-    # Enriched response
+# README input rules checked in the DS too; DS_STRICT_VALIDATION=0 scores every row as before
+STRICT_VALIDATION = os.getenv("DS_STRICT_VALIDATION", "1") != "0"
+# /predict keeps its 200 contract until the API's ChurnRequest enforces the same rules (it only
+# checks SeniorCitizen >= 0); DS_STRICT_PREDICT=1 rejects invalid single rows with 400 too
+STRICT_PREDICT = STRICT_VALIDATION and os.getenv("DS_STRICT_PREDICT", "0") == "1"
+INVALID_INPUT_ERROR = "Entrada inválida"
+
+
+def validate_rows(rows: List[dict]) -> Tuple[List[int], Dict[int, Dict[str, str]]]:
+    """Positions of the rows that pass the schema, and {row: {field: message}} for the rest."""
+    if not STRICT_VALIDATION or not rows:
+        return list(range(len(rows))), {}
+    valid, errors = SCHEMA.validate(rows)
+    if errors and prometheus_client is not None:
+        for fields in errors.values():
+            for field in fields:
+                INVALID_ROWS.labels(field).inc()
+    return valid.nonzero()[0].tolist(), errors
+
+
+def score_valid(rows: List[dict], bundle: Optional[ModelBundle] = None
+                ) -> Tuple[List[Optional[Tuple[str, float, List[str]]]], Dict[int, Dict[str, str]]]:
+    """score_batch on the rows that pass validation; invalid rows come back as None plus their errors."""
+    bundle = bundle or BUNDLE
+    with _stage("validate", bundle.version):
+        positions, errors = validate_rows(rows)
+    if not errors:
+        return score_batch(rows, bundle), errors
+    outs: List[Optional[Tuple[str, float, List[str]]]] = [None] * len(rows)
+    if positions:
+        for pos, out in zip(positions, score_batch([rows[i] for i in positions], bundle)):
+            outs[pos] = out
+    return outs, errors
+
+
+def score_batch(rows: List[dict], bundle: Optional[ModelBundle] = None) -> List[Tuple[str, float, List[str]]]:
+    bundle = bundle or BUNDLE
+    # Cached rows are served directly; the misses are scored together
+    keys = [PREDICTION_CACHE.key(feats, bundle.generation) for feats in rows]
+    results: List[Optional[Tuple[str, float, List[str]]]] = [PREDICTION_CACHE.get(k) for k in keys]
+    pending = [i for i, out in enumerate(results) if out is None]
+    heuristic = 0
+    if pending:
+        # Model for every row it can encode, heuristic for the rest
+        todo = [rows[i] for i in pending]
+        outs = predict_batch_with_model(todo, bundle) or [None] * len(todo)
+        fallback = [j for j, out in enumerate(outs) if out is None]
+        if len(fallback) == 1:
+            outs[fallback[0]] = heuristic_score(todo[fallback[0]])
+        elif fallback:
+            probs, labels, tops = heuristic_score_batch(heuristic_columns([todo[j] for j in fallback]))
+            for j, label, prob, top in zip(fallback, labels, probs.tolist(), tops):
+                outs[j] = (label, prob, top)
+        heuristic = len(fallback)
+        # Heuristic fallbacks are not cached: they would outlive a transient model error
+        fell_back = set(fallback)
+        for j, (i, out) in enumerate(zip(pending, outs)):
+            results[i] = out
+            if j not in fell_back:
+                PREDICTION_CACHE.put(keys[i], out)
+    if prometheus_client is not None:
+        if PREDICTION_CACHE.maxsize > 0:
+            CACHE_LOOKUPS.labels(result="hit").inc(len(rows) - len(pending))
+            CACHE_LOOKUPS.labels(result="miss").inc(len(pending))
+            CACHE_SIZE.set(len(PREDICTION_CACHE))
+        PREDICTIONS.labels(source="cache", model_version=bundle.version).inc(len(rows) - len(pending))
+        PREDICTIONS.labels(source="model", model_version=bundle.version).inc(len(pending) - heuristic)
+        PREDICTIONS.labels(source="heuristic", model_version=bundle.version).inc(heuristic)
+    return results
+
+
+def decision(prob: float) -> Tuple[str, int, float, str]:
+    """(risk_level, will_churn, confidence_score, suggested_action) for a churn probability."""
     risk = "Alto Riesgo" if prob >= 0.66 else ("Riesgo Medio" if prob >= 0.33 else "Bajo Riesgo")
     will = 1 if prob >= 0.5 else 0
     conf = max(0.5, abs(prob - 0.5) * 2)
     action = "Retención Prioritaria / Oferta de Lealtad" if will == 1 else "Upsell / Programa de Fidelización"
+    return risk, will, conf, action
 
-    return jsonify({
-        "metadata": {"model_version": MODEL_VERSION, "timestamp": os.getenv("MODEL_TIMESTAMP", "")},
+
+def build_response(label: str, prob: float, top: List[str], version: Optional[str] = None) -> dict:
+    # Enriched response
+    risk, will, conf, action = decision(prob)
+
+    return {
+        "metadata": {"model_version": version or BUNDLE.version, "timestamp": os.getenv("MODEL_TIMESTAMP", "")},
         "prediction": {
             "churn_probability": prob,
             "will_churn": will,
@@ -294,22 +1249,729 @@ def predict():
         "prevision": label,
         "probabilidad": prob,
         "top_features": top
+    }
+
+
+class MicroBatcher:
+    """Coalesces concurrent single-row requests into one `score_batch` call.
+
+    A request waits at most `window` seconds (or until `max_size` rows are queued) for others
+    to join; rows are grouped per bundle so a reload mid-window never mixes model versions.
+    Only useful with threaded workers (DS_THREADS > 1); sync workers serve one request at a time.
+    """
+
+    def __init__(self, window: float, max_size: int):
+        self.window = window
+        self.max_size = max(1, max_size)
+        self._cond = threading.Condition()
+        self._queue: List[list] = []
+        self._pid = None
+
+    def _ensure_thread(self) -> None:
+        # Threads don't survive fork: start lazily in the process that serves requests
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._queue = []
+            threading.Thread(target=self._run, name="microbatcher", daemon=True).start()
+
+    def submit(self, feats: dict, bundle: ModelBundle) -> Tuple[str, float, List[str]]:
+        # Slot: [features, bundle, done event, result, error]
+        slot = [feats, bundle, threading.Event(), None, None]
+        with self._cond:
+            self._ensure_thread()
+            self._queue.append(slot)
+            self._cond.notify()
+        slot[2].wait()
+        if slot[4] is not None:
+            raise slot[4]
+        return slot[3]
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while not self._queue:
+                    self._cond.wait()
+                deadline = time.monotonic() + self.window
+                while len(self._queue) < self.max_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                batch, self._queue = self._queue[:self.max_size], self._queue[self.max_size:]
+            if prometheus_client is not None:
+                MICROBATCH_ROWS.observe(len(batch))
+            groups: "OrderedDict[int, list]" = OrderedDict()
+            for slot in batch:
+                groups.setdefault(id(slot[1]), []).append(slot)
+            for slots in groups.values():
+                self._score(slots)
+
+    @staticmethod
+    def _score(slots: List[list]) -> None:
+        bundle = slots[0][1]
+        try:
+            outs = score_batch([slot[0] for slot in slots], bundle)
+            for slot, out in zip(slots, outs):
+                slot[3] = out
+        except Exception:
+            # A row the heuristic can't parse must not fail its neighbours: retry one by one
+            for slot in slots:
+                try:
+                    slot[3] = score_batch([slot[0]], bundle)[0]
+                except Exception as exc:
+                    slot[4] = exc
+        for slot in slots:
+            slot[2].set()
+
+
+MICROBATCH_WINDOW_MS = float(os.getenv("DS_MICROBATCH_WINDOW_MS", "0"))
+MICROBATCH_MAX = int(os.getenv("DS_MICROBATCH_MAX", "64"))
+MICROBATCHER = MicroBatcher(MICROBATCH_WINDOW_MS / 1000.0, MICROBATCH_MAX) if MICROBATCH_WINDOW_MS > 0 else None
+
+
+# Startup pipeline: heavy imports, model load and warm-up, tracked for the readiness probe.
+# DS_STARTUP=background (default): done in a thread so liveness answers immediately.
+# DS_STARTUP=sync: done at import. DS_STARTUP=preload: load at import, the server calls
+# warm_up() per worker after forking (see gunicorn.conf.py).
+STARTUP = {"state": "starting", "started_at": time.time(), "import_seconds": None,
+           "load_seconds": None, "warmup_seconds": None, "error": None}
+_READY = threading.Event()
+
+
+def _preload_imports() -> None:
+    # numpy is needed by every model path; pandas/sklearn come in with joblib.load when required
+    t0 = time.perf_counter()
+    import numpy  # noqa: F401
+    STARTUP["import_seconds"] = round(time.perf_counter() - t0, 3)
+
+
+def warm_up() -> None:
+    """Run a few predictions end-to-end on the live bundle, then mark this process ready."""
+    t0 = time.perf_counter()
+    try:
+        bundle = current_bundle()
+        if bundle.model is not None:
+            outs = predict_batch_with_model(WARMUP_ROWS, bundle)
+            if not outs or any(o is None for o in outs):
+                print("Warm-up prediction failed; requests will use the heuristic fallback")
+        for row in WARMUP_ROWS:
+            heuristic_score(row)
+        build_response(*heuristic_score(WARMUP_ROWS[0]), bundle.version)
+        if prometheus_client is not None:
+            # Under gunicorn the master's gauge values don't carry over into forked workers
+            MODEL_INFO.labels(bundle.version).set(1)
+    finally:
+        STARTUP["warmup_seconds"] = round(time.perf_counter() - t0, 3)
+        STARTUP["state"] = "ready"
+        _READY.set()
+
+
+def startup(warmup: bool = True) -> None:
+    try:
+        _preload_imports()
+        t0 = time.perf_counter()
+        load_model()
+        STARTUP["load_seconds"] = round(time.perf_counter() - t0, 3)
+        if warmup:
+            warm_up()
+    except Exception as e:
+        # Never stay "starting" forever: serve the heuristic and report the error
+        print(f"Startup failed: {e}")
+        STARTUP["error"] = str(e)
+        STARTUP["state"] = "ready"
+        _READY.set()
+
+
+def wait_until_ready(timeout: Optional[float] = None) -> bool:
+    return _READY.wait(timeout)
+
+
+def _begin_startup() -> None:
+    mode = os.getenv("DS_STARTUP", "background")
+    if mode == "sync":
+        startup()
+    elif mode == "preload":
+        startup(warmup=False)
+    else:
+        threading.Thread(target=startup, name="ds-startup", daemon=True).start()
+
+
+_begin_startup()
+
+# Scoring endpoints answer 503 until the model is loaded and warmed up
+_GATED_PREFIXES = ("/predict", "/evaluate")
+STARTING_ERROR = "Servicio iniciando, modelo aún no disponible"
+
+
+@app.before_request
+def _require_ready():
+    if not _READY.is_set() and request.path.startswith(_GATED_PREFIXES):
+        resp = jsonify({"error": STARTING_ERROR, "state": STARTUP["state"]})
+        resp.status_code = 503
+        resp.headers["Retry-After"] = "1"
+        return resp
+    return None
+
+
+@app.before_request
+def _start_timer():
+    g.started = time.perf_counter()
+
+
+@app.after_request
+def _observe_request(resp):
+    # For streamed responses this is time to first byte
+    started = getattr(g, "started", None)
+    if prometheus_client is not None and started is not None:
+        endpoint = request.url_rule.rule if request.url_rule is not None else "unmatched"
+        REQUEST_SECONDS.labels(endpoint, str(resp.status_code)).observe(time.perf_counter() - started)
+    return resp
+
+
+@app.route("/predict", methods=["POST"])
+def predict():
+    bundle = current_bundle()
+    with _stage("parse", bundle.version):
+        payload = _json_payload()
+        if not isinstance(payload, dict):
+            payload = {}
+    feats = _normalize_features(payload.get("features") or payload)
+    if STRICT_PREDICT:
+        with _stage("validate", bundle.version):
+            errors = validate_rows([feats])[1]
+        if errors:
+            return jsonify({"error": INVALID_INPUT_ERROR, "errors": errors[0]}), 400
+
+    # Try cache/model first, fallback to heuristic
+    if MICROBATCHER is not None:
+        label, prob, top = MICROBATCHER.submit(feats, bundle)
+    else:
+        label, prob, top = score_batch([feats], bundle)[0]
+    with _stage("serialize", bundle.version):
+        return Response(wire.dumps_json(build_response(label, prob, top, bundle.version)), mimetype=wire.JSON)
+
+
+def _json_payload():
+    # Same contract as request.get_json(silent=True), decoded with orjson when available
+    if not request.is_json:
+        return None
+    try:
+        return wire.loads_json(request.get_data(cache=False))
+    except ValueError:
+        return None
+
+
+@app.route("/predict/batch", methods=["POST"])
+def predict_batch():
+    """Score a list of canonical rows in one call.
+
+    JSON, MessagePack or Arrow IPC (see wire.py): the body is read according to its
+    Content-Type and the response is written in the Accept format (default: the same).
+    """
+    bundle = current_bundle()
+    try:
+        fmt = wire.request_format(request.mimetype)
+    except wire.UnsupportedFormat as e:
+        return jsonify({"error": str(e)}), 415
+    with _stage("parse", bundle.version):
+        if fmt == wire.JSON:
+            payload = _json_payload()
+        else:
+            try:
+                payload = wire.decode(request.get_data(cache=False), fmt)
+            except ValueError:
+                payload = None
+        rows = batch_rows(payload)
+    if rows is None:
+        return jsonify({"error": BATCH_PAYLOAD_ERROR}), 400
+    outs, errors = score_valid(rows, bundle)
+    out_fmt = wire.negotiate(request.headers.get("Accept"), fmt)
+    with _stage("serialize", bundle.version):
+        return Response(encode_batch(outs, bundle.version, errors, out_fmt), mimetype=out_fmt)
+
+
+BATCH_PAYLOAD_ERROR = "Se esperaba una lista de objetos con las variables canónicas"
+
+
+def batch_rows(payload) -> Optional[List[dict]]:
+    """Canonical feature rows from a batch payload, or None if it isn't a list of objects."""
+    # Accept a bare list or {"items": [...]} / {"features": [...]}
+    if isinstance(payload, dict):
+        # Key presence, not truthiness: {"items": []} is an empty batch
+        payload = payload["items"] if "items" in payload else payload.get("features")
+    if not isinstance(payload, list) or not all(isinstance(r, dict) for r in payload):
+        return None
+    return [_normalize_features(r.get("features") or r) for r in payload]
+
+
+def batch_response(outs: List[Optional[Tuple[str, float, List[str]]]], version: str,
+                   errors: Optional[Dict[int, Dict[str, str]]] = None) -> dict:
+    """Scored rows in `items` (each with its input `row`); rejected rows only in `errors`."""
+    items = []
+    for row, out in enumerate(outs):
+        if out is not None:
+            item = build_response(*out, version)
+            item["row"] = row
+            items.append(item)
+    cancelaciones = sum(1 for it in items if it["prediction"]["will_churn"] == 1)
+    return {"items": items, "total": len(items), "cancelaciones": cancelaciones,
+            "rejected": len(errors or {}), "errors": {str(row): e for row, e in (errors or {}).items()}}
+
+
+def encode_batch(outs: List[Optional[Tuple[str, float, List[str]]]], version: str,
+                 errors: Dict[int, Dict[str, str]], fmt: str) -> bytes:
+    """A batch result in a wire format: batch_response as JSON/MessagePack, or result columns as Arrow."""
+    if fmt != wire.ARROW:
+        return wire.encode(batch_response(outs, version, errors), fmt)
+    columns = result_columns(outs, errors, version)
+    total = len(outs) - len(errors)
+    cancelaciones = sum(1 for w in columns["will_churn"] if w == 1)
+    return wire.encode_arrow(columns, RESULT_COLUMN_KINDS,
+                             {"total": total, "cancelaciones": cancelaciones, "rejected": len(errors)})
+
+
+def row_items(outs: List[Optional[Tuple[str, float, List[str]]]], errors: Dict[int, Dict[str, str]],
+              version: str, first_row: int = 0) -> List[dict]:
+    """One item per input row for the streamed outputs: the response, or the row's errors."""
+    items = []
+    for k, out in enumerate(outs):
+        item = build_response(*out, version) if out is not None else {"errors": errors.get(k, {})}
+        item["row"] = first_row + k
+        items.append(item)
+    return items
+
+
+CSV_CHUNK_SIZE = int(os.getenv("DS_CSV_CHUNK_SIZE", "5000"))
+
+CSV_RESULT_COLUMNS: List[str] = [
+    "row", "prevision", "probabilidad", "risk_level", "will_churn", "confidence_score",
+    "suggested_action", "top_features", "model_version", "errors"
+]
+
+
+def iter_csv_chunks(reader: csv.DictReader, chunk_size: int) -> Iterator[List[dict]]:
+    # Only one chunk of parsed rows is alive at a time
+    chunk: List[dict] = []
+    for rec in reader:
+        chunk.append(_normalize_features(rec))
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _csv_result_row(row: int, item: dict) -> list:
+    if "errors" in item:
+        # Rejected row: only the row number and "field: message" pairs
+        errors = "; ".join(f"{field}: {msg}" for field, msg in item["errors"].items())
+        return [row] + [""] * (len(CSV_RESULT_COLUMNS) - 2) + [errors]
+    pred = item["prediction"]
+    return [
+        row, item["prevision"], item["probabilidad"], pred["risk_level"], pred["will_churn"],
+        pred["confidence_score"], item["business_logic"]["suggested_action"],
+        "|".join(item["top_features"]), item["metadata"]["model_version"], ""
+    ]
+
+
+# Worker processes for /predict/csv (parallel.py); 0 = score in the request thread
+PARALLEL_WORKERS = int(os.getenv("DS_PARALLEL_WORKERS", "0"))
+_PARALLEL: dict = {"scorer": None, "key": None}
+_PARALLEL_LOCK = threading.Lock()
+
+
+def _bundle_artifact(bundle: ModelBundle) -> Optional[str]:
+    # The .joblib name a bundle was built from (fast artifacts live in "<name>.fast/")
+    if not bundle.path:
+        return None
+    if bundle.path.endswith(".joblib"):
+        return os.path.basename(bundle.path)
+    folder = os.path.basename(os.path.dirname(bundle.path))
+    return folder[:-len(".fast")] + ".joblib" if folder.endswith(".fast") else None
+
+
+def parallel_scorer(bundle: ModelBundle) -> ParallelScorer:
+    """Process pool serving `bundle`'s artifact; a swapped-in artifact gets a new pool."""
+    key = (bundle.path, bundle.mtime, bundle.version)
+    with _PARALLEL_LOCK:
+        if _PARALLEL["key"] != key:
+            if _PARALLEL["scorer"] is not None:
+                _PARALLEL["scorer"].retire()
+            _PARALLEL["scorer"] = ParallelScorer(PARALLEL_WORKERS, artifact=_bundle_artifact(bundle),
+                                                 version=bundle.version)
+            _PARALLEL["key"] = key
+        return _PARALLEL["scorer"]
+
+
+def _chained(first: bytes, rest: Iterator[bytes]) -> Iterator[bytes]:
+    yield first
+    yield from rest
+
+
+# Column types of the Arrow results (wire.encode_arrow)
+RESULT_COLUMN_KINDS: Dict[str, str] = {
+    "row": "int", "prevision": "category", "probabilidad": "float", "risk_level": "category",
+    "will_churn": "int", "confidence_score": "float", "suggested_action": "category",
+    "top_features": "categories", "model_version": "category", "errors": "map"
+}
+
+
+def result_columns(outs: List[Optional[Tuple[str, float, List[str]]]], errors: Dict[int, Dict[str, str]],
+                   version: str) -> Dict[str, list]:
+    """Batch results as CSV_RESULT_COLUMNS columns, with nulls (and an errors map) for rejected rows."""
+    columns: Dict[str, list] = {name: [] for name in CSV_RESULT_COLUMNS}
+    rejected = [None] * (len(CSV_RESULT_COLUMNS) - 2)
+    for row, out in enumerate(outs):
+        if out is None:
+            values = [row, *rejected, errors.get(row, {})]
+        else:
+            label, prob, top = out
+            risk, will, conf, action = decision(prob)
+            values = [row, label, prob, risk, will, conf, action, top, version, None]
+        for column, value in zip(columns.values(), values):
+            column.append(value)
+    return columns
+
+
+@app.route("/predict/csv", methods=["POST"])
+def predict_csv():
+    """Stream-score a canonical CSV (multipart `file` or raw body) chunk by chunk.
+
+    Results are written back as NDJSON (default) or CSV (`?format=csv` or
+    `Accept: text/csv`) while the upload is still being read. With DS_PARALLEL_WORKERS > 0
+    the shards are scored by a process pool (`?parallel=0` keeps it in this thread).
+    """
+    upload = request.files.get("file") if request.mimetype == "multipart/form-data" else None
+    raw = upload.stream if upload is not None else request.stream
+    as_csv = request.args.get("format") == "csv" or (
+        request.args.get("format") is None and request.accept_mimetypes.best == "text/csv"
+    )
+    mimetype = "text/csv" if as_csv else "application/x-ndjson"
+    if PARALLEL_WORKERS > 0 and request.args.get("parallel", "1") != "0":
+        chunks = parallel_scorer(current_bundle()).score_csv(raw, "csv" if as_csv else "ndjson")
+        try:
+            # The header is checked before anything is streamed
+            first = next(chunks, b"")
+        except MissingColumnsError as e:
+            return jsonify({"error": "Faltan columnas canónicas en el CSV", "missing": e.missing}), 400
+        return Response(stream_with_context(_chained(first, chunks)), mimetype=mimetype)
+
+    text = io.TextIOWrapper(raw, encoding="utf-8-sig", newline="")
+    reader = csv.DictReader(text)
+    missing = [c for c in CANONICAL_FIELDS if c not in (reader.fieldnames or [])]
+    if missing:
+        return jsonify({"error": "Faltan columnas canónicas en el CSV", "missing": missing}), 400
+
+    try:
+        chunk_size = max(1, int(request.args.get("chunk_size", CSV_CHUNK_SIZE)))
+    except ValueError:
+        return jsonify({"error": "chunk_size inválido"}), 400
+
+    # The whole file is scored by the bundle that was live when the upload started
+    bundle = current_bundle()
+
+    def generate():
+        row = 0
+        if as_csv:
+            buf = io.StringIO()
+            writer = csv.writer(buf)
+            writer.writerow(CSV_RESULT_COLUMNS)
+        chunks = iter_csv_chunks(reader, chunk_size)
+        while True:
+            with _stage("parse", bundle.version):
+                chunk = next(chunks, None)
+            if chunk is None:
+                break
+            outs, errors = score_valid(chunk, bundle)
+            with _stage("serialize", bundle.version):
+                items = row_items(outs, errors, bundle.version, row)
+                row += len(items)
+                if as_csv:
+                    for item in items:
+                        writer.writerow(_csv_result_row(item["row"], item))
+                    out_text = buf.getvalue()
+                    buf.seek(0)
+                    buf.truncate()
+                else:
+                    out_text = "\n".join(json.dumps(item, ensure_ascii=False) for item in items) + "\n"
+            yield out_text
+
+    return Response(stream_with_context(generate()), mimetype=mimetype)
+
+
+# Rejected rows listed in an evaluation report (all of them are counted in `rejected`)
+EVAL_ERROR_LIMIT = 100
+
+
+def evaluate_reader(reader: csv.DictReader, chunk_size: int, thresholds=None, bins: int = DEFAULT_BINS,
+                    bundle: Optional[ModelBundle] = None) -> dict:
+    """Score a labeled CSV chunk by chunk and evaluate it at every threshold (see evaluate.py)."""
+    import numpy as np
+    bundle = bundle or current_bundle()
+    missing = [c for c in CANONICAL_FIELDS if c not in (reader.fieldnames or [])]
+    if missing:
+        raise ValueError(f"Faltan columnas canónicas en el CSV: {', '.join(missing)}")
+    label_col = find_label_column(reader.fieldnames)
+    if label_col is None:
+        raise ValueError("El CSV de evaluación debe incluir columna 'Churn' con valores 'Yes'/'No'.")
+    labels, probs = [], []
+    first = rejected = 0
+    errors: Dict[str, Dict[str, str]] = {}
+    for chunk in iter_csv_chunks(reader, chunk_size):
+        # Rows that break the input rules are left out of the metrics and reported
+        positions, chunk_errors = validate_rows(chunk)
+        rejected += len(chunk_errors)
+        for k in sorted(chunk_errors)[:max(0, EVAL_ERROR_LIMIT - len(errors))]:
+            errors[str(first + k)] = chunk_errors[k]
+        first += len(chunk)
+        if chunk_errors:
+            chunk = [chunk[i] for i in positions]
+        labels.append(churn_labels([r.get(label_col) for r in chunk]))
+        probs.append(predict_probabilities(chunk, bundle))
+    y = np.concatenate(labels) if labels else np.zeros(0, dtype=bool)
+    p = np.concatenate(probs) if probs else np.zeros(0)
+    report = evaluate_scores(y, p, thresholds, bins)
+    report["model_version"] = bundle.version
+    report["rejected"] = rejected
+    report["errors"] = errors
+    return report
+
+
+@app.route("/evaluate", methods=["POST"])
+def evaluate_csv():
+    """Labeled CSV (multipart `file` or raw body) -> threshold sweep, ROC-AUC, PR-AUC, calibration.
+
+    Query: `thresholds=0.3,0.5` or `step=0.01`, `bins=10`, `chunk_size`.
+    """
+    try:
+        if request.args.get("thresholds"):
+            thresholds = [float(t) for t in request.args["thresholds"].split(",")]
+        else:
+            thresholds = threshold_grid(min(0.5, max(0.001, float(request.args.get("step", 0.05)))))
+        bins = min(100, max(1, int(request.args.get("bins", DEFAULT_BINS))))
+        chunk_size = max(1, int(request.args.get("chunk_size", CSV_CHUNK_SIZE)))
+    except ValueError:
+        return jsonify({"error": "thresholds/step/bins/chunk_size inválidos"}), 400
+    upload = request.files.get("file") if request.mimetype == "multipart/form-data" else None
+    text = io.TextIOWrapper(upload.stream if upload is not None else request.stream, encoding="utf-8-sig", newline="")
+    try:
+        return jsonify(evaluate_reader(csv.DictReader(text), chunk_size, thresholds, bins))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+
+# Resumable batch jobs: upload once, poll status, page through results (see jobs.py)
+JOBS_DIR = os.getenv("DS_JOBS_DIR", os.path.join(tempfile.gettempdir(), "ds-jobs"))
+JOBS = JobStore(JOBS_DIR, int(os.getenv("DS_JOB_WORKERS", "1")))
+JOB_PAGE_LIMIT = 5000
+
+
+def _score_job_chunk(rows: List[dict], first_row: int) -> List[dict]:
+    # Jobs resumed at boot wait for the model instead of scoring with the heuristic
+    _READY.wait()
+    bundle = current_bundle()
+    rows = [_normalize_features(r) for r in rows]
+    outs, errors = score_valid(rows, bundle)
+    return row_items(outs, errors, bundle.version, first_row)
+
+
+def start_job_runner() -> None:
+    """Pick up jobs interrupted by a restart. Called per worker, like start_model_watcher."""
+    resumed = JOBS.resume(_score_job_chunk)
+    if resumed:
+        print(f"Resuming {len(resumed)} batch job(s): {', '.join(resumed)}")
+
+
+def _job_links(job_id: str) -> dict:
+    return {"status": f"/jobs/{job_id}", "results": f"/jobs/{job_id}/results"}
+
+
+@app.route("/jobs", methods=["POST"])
+def submit_job():
+    """Store a canonical CSV (multipart `file` or raw body) and score it in the background."""
+    try:
+        chunk_size = max(1, int(request.args.get("chunk_size", CSV_CHUNK_SIZE)))
+    except ValueError:
+        return jsonify({"error": "chunk_size inválido"}), 400
+    upload = request.files.get("file") if request.mimetype == "multipart/form-data" else None
+    os.makedirs(JOBS_DIR, exist_ok=True)
+    meta = JOBS.create(upload.stream if upload is not None else request.stream, chunk_size)
+
+    with open(JOBS.input_path(meta["job_id"]), encoding="utf-8-sig", newline="") as fh:
+        header = csv.DictReader(fh).fieldnames or []
+    missing = [c for c in CANONICAL_FIELDS if c not in header]
+    if missing:
+        JOBS.delete(meta["job_id"])
+        return jsonify({"error": "Faltan columnas canónicas en el CSV", "missing": missing}), 400
+
+    JOBS.submit(meta["job_id"], _score_job_chunk)
+    return jsonify({**meta, "links": _job_links(meta["job_id"])}), 202
+
+
+@app.route("/jobs/<job_id>", methods=["GET"])
+def job_status(job_id: str):
+    meta = JOBS.meta(job_id)
+    if meta is None:
+        return jsonify({"error": "Job no encontrado"}), 404
+    # Left active by a worker that is gone (recycled, killed): continue it here
+    if JOBS.reclaim(job_id, _score_job_chunk):
+        print(f"Resuming batch job {job_id}")
+    total = meta["total_rows"]
+    meta["progress"] = round(meta["rows_done"] / total, 4) if total else (1.0 if meta["state"] == "done" else 0.0)
+    return jsonify({**meta, "links": _job_links(job_id)})
+
+
+@app.route("/jobs/<job_id>", methods=["DELETE"])
+def job_delete(job_id: str):
+    if not JOBS.delete(job_id):
+        return jsonify({"error": "Job no encontrado"}), 404
+    return "", 204
+
+
+@app.route("/jobs/<job_id>/results", methods=["GET"])
+def job_results(job_id: str):
+    """Scored rows finished so far: a JSON page (`offset`, `limit`) or the whole CSV (`format=csv`)."""
+    meta = JOBS.meta(job_id)
+    if meta is None:
+        return jsonify({"error": "Job no encontrado"}), 404
+
+    if request.args.get("format") == "csv":
+        def generate():
+            buf = io.StringIO()
+            writer = csv.writer(buf)
+            writer.writerow(CSV_RESULT_COLUMNS)
+            for n, item in enumerate(JOBS.iter_items(job_id), 1):
+                writer.writerow(_csv_result_row(item["row"], item))
+                if n % CSV_CHUNK_SIZE == 0:
+                    yield buf.getvalue()
+                    buf.seek(0)
+                    buf.truncate()
+            yield buf.getvalue()
+
+        headers = {"Content-Disposition": f"attachment; filename=job_{job_id}.csv"}
+        return Response(stream_with_context(generate()), mimetype="text/csv", headers=headers)
+
+    try:
+        offset = max(0, int(request.args.get("offset", 0)))
+        limit = min(JOB_PAGE_LIMIT, max(1, int(request.args.get("limit", 1000))))
+    except ValueError:
+        return jsonify({"error": "offset/limit inválidos"}), 400
+    items = JOBS.page(job_id, offset, limit)
+    next_offset = offset + len(items)
+    return jsonify({
+        "job_id": job_id,
+        "state": meta["state"],
+        "offset": offset,
+        "limit": limit,
+        "items": items,
+        "rows_available": meta["rows_done"],
+        "total_rows": meta["total_rows"],
+        "next_offset": next_offset if next_offset < meta["rows_done"] or meta["state"] in ("queued", "running") else None,
     })
 
 
 @app.route("/")
 def home():
+    bundle = current_bundle()
     status = {
         "service": "ds",
-        "modelLoaded": MODEL is not None and FEATURE_NAMES is not None
+        "modelLoaded": bundle.model is not None,
+        "modelVersion": bundle.version,
+        "ready": _READY.is_set(),
+        "cache": PREDICTION_CACHE.stats()
     }
     return jsonify(status)
 
 
+def _admin_authorized() -> bool:
+    expected = os.getenv("DS_ADMIN_TOKEN", "")
+    return bool(expected) and request.headers.get("X-Admin-Token") == expected
+
+
+def _bundle_info(bundle: ModelBundle) -> dict:
+    return {"model_version": bundle.version, "path": bundle.path, "loaded": bundle.model is not None,
+            "loaded_at": bundle.loaded_at}
+
+
+@app.route("/admin/model")
+def admin_model():
+    if not _admin_authorized():
+        return jsonify({"error": "No autorizado"}), 403
+    return jsonify(_bundle_info(current_bundle()))
+
+
+@app.route("/admin/reload", methods=["POST"])
+def admin_reload():
+    """Load, warm up and swap a new artifact from CHURN_MODEL_DIR.
+
+    Body (optional): {"artifact": "<archivo .joblib>", "version": "v2.1", "wait": true}
+    """
+    if not _admin_authorized():
+        return jsonify({"error": "No autorizado"}), 403
+    payload = request.get_json(silent=True) or {}
+    artifact = payload.get("artifact")
+    if artifact is not None and (os.path.basename(artifact) != artifact or not artifact.endswith(".joblib")):
+        return jsonify({"error": "artifact debe ser un nombre de archivo .joblib dentro de CHURN_MODEL_DIR"}), 400
+    version = payload.get("version")
+    if payload.get("wait"):
+        ok, msg = reload_all_workers(artifact, version)
+        body = {"reloaded": ok, "message": msg, **_bundle_info(current_bundle())}
+        return jsonify(body), (200 if ok else 409)
+    threading.Thread(target=reload_all_workers, args=(artifact, version), name="model-reload", daemon=True).start()
+    return jsonify({"status": "reloading", **_bundle_info(current_bundle())}), 202
+
+
+@app.route("/metrics")
+def metrics():
+    if prometheus_client is None:
+        return jsonify({"error": "prometheus_client no está instalado"}), 501
+    from prometheus_client import CONTENT_TYPE_LATEST
+    return Response(metrics_payload(), mimetype=CONTENT_TYPE_LATEST)
+
+
+def metrics_payload() -> bytes:
+    from prometheus_client import CollectorRegistry, generate_latest
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        # Gunicorn: aggregate the per-worker files instead of reporting only this worker
+        from prometheus_client import multiprocess
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = prometheus_client.REGISTRY
+    return generate_latest(registry)
+
+
 @app.route("/health")
+@app.route("/health/live")
 def health():
+    # Liveness: the process answers; says nothing about the model
     return jsonify({"status": "UP"}), 200
 
 
+@app.route("/health/ready")
+def health_ready():
+    body, status = readiness()
+    return jsonify(body), status
+
+
+def readiness() -> Tuple[dict, int]:
+    bundle = current_bundle()
+    body = {
+        "status": "READY" if _READY.is_set() else "STARTING",
+        "model_version": bundle.version,
+        "model_loaded": bundle.model is not None,
+        "scoring_kernel": bundle.kernel.name if bundle.kernel is not None else "pipeline",
+        "import_seconds": STARTUP["import_seconds"],
+        "load_seconds": STARTUP["load_seconds"],
+        "warmup_seconds": STARTUP["warmup_seconds"],
+        "uptime_seconds": round(time.time() - STARTUP["started_at"], 3),
+    }
+    if STARTUP["error"]:
+        body["error"] = STARTUP["error"]
+    return body, (200 if _READY.is_set() else 503)
+
+
 if __name__ == "__main__":
+    start_model_watcher()
+    start_job_runner()
     app.run(host="0.0.0.0", port=8000)
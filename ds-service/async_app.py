@@ -0,0 +1,230 @@
+"""Asyncio serving variant of the DS service (aiohttp).
+
+Same model bundle, cache and response shapes as app.py. The event loop only does network
+I/O; parsing, scoring and serialization run in a bounded thread pool, so a slow client
+never holds an inference slot. When the pool is saturated new requests get 429 with
+Retry-After, and every request carries a deadline after which it is dropped (504).
+
+    python async_app.py
+    gunicorn async_app:app -c gunicorn.conf.py -k aiohttp.GunicornWebWorker
+"""
+import os
+import time
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Callable, Optional, Tuple
+
+from aiohttp import web
+
+import app as core
+import wire
+
+ASYNC_WORKERS = int(os.getenv("DS_ASYNC_WORKERS", str(os.cpu_count() or 1)))
+# Requests admitted at once (running + waiting for a thread); beyond this we answer 429
+ASYNC_QUEUE = int(os.getenv("DS_ASYNC_QUEUE", str(ASYNC_WORKERS * 8)))
+DEADLINE_MS = float(os.getenv("DS_REQUEST_DEADLINE_MS", "2000"))
+# Batches read and score up to DS_MAX_BODY_MB of rows, so they get their own, larger budget
+BATCH_DEADLINE_MS = float(os.getenv("DS_BATCH_DEADLINE_MS", "30000"))
+MAX_BODY_MB = float(os.getenv("DS_MAX_BODY_MB", "32"))
+RETRY_AFTER = os.getenv("DS_RETRY_AFTER_SECONDS", "1")
+
+JSON = wire.JSON
+
+
+class Overloaded(Exception):
+    pass
+
+
+class DeadlineExceeded(Exception):
+    pass
+
+
+class InferenceExecutor:
+    """Thread pool that admits at most `capacity` jobs and drops the ones that expire while queued.
+
+    Only touched from the event loop, so the in-flight counter needs no lock. It is released
+    when the thread finishes (not when the caller gives up), so it reflects real pool load.
+    """
+
+    def __init__(self, workers: int, capacity: int):
+        self.workers = max(1, workers)
+        self.capacity = max(self.workers, capacity)
+        self.in_flight = 0
+        self._pool: Optional[ThreadPoolExecutor] = None
+
+    def start(self) -> None:
+        # Created per worker process, after the fork
+        self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="ds-infer")
+
+    def shutdown(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+
+    async def run(self, fn: Callable, *args, deadline: float):
+        if self.in_flight >= self.capacity:
+            raise Overloaded()
+        loop = asyncio.get_running_loop()
+        self.in_flight += 1
+        cf = self._pool.submit(_before_deadline, deadline, fn, *args)
+        cf.add_done_callback(lambda _: loop.call_soon_threadsafe(self._release))
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(cf), timeout=max(0.0, deadline - time.monotonic()))
+        except asyncio.TimeoutError:
+            raise DeadlineExceeded()
+
+    def _release(self) -> None:
+        self.in_flight -= 1
+
+
+def _before_deadline(deadline: float, fn: Callable, *args):
+    # A job that waited past its deadline is skipped: nobody is waiting for the answer
+    if time.monotonic() >= deadline:
+        raise DeadlineExceeded()
+    return fn(*args)
+
+
+EXECUTOR = InferenceExecutor(ASYNC_WORKERS, ASYNC_QUEUE)
+
+
+def _deadline(request: web.Request, budget_ms: float) -> float:
+    # Clients may ask for a shorter deadline (X-Request-Deadline-Ms), never a longer one
+    budget = budget_ms
+    try:
+        budget = min(budget, float(request.headers.get("X-Request-Deadline-Ms", budget)))
+    except ValueError:
+        pass
+    return time.monotonic() + budget / 1000.0
+
+
+def _json_response(body, status: int = 200, headers: Optional[dict] = None) -> web.Response:
+    if not isinstance(body, bytes):
+        body = wire.dumps_json(body)
+    return web.Response(body=body, status=status, content_type=JSON, headers=headers)
+
+
+def _predict_job(raw: bytes, bundle: core.ModelBundle) -> Tuple[int, bytes, str]:
+    with core._stage("parse", bundle.version):
+        try:
+            payload = wire.loads_json(raw) if raw else {}
+        except ValueError:
+            payload = {}
+        if not isinstance(payload, dict):
+            payload = {}
+    feats = core._normalize_features(payload.get("features") or payload)
+    if core.STRICT_PREDICT:
+        with core._stage("validate", bundle.version):
+            errors = core.validate_rows([feats])[1]
+        if errors:
+            return 400, wire.dumps_json({"error": core.INVALID_INPUT_ERROR, "errors": errors[0]}), JSON
+    if core.MICROBATCHER is not None:
+        out = core.MICROBATCHER.submit(feats, bundle)
+    else:
+        out = core.score_batch([feats], bundle)[0]
+    with core._stage("serialize", bundle.version):
+        return 200, wire.dumps_json(core.build_response(*out, bundle.version)), JSON
+
+
+def _batch_job(fmt: str, out_fmt: str, raw: bytes, bundle: core.ModelBundle) -> Tuple[int, bytes, str]:
+    with core._stage("parse", bundle.version):
+        try:
+            rows = core.batch_rows(wire.decode(raw, fmt))
+        except ValueError:
+            rows = None
+    if rows is None:
+        return 400, wire.dumps_json({"error": core.BATCH_PAYLOAD_ERROR}), JSON
+    outs, errors = core.score_valid(rows, bundle)
+    with core._stage("serialize", bundle.version):
+        return 200, core.encode_batch(outs, bundle.version, errors, out_fmt), out_fmt
+
+
+async def _score(request: web.Request, job: Callable, budget_ms: float = DEADLINE_MS) -> web.Response:
+    if not core._READY.is_set():
+        return _json_response({"error": core.STARTING_ERROR, "state": core.STARTUP["state"]}, 503,
+                              {"Retry-After": RETRY_AFTER})
+    deadline = _deadline(request, budget_ms)
+    try:
+        # Read the whole body on the loop first: a slow upload costs no inference thread
+        raw = await asyncio.wait_for(request.read(), timeout=max(0.0, deadline - time.monotonic()))
+        status, body, content_type = await EXECUTOR.run(job, raw, core.current_bundle(), deadline=deadline)
+    except Overloaded:
+        return _json_response({"error": "Servicio saturado, reintente más tarde"}, 429,
+                              {"Retry-After": RETRY_AFTER})
+    except (DeadlineExceeded, asyncio.TimeoutError):
+        return _json_response({"error": "Tiempo límite de la petición agotado"}, 504)
+    except Exception as e:
+        print(f"Async request failed: {e}")
+        return _json_response({"error": "Error interno al puntuar"}, 500)
+    return web.Response(body=body, status=status, content_type=content_type)
+
+
+async def predict(request: web.Request) -> web.Response:
+    return await _score(request, _predict_job)
+
+
+async def predict_batch(request: web.Request) -> web.Response:
+    # JSON, MessagePack or Arrow IPC in (Content-Type) and out (Accept), as in app.py
+    try:
+        fmt = wire.request_format(request.content_type)
+    except wire.UnsupportedFormat as e:
+        return _json_response({"error": str(e)}, 415)
+    out_fmt = wire.negotiate(request.headers.get("Accept"), fmt)
+    return await _score(request, partial(_batch_job, fmt, out_fmt), BATCH_DEADLINE_MS)
+
+
+async def health(request: web.Request) -> web.Response:
+    return _json_response({"status": "UP"})
+
+
+async def health_ready(request: web.Request) -> web.Response:
+    body, status = core.readiness()
+    body["in_flight"] = EXECUTOR.in_flight
+    body["capacity"] = EXECUTOR.capacity
+    return _json_response(body, status)
+
+
+async def metrics(request: web.Request) -> web.Response:
+    if core.prometheus_client is None:
+        return _json_response({"error": "prometheus_client no está instalado"}, 501)
+    from prometheus_client import CONTENT_TYPE_LATEST
+    return web.Response(body=core.metrics_payload(), headers={"Content-Type": CONTENT_TYPE_LATEST})
+
+
+@web.middleware
+async def _observe_request(request: web.Request, handler):
+    started = time.perf_counter()
+    resp = await handler(request)
+    if core.prometheus_client is not None:
+        route = request.match_info.route.resource
+        endpoint = route.canonical if route is not None else "unmatched"
+        core.REQUEST_SECONDS.labels(endpoint, str(resp.status)).observe(time.perf_counter() - started)
+    return resp
+
+
+async def _on_startup(application: web.Application) -> None:
+    EXECUTOR.start()
+
+
+async def _on_cleanup(application: web.Application) -> None:
+    EXECUTOR.shutdown()
+
+
+def create_app() -> web.Application:
+    application = web.Application(middlewares=[_observe_request], client_max_size=int(MAX_BODY_MB * 1024 * 1024))
+    application.router.add_post("/predict", predict)
+    application.router.add_post("/predict/batch", predict_batch)
+    application.router.add_get("/health", health)
+    application.router.add_get("/health/live", health)
+    application.router.add_get("/health/ready", health_ready)
+    application.router.add_get("/metrics", metrics)
+    application.on_startup.append(_on_startup)
+    application.on_cleanup.append(_on_cleanup)
+    return application
+
+
+app = create_app()
+
+
+if __name__ == "__main__":
+    core.start_model_watcher()
+    web.run_app(app, host="0.0.0.0", port=int(os.getenv("PORT", "8000")))
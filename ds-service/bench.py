@@ -0,0 +1,346 @@
+"""Benchmark harness for the DS scoring paths.
+
+Measures latency percentiles (p50/p95/p99) and throughput for the in-process scorers
+and for the HTTP endpoints, on seeded synthetic payloads and on a replay of a CSV.
+Results are written as JSON so runs can be compared across commits and model versions.
+
+    python bench.py --out bench.json
+    python bench.py --url http://localhost:8000 --concurrency 1,8,32 --out bench.json
+    python bench.py --compare baseline.json --out bench.json
+
+Without --url, the app is served in-process on an ephemeral port for the HTTP cases. With
+--url only the HTTP cases run, so every result in the report comes from the server's model.
+The prediction cache is disabled unless --cache is given, so repeats measure scoring.
+"""
+import os
+import io
+import sys
+import csv
+import json
+import time
+import random
+import platform
+import argparse
+import threading
+import subprocess
+import http.client
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import redirect_stdout
+from typing import Callable, List, Optional
+from urllib.parse import urlsplit
+
+import numpy as np
+
+import wire
+from schema import ENUMS as CATEGORIES, NUMBERS
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_CSV = os.path.join(HERE, "..", "samples", "Telco-Customer-Churn-19-Columns-Extended.csv")
+
+
+def synthetic_rows(n: int, seed: int = 0) -> List[dict]:
+    """Valid canonical payloads (README input rules), reproducible for a given seed."""
+    rng = random.Random(seed)
+    rows = []
+    for _ in range(n):
+        row = {field: rng.choice(values) for field, values in CATEGORIES.items()}
+        tenure = rng.randint(0, 72)
+        monthly = round(rng.uniform(18.0, 120.0), 2)
+        row.update(SeniorCitizen=rng.choice([0, 1]), tenure=tenure, MonthlyCharges=monthly,
+                   TotalCharges=round(tenure * monthly * rng.uniform(0.9, 1.1), 2))
+        rows.append(row)
+    return rows
+
+
+def encode_rows(rows: List[dict], fmt: str) -> bytes:
+    """A /predict/batch request body in a wire format (Arrow with dictionary-encoded categoricals)."""
+    if fmt != wire.ARROW:
+        return wire.encode(rows, fmt)
+    kinds = {field: "category" for field in CATEGORIES}
+    kinds.update({field: "int" if spec[2] else "float" for field, spec in NUMBERS.items()})
+    return wire.encode_arrow({field: [r.get(field) for r in rows] for field in kinds}, kinds)
+
+
+def csv_rows(path: str, limit: Optional[int] = None) -> List[dict]:
+    with open(path, encoding="utf-8-sig", newline="") as fh:
+        rows = list(csv.DictReader(fh))
+    return rows[:limit] if limit else rows
+
+
+def summarize(name: str, latencies: List[float], rows_per_call: int, wall: float, **extra) -> dict:
+    lat = np.asarray(latencies, dtype=np.float64) * 1000.0
+    calls = int(lat.size)
+    result = {
+        "name": name,
+        "calls": calls,
+        "rows_per_call": rows_per_call,
+        "p50_ms": float(np.percentile(lat, 50)) if calls else None,
+        "p95_ms": float(np.percentile(lat, 95)) if calls else None,
+        "p99_ms": float(np.percentile(lat, 99)) if calls else None,
+        "mean_ms": float(lat.mean()) if calls else None,
+        "max_ms": float(lat.max()) if calls else None,
+        "wall_s": wall,
+        "calls_per_s": calls / wall if wall > 0 else None,
+        "rows_per_s": calls * rows_per_call / wall if wall > 0 else None,
+    }
+    result.update(extra)
+    print(f"{name:<44} p50 {result['p50_ms']:9.3f} ms  p99 {result['p99_ms']:9.3f} ms  "
+          f"{result['rows_per_s']:12,.0f} rows/s", file=sys.stderr)
+    return result
+
+
+def time_calls(name: str, fn: Callable, args_list: list, rows_per_call: int = 1, warmup: int = 3, **extra) -> dict:
+    for args in args_list[:warmup]:
+        fn(args)
+    latencies = []
+    started = time.perf_counter()
+    for args in args_list:
+        t0 = time.perf_counter()
+        fn(args)
+        latencies.append(time.perf_counter() - t0)
+    return summarize(name, latencies, rows_per_call, time.perf_counter() - started, **extra)
+
+
+def batches(rows: List[dict], size: int, limit: int) -> List[List[dict]]:
+    out = [rows[i:i + size] for i in range(0, len(rows) - size + 1, size)]
+    return out[:max(1, limit)]
+
+
+# HTTP
+
+class Client:
+    """One keep-alive connection per thread; reconnects when the server closes it."""
+
+    def __init__(self, base_url: str):
+        parts = urlsplit(base_url)
+        self.host, self.port = parts.hostname, parts.port or 80
+        self.local = threading.local()
+
+    def post(self, path: str, body: bytes, content_type: str) -> int:
+        for attempt in range(2):
+            conn = getattr(self.local, "conn", None)
+            if conn is None:
+                conn = self.local.conn = http.client.HTTPConnection(self.host, self.port, timeout=60)
+            try:
+                # Responses come back in the request's format
+                conn.request("POST", path, body=body, headers={"Content-Type": content_type, "Accept": content_type})
+                resp = conn.getresponse()
+                resp.read()
+                if resp.getheader("Connection", "").lower() == "close" or resp.version == 10:
+                    conn.close()
+                    self.local.conn = None
+                return resp.status
+            except (http.client.HTTPException, OSError):
+                conn.close()
+                self.local.conn = None
+                if attempt:
+                    raise
+        return 0
+
+
+def target_model(base_url: str) -> dict:
+    """model_version and scoring_kernel that a running server reports on /health/ready."""
+    parts = urlsplit(base_url)
+    conn = http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=10)
+    try:
+        # 503 while the server is still starting, with the same body
+        conn.request("GET", "/health/ready")
+        body = json.loads(conn.getresponse().read())
+    except (http.client.HTTPException, OSError, ValueError) as e:
+        print(f"Could not read {base_url}/health/ready: {e}", file=sys.stderr)
+        body = {}
+    finally:
+        conn.close()
+    return {"model_version": body.get("model_version"), "scoring_kernel": body.get("scoring_kernel")}
+
+
+def http_load(name: str, client: Client, path: str, bodies: List[bytes], content_type: str,
+              concurrency: int, rows_per_call: int) -> dict:
+    for body in bodies[:3]:
+        client.post(path, body, content_type)
+    latencies: List[float] = []
+    errors = [0]
+    lock = threading.Lock()
+
+    def one(body: bytes):
+        t0 = time.perf_counter()
+        status = client.post(path, body, content_type)
+        elapsed = time.perf_counter() - t0
+        with lock:
+            latencies.append(elapsed)
+            if status != 200:
+                errors[0] += 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(one, bodies))
+    return summarize(name, latencies, rows_per_call, time.perf_counter() - started,
+                     concurrency=concurrency, errors=errors[0])
+
+
+def serve_in_process(flask_app) -> str:
+    from werkzeug.serving import WSGIRequestHandler, make_server
+
+    class QuietHandler(WSGIRequestHandler):
+        protocol_version = "HTTP/1.1"  # keep-alive, like gunicorn
+
+        def log_request(self, *args, **kwargs):
+            pass
+
+    server = make_server("127.0.0.1", 0, flask_app, threaded=True, request_handler=QuietHandler)
+    threading.Thread(target=server.serve_forever, name="bench-server", daemon=True).start()
+    return f"http://127.0.0.1:{server.server_port}"
+
+
+def git_commit() -> Optional[str]:
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=HERE, capture_output=True, text=True, timeout=5)
+        return out.stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def compare(previous: dict, current: dict) -> None:
+    """Print p50/p99/throughput ratios (current / previous) for the cases both runs share."""
+    old = {r["name"]: r for r in previous.get("results", [])}
+    print(f"\nvs {previous.get('meta', {}).get('git_commit')} "
+          f"({previous.get('meta', {}).get('model_version')})", file=sys.stderr)
+    for r in current["results"]:
+        o = old.get(r["name"])
+        if not o or not o.get("p50_ms") or not o.get("rows_per_s"):
+            continue
+        print(f"{r['name']:<44} p50 x{r['p50_ms'] / o['p50_ms']:5.2f}  p99 x{r['p99_ms'] / o['p99_ms']:5.2f}  "
+              f"rows/s x{r['rows_per_s'] / o['rows_per_s']:5.2f}", file=sys.stderr)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the churn DS scoring paths")
+    parser.add_argument("--csv", default=DEFAULT_CSV, help="CSV replayed through the scorers and /predict/csv")
+    parser.add_argument("--rows", type=int, default=2000, help="Single-row calls per in-process case")
+    parser.add_argument("--requests", type=int, default=1000, help="Requests per HTTP case")
+    parser.add_argument("--batch-sizes", default="100,1000", help="Rows per call for the batch cases")
+    parser.add_argument("--concurrency", default="1,4,16", help="Client threads for the HTTP cases")
+    parser.add_argument("--formats", default="json,msgpack,arrow",
+                        help="Wire formats for the batch cases (the ones not installed are skipped)")
+    parser.add_argument("--url", default=None, help="Benchmark a running server instead of an in-process one")
+    parser.add_argument("--no-http", action="store_true", help="Only the in-process cases")
+    parser.add_argument("--cache", action="store_true", help="Keep the prediction cache enabled")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default=None, help="Write the JSON results here (default: stdout)")
+    parser.add_argument("--compare", default=None, help="Previous results JSON to compare against")
+    args = parser.parse_args(argv)
+
+    batch_sizes = [int(b) for b in args.batch_sizes.split(",") if b]
+    levels = [int(c) for c in args.concurrency.split(",") if c]
+    names = {"json": wire.JSON, "msgpack": wire.MSGPACK, "arrow": wire.ARROW}
+    formats = [(name, names[name]) for name in args.formats.split(",") if names.get(name) in wire.available()]
+    if not args.cache:
+        os.environ["DS_CACHE_SIZE"] = "0"
+    os.environ.setdefault("DS_STARTUP", "sync")
+
+    with redirect_stdout(sys.stderr):
+        import app
+        app.wait_until_ready()
+    bundle = app.current_bundle()
+    no_attr = bundle._replace(attribution=None)
+
+    synthetic = synthetic_rows(max(args.rows, max(batch_sizes) * 5), args.seed)
+    replay = [app._normalize_features(r) for r in csv_rows(args.csv)] if args.csv else []
+    singles = [[r] for r in synthetic[:args.rows]]
+    results = []
+
+    # In-process scorers (local bundle); skipped with --url, where the report describes the server
+    if not args.url:
+        results.append(time_calls("heuristic_score", lambda r: app.heuristic_score(r[0]), singles))
+        if bundle.model is not None:
+            results.append(time_calls("predict_with_model", lambda r: app.predict_with_model(r[0], bundle), singles))
+            results.append(time_calls("predict_with_model/no_attribution",
+                                      lambda r: app.predict_with_model(r[0], no_attr), singles))
+        for size in batch_sizes:
+            calls = batches(synthetic, size, 20)
+            results.append(time_calls(f"heuristic_score_batch/{size}",
+                                      lambda rows: app.heuristic_score_batch(app.heuristic_columns(rows)),
+                                      calls, size))
+            if bundle.model is not None:
+                results.append(time_calls(f"predict_batch_with_model/{size}",
+                                          lambda rows: app.predict_batch_with_model(rows, bundle), calls, size))
+                results.append(time_calls(f"predict_batch_with_model/{size}/no_attribution",
+                                          lambda rows: app.predict_batch_with_model(rows, no_attr), calls, size))
+            results.append(time_calls(f"score_batch/{size}", lambda rows: app.score_batch(rows, bundle), calls, size))
+            # Wire formats: request decoding and response encoding, without the scoring
+            scored = [app.score_valid(rows, bundle) for rows in calls]
+            for name, fmt in formats:
+                bodies = [encode_rows(rows, fmt) for rows in calls]
+                results.append(time_calls(f"decode/{name}/{size}", lambda body: wire.decode(body, fmt), bodies, size,
+                                          bytes_per_call=len(bodies[0])))
+                results.append(time_calls(f"encode_batch/{name}/{size}",
+                                          lambda out: app.encode_batch(out[0], bundle.version, out[1], fmt),
+                                          scored, size))
+        if replay:
+            results.append(time_calls("score_batch/csv_replay", lambda rows: app.score_batch(rows, bundle),
+                                      [replay], len(replay), warmup=1, source=os.path.basename(args.csv)))
+
+    # HTTP
+    if not args.no_http:
+        base_url = args.url or serve_in_process(app.app)
+        client = Client(base_url)
+        predict_bodies = [json.dumps(r).encode() for r in (synthetic * (args.requests // len(synthetic) + 1))[:args.requests]]
+        for level in levels:
+            results.append(http_load(f"http/predict/c{level}", client, "/predict", predict_bodies,
+                                     "application/json", level, 1))
+        for size in batch_sizes:
+            for name, fmt in formats:
+                bodies = [encode_rows(rows, fmt) for rows in batches(synthetic, size, 20)]
+                # JSON keeps the historical case names so older results still compare
+                label = f"http/predict_batch/{size}" if fmt == wire.JSON else f"http/predict_batch/{size}/{name}"
+                for level in levels:
+                    results.append(http_load(f"{label}/c{level}", client, "/predict/batch", bodies, fmt, level, size))
+        if replay:
+            buf = io.StringIO()
+            writer = csv.DictWriter(buf, fieldnames=app.CANONICAL_FIELDS, extrasaction="ignore")
+            writer.writeheader()
+            writer.writerows(replay)
+            body = buf.getvalue().encode("utf-8")
+            results.append(http_load("http/predict_csv/replay", client, "/predict/csv", [body] * 5, "text/csv",
+                                     1, len(replay)))
+
+    # With --url the meta describes the benchmarked server, not the local bundle
+    model = target_model(args.url) if args.url else {
+        "model_version": bundle.version,
+        "model_path": bundle.path,
+        "fast_artifact": type(bundle.model).__name__ == "FastModel",
+        "scoring_kernel": bundle.kernel.name if bundle.kernel is not None else "pipeline",
+    }
+    report = {
+        "meta": {
+            "git_commit": git_commit(),
+            "model_version": model["model_version"],
+            "model_path": model.get("model_path"),
+            "fast_artifact": model.get("fast_artifact"),
+            "scoring_kernel": model["scoring_kernel"],
+            "cache": args.cache,
+            "url": args.url,
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "wire_formats": wire.available(),
+            "orjson": wire.orjson is not None,
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "args": vars(args),
+        },
+        "results": results,
+    }
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as fh:
+            fh.write(text)
+    else:
+        sys.stdout.write(text + "\n")
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as fh:
+            compare(json.load(fh), report)
+
+
+if __name__ == "__main__":
+    main()
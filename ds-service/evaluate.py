@@ -0,0 +1,179 @@
+"""Offline evaluation of churn probabilities against labels (NumPy only).
+
+One sort of the probabilities gives the confusion matrix at every threshold, ROC-AUC and
+PR-AUC; calibration bins come from a single bincount. The service exposes it as
+POST /evaluate; from the command line it scores a labeled CSV with the live model:
+
+    python evaluate.py --csv ../samples/labeled.csv --step 0.01 --bins 10
+"""
+import os
+import sys
+import csv
+import json
+import argparse
+from contextlib import redirect_stdout
+from typing import Iterable, List, Optional, Sequence
+
+import numpy as np
+
+DEFAULT_STEP = 0.05
+DEFAULT_BINS = 10
+# Cut-offs behind risk_level in build_response (Bajo < 0.33 <= Medio < 0.66 <= Alto)
+RISK_CUTS = (0.33, 0.66)
+
+
+def churn_labels(values: Iterable) -> np.ndarray:
+    """Churn column as booleans, with the API's rules: Yes/1 churned, anything else did not."""
+    s = np.char.strip(np.asarray([str(v) if v is not None else "" for v in values], dtype=str))
+    return (np.char.lower(s) == "yes") | (s == "1")
+
+
+def threshold_grid(step: float = DEFAULT_STEP, extra: Sequence[float] = (0.5,) + RISK_CUTS) -> np.ndarray:
+    grid = np.arange(step, 1.0, step)
+    return np.unique(np.round(np.concatenate([grid, extra]), 6))
+
+
+def _rates(tp, fp, fn, tn) -> dict:
+    tp, fp, fn, tn = (np.asarray(a, dtype=np.float64) for a in (tp, fp, fn, tn))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        precision = np.where(tp + fp > 0, tp / (tp + fp), 0.0)
+        recall = np.where(tp + fn > 0, tp / (tp + fn), 0.0)
+        f1 = np.where(precision + recall > 0, 2 * precision * recall / (precision + recall), 0.0)
+        total = tp + fp + fn + tn
+        accuracy = np.where(total > 0, (tp + tn) / total, 0.0)
+    return {"accuracy": accuracy, "precision": precision, "recall": recall, "f1": f1}
+
+
+def evaluate_scores(y_true, probs, thresholds: Optional[Sequence[float]] = None,
+                    bins: int = DEFAULT_BINS, risk_cuts: Sequence[float] = RISK_CUTS) -> dict:
+    """Threshold sweep, ROC-AUC, PR-AUC (average precision), calibration and risk bands.
+
+    A row is predicted positive when its probability is >= the threshold, like /predict.
+    """
+    y = np.asarray(y_true, dtype=bool)
+    p = np.asarray(probs, dtype=np.float64)
+    if y.shape != p.shape:
+        raise ValueError(f"{y.size} etiquetas para {p.size} probabilidades")
+    n = int(y.size)
+    pos = int(np.count_nonzero(y))
+    neg = n - pos
+    thresholds = threshold_grid() if thresholds is None else np.unique(np.asarray(thresholds, dtype=np.float64))
+
+    # Descending sort: the first k rows are exactly those predicted positive at any cut
+    order = np.argsort(-p, kind="stable")
+    p_desc = p[order]
+    tps = np.cumsum(y[order], dtype=np.int64)
+    fps = np.arange(1, n + 1, dtype=np.int64) - tps
+
+    # Confusion matrix at every threshold: k = #(p >= t), found by binary search.
+    # Counts are looked up with a leading zero for k = 0 (also what an empty input gets)
+    k = np.searchsorted(-p_desc, -thresholds, side="right")
+    tp = np.r_[0, tps][k]
+    fp = np.r_[0, fps][k]
+    fn = pos - tp
+    tn = neg - fp
+    rates = _rates(tp, fp, fn, tn)
+    sweep = [
+        {
+            "threshold": float(t), "tp": int(tp[i]), "fp": int(fp[i]), "fn": int(fn[i]), "tn": int(tn[i]),
+            "accuracy": float(rates["accuracy"][i]), "precision": float(rates["precision"][i]),
+            "recall": float(rates["recall"][i]), "f1": float(rates["f1"][i]),
+            "predicted_positive_rate": float(k[i] / n) if n else 0.0,
+        }
+        for i, t in enumerate(thresholds)
+    ]
+
+    # ROC and PR curves only change where the probability changes (ties move together)
+    roc_auc = pr_auc = None
+    if n and pos and neg:
+        last = np.r_[np.flatnonzero(np.diff(p_desc)), n - 1]
+        tpr = np.r_[0.0, tps[last] / pos]
+        fpr = np.r_[0.0, fps[last] / neg]
+        roc_auc = float(np.sum(np.diff(fpr) * (tpr[1:] + tpr[:-1]) / 2))
+        precision_curve = tps[last] / (last + 1)
+        pr_auc = float(np.sum(np.diff(tpr) * precision_curve))
+
+    # Calibration: uniform bins over [0, 1]
+    idx = np.clip((p * bins).astype(np.int64), 0, bins - 1)
+    count = np.bincount(idx, minlength=bins)
+    sum_p = np.bincount(idx, weights=p, minlength=bins)
+    sum_y = np.bincount(idx, weights=y, minlength=bins)
+    calibration = []
+    ece = 0.0
+    for b in range(bins):
+        if count[b] == 0:
+            calibration.append({"bin": [b / bins, (b + 1) / bins], "count": 0,
+                                "mean_probability": None, "observed_rate": None})
+            continue
+        mean_p = sum_p[b] / count[b]
+        rate = sum_y[b] / count[b]
+        ece += count[b] / n * abs(rate - mean_p)
+        calibration.append({"bin": [b / bins, (b + 1) / bins], "count": int(count[b]),
+                            "mean_probability": float(mean_p), "observed_rate": float(rate)})
+
+    # Observed churn per risk band at the current cut-offs
+    band = np.searchsorted(np.asarray(risk_cuts, dtype=np.float64), p, side="right")
+    band_count = np.bincount(band, minlength=len(risk_cuts) + 1)
+    band_pos = np.bincount(band, weights=y, minlength=len(risk_cuts) + 1)
+    edges = [0.0, *risk_cuts, 1.0]
+    risk_bands = [
+        {"range": [edges[b], edges[b + 1]], "count": int(band_count[b]),
+         "observed_rate": float(band_pos[b] / band_count[b]) if band_count[b] else None}
+        for b in range(len(risk_cuts) + 1)
+    ]
+
+    best = max(sweep, key=lambda r: r["f1"]) if sweep else None
+    return {
+        "total": n,
+        "positives": pos,
+        "negatives": neg,
+        "roc_auc": roc_auc,
+        "pr_auc": pr_auc,
+        "brier": float(np.mean((p - y) ** 2)) if n else None,
+        "ece": float(ece) if n else None,
+        "best_f1_threshold": best["threshold"] if best else None,
+        "thresholds": sweep,
+        "calibration": calibration,
+        "risk_bands": risk_bands,
+    }
+
+
+def find_label_column(fieldnames: Optional[List[str]]) -> Optional[str]:
+    # Same lookup as the API: header named Churn in any case
+    for name in fieldnames or []:
+        if name.strip().lower() == "churn":
+            return name
+    return None
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Evaluate the churn model on a labeled CSV")
+    parser.add_argument("--csv", required=True, help="CSV with the canonical columns and Churn (Yes/No)")
+    parser.add_argument("--step", type=float, default=DEFAULT_STEP, help="Threshold sweep step")
+    parser.add_argument("--thresholds", default=None, help="Comma-separated thresholds (overrides --step)")
+    parser.add_argument("--bins", type=int, default=DEFAULT_BINS, help="Calibration bins")
+    parser.add_argument("--chunk-size", type=int, default=None, help="Rows scored per model call")
+    parser.add_argument("--out", default=None, help="Write the JSON report here instead of stdout")
+    args = parser.parse_args(argv)
+
+    thresholds = [float(t) for t in args.thresholds.split(",")] if args.thresholds else threshold_grid(args.step)
+    # The service logs to stdout; keep stdout for the report
+    with redirect_stdout(sys.stderr):
+        # Load the model in this process before scoring
+        os.environ.setdefault("DS_STARTUP", "sync")
+        import app
+
+        with open(args.csv, encoding="utf-8-sig", newline="") as fh:
+            reader = csv.DictReader(fh)
+            report = app.evaluate_reader(reader, args.chunk_size or app.CSV_CHUNK_SIZE, thresholds, args.bins)
+
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as fh:
+            fh.write(text)
+    else:
+        sys.stdout.write(text + "\n")
+
+
+if __name__ == "__main__":
+    main()
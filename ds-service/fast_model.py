@@ -0,0 +1,326 @@
+"""Fast-start model artifact for the DS service.
+
+`export` turns a loaded `pipeline_churn_v2.joblib` into a directory of `.npy`
+arrays plus a `manifest.json`: the preprocessor folded into an affine map,
+the classifier as linear coefficients or flattened tree arrays, and the
+attribution weights. `FastModel.load` memory-maps those arrays and scores
+with NumPy only, so a replica can serve without importing pandas, sklearn
+or xgboost.
+
+    python fast_model.py export --model /models/pipeline_churn_v2.joblib \
+        --out /models/pipeline_churn_v2.fast --version v2.0
+"""
+import argparse
+import json
+import math
+import os
+import time
+import shutil
+import tempfile
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+FORMAT = "churn-fast"
+FORMAT_VERSION = 1
+MANIFEST = "manifest.json"
+
+
+def _sigmoid(z):
+    return 1.0 / (1.0 + np.exp(-z))
+
+
+class AffinePreprocessor:
+    """Preprocessor folded into X_tr = X @ A + b (scalers, passthrough, column reordering)."""
+
+    def __init__(self, A, b, names: List[str]):
+        self.A = A
+        self.b = b
+        self.names = list(names)
+
+    def transform(self, X):
+        return np.asarray(X, dtype=np.float64) @ self.A + self.b
+
+    def get_feature_names_out(self):
+        return np.asarray(self.names, dtype=object)
+
+
+class LinearScorer:
+    def __init__(self, coef, intercept: float):
+        self.coef_ = np.asarray(coef).reshape(1, -1)
+        self.intercept = float(intercept)
+
+    def predict_proba(self, X_tr):
+        p = _sigmoid(np.asarray(X_tr, dtype=np.float64) @ self.coef_[0] + self.intercept)
+        return np.column_stack([1.0 - p, p])
+
+
+class TreeEnsembleScorer:
+    """Binary-logistic tree ensemble over padded (n_trees x n_nodes) arrays.
+
+    Follows XGBoost's split semantics: float32 `x < threshold` goes left,
+    NaN takes the node's default direction.
+    """
+
+    def __init__(self, feature, threshold, left, right, default_left, value, base_margin: float,
+                 depth: int, weights=None):
+        self.feature = feature
+        self.threshold = threshold
+        self.left = left
+        self.right = right
+        self.default_left = default_left
+        self.value = value
+        self.base_margin = float(base_margin)
+        self.depth = int(depth)
+        if weights is not None:
+            self.feature_importances_ = weights
+
+    def margin(self, X_tr):
+        X = np.asarray(X_tr, dtype=np.float32)
+        n = X.shape[0]
+        n_trees = self.feature.shape[0]
+        rows = np.arange(n)[:, None]
+        trees = np.arange(n_trees)[None, :]
+        node = np.zeros((n, n_trees), dtype=np.int32)
+        for _ in range(self.depth):
+            feat = self.feature[trees, node]
+            leaf = feat < 0
+            x = X[rows, np.where(leaf, 0, feat)]
+            go_left = np.where(np.isnan(x), self.default_left[trees, node], x < self.threshold[trees, node])
+            nxt = np.where(go_left, self.left[trees, node], self.right[trees, node])
+            node = np.where(leaf, node, nxt)
+        return self.base_margin + self.value[trees, node].sum(axis=1, dtype=np.float64)
+
+    def predict_proba(self, X_tr):
+        p = _sigmoid(self.margin(X_tr))
+        return np.column_stack([1.0 - p, p])
+
+
+class FastModel:
+    """Preprocessor + classifier pair with the same predict_proba contract as the sklearn pipeline."""
+
+    def __init__(self, preproc: AffinePreprocessor, clf, columns: List[str], manifest: dict):
+        self.preproc = preproc
+        self.clf = clf
+        self.columns = list(columns)
+        self.manifest = manifest
+        self.steps = [("preprocessor", preproc), ("classifier", clf)]
+        self.named_steps = {"preprocessor": preproc, "classifier": clf}
+
+    @property
+    def version(self) -> str:
+        return self.manifest.get("model_version", "v2.0")
+
+    def predict_proba(self, X):
+        return self.clf.predict_proba(self.preproc.transform(X))
+
+    @classmethod
+    def load(cls, path: str, mmap: bool = True) -> "FastModel":
+        with open(os.path.join(path, MANIFEST), encoding="utf-8") as fh:
+            manifest = json.load(fh)
+        if manifest.get("format") != FORMAT or manifest.get("format_version") != FORMAT_VERSION:
+            raise ValueError(f"Unsupported fast artifact format in {path}")
+        mode = "r" if mmap else None
+
+        def arr(name):
+            return np.load(os.path.join(path, f"{name}.npy"), mmap_mode=mode)
+
+        preproc = AffinePreprocessor(arr("affine_A"), arr("affine_b"), manifest["transformed_names"])
+        weights = arr("weights")
+        if manifest["kind"] == "linear":
+            clf = LinearScorer(arr("coef"), manifest["intercept"])
+        elif manifest["kind"] == "trees":
+            clf = TreeEnsembleScorer(
+                arr("tree_feature"), arr("tree_threshold"), arr("tree_left"), arr("tree_right"),
+                arr("tree_default_left"), arr("tree_value"), manifest["base_margin"], manifest["depth"],
+                weights=weights,
+            )
+        else:
+            raise ValueError(f"Unknown fast artifact kind: {manifest['kind']}")
+        return cls(preproc, clf, manifest["columns"], manifest)
+
+
+def fast_artifact_path(model_dir: str, artifact: str) -> str:
+    base = artifact[:-len(".joblib")] if artifact.endswith(".joblib") else artifact
+    return os.path.join(model_dir, base + ".fast")
+
+
+# --- Export (needs the full training stack: pandas/sklearn/xgboost) -------------------------
+
+
+def _split_pipeline(pipe):
+    steps = getattr(pipe, "steps", None)
+    if not steps or len(steps) < 2:
+        raise ValueError("Expected a sklearn Pipeline with a preprocessor and a classifier")
+    return pipe[:-1], steps[-1][1]
+
+
+def fold_affine(preproc, columns: List[str], tol: float = 1e-8) -> Tuple[np.ndarray, np.ndarray]:
+    """Probe the preprocessor with unit vectors and check it is affine on random rows."""
+    import pandas as pd
+
+    def run(X):
+        out = preproc.transform(pd.DataFrame(X, columns=columns))
+        return np.asarray(out.toarray() if hasattr(out, "toarray") else out, dtype=np.float64)
+
+    n = len(columns)
+    b = run(np.zeros((1, n)))[0]
+    A = run(np.eye(n)) - b
+    rng = np.random.default_rng(0)
+    probe = rng.uniform(-100.0, 100.0, size=(64, n))
+    expected = run(probe)
+    err = float(np.max(np.abs(expected - (probe @ A + b))))
+    if err > tol * max(1.0, float(np.max(np.abs(expected)))):
+        raise ValueError(f"Preprocessor is not affine on the encoded columns (max error {err:.3g})")
+    return A, b
+
+
+def _flatten_xgb(booster):
+    """Flatten an XGBoost booster's JSON dump into padded per-tree node arrays."""
+    names = booster.feature_names
+    index = {name: i for i, name in enumerate(names)} if names else None
+    dumps = [json.loads(t) for t in booster.get_dump(dump_format="json")]
+
+    def walk(node, acc):
+        acc[node["nodeid"]] = node
+        for child in node.get("children", []):
+            walk(child, acc)
+        return acc
+
+    trees = [walk(t, {}) for t in dumps]
+    width = max(max(t) + 1 for t in trees)
+    depth = 0
+    shape = (len(trees), width)
+    feature = np.full(shape, -1, dtype=np.int32)
+    threshold = np.zeros(shape, dtype=np.float32)
+    left = np.zeros(shape, dtype=np.int32)
+    right = np.zeros(shape, dtype=np.int32)
+    default_left = np.zeros(shape, dtype=bool)
+    value = np.zeros(shape, dtype=np.float32)
+    for t, nodes in enumerate(trees):
+        for nid, node in nodes.items():
+            depth = max(depth, node.get("depth", 0) + 1)
+            if "leaf" in node:
+                value[t, nid] = node["leaf"]
+                continue
+            split = node["split"]
+            feature[t, nid] = index[split] if index else int(split[1:])
+            threshold[t, nid] = node["split_condition"]
+            left[t, nid] = node["yes"]
+            right[t, nid] = node["no"]
+            default_left[t, nid] = node["missing"] == node["yes"]
+    return feature, threshold, left, right, default_left, value, depth
+
+
+def _xgb_base_margin(booster) -> float:
+    cfg = json.loads(booster.save_config())
+    learner = cfg["learner"]
+    objective = learner["objective"]["name"]
+    if objective != "binary:logistic":
+        raise ValueError(f"Unsupported XGBoost objective: {objective}")
+    base_score = float(str(learner["learner_model_param"]["base_score"]).strip("[]"))
+    return math.log(base_score / (1.0 - base_score))
+
+
+def export(model_path: str, out_dir: str, version: Optional[str] = None) -> dict:
+    import joblib
+
+    pipe = joblib.load(model_path)
+    preproc, clf = _split_pipeline(pipe)
+    columns = [str(c) for c in getattr(pipe, "feature_names_in_", [])]
+    if not columns:
+        raise ValueError("Pipeline has no feature_names_in_; cannot derive the encoded columns")
+    A, b = fold_affine(preproc, columns)
+    names = [str(n) for n in preproc.get_feature_names_out()]
+
+    arrays = {"affine_A": A, "affine_b": b}
+    manifest = {
+        "format": FORMAT,
+        "format_version": FORMAT_VERSION,
+        "model_version": version or "v2.0",
+        "columns": columns,
+        "transformed_names": names,
+        "source": os.path.abspath(model_path),
+        "source_mtime": os.path.getmtime(model_path),
+        "exported_at": time.time(),
+    }
+    if hasattr(clf, "coef_"):
+        coef = np.asarray(clf.coef_, dtype=np.float64).reshape(-1)
+        arrays["coef"] = coef
+        arrays["weights"] = coef
+        manifest["kind"] = "linear"
+        manifest["intercept"] = float(np.ravel(clf.intercept_)[0])
+    elif hasattr(clf, "get_booster"):
+        booster = clf.get_booster()
+        feature, threshold, left, right, default_left, value, depth = _flatten_xgb(booster)
+        arrays.update({
+            "tree_feature": feature, "tree_threshold": threshold, "tree_left": left, "tree_right": right,
+            "tree_default_left": default_left, "tree_value": value,
+            "weights": np.asarray(clf.feature_importances_, dtype=np.float64),
+        })
+        manifest["kind"] = "trees"
+        manifest["depth"] = depth
+        manifest["base_margin"] = _xgb_base_margin(booster)
+    else:
+        raise ValueError(f"Unsupported classifier for fast export: {type(clf).__name__}")
+
+    # Built in a sibling temp dir and moved into place only once it matches the pipeline,
+    # so a diverging or partial export never sits at `out_dir` for the service to load
+    out_dir = os.path.abspath(out_dir)
+    parent = os.path.dirname(out_dir)
+    os.makedirs(parent, exist_ok=True)
+    tmp_dir = tempfile.mkdtemp(prefix=os.path.basename(out_dir) + ".", suffix=".tmp", dir=parent)
+    try:
+        for name, arr in arrays.items():
+            np.save(os.path.join(tmp_dir, f"{name}.npy"), arr)
+        _write_manifest(tmp_dir, manifest)
+
+        # Sanity check against the original pipeline on random encoded rows
+        import pandas as pd
+        rng = np.random.default_rng(1)
+        # One-hot style 0/1 columns with the numeric ones (tenure/charges come first) spread out
+        X = rng.integers(0, 2, size=(256, len(columns))).astype(np.float64)
+        n_num = min(3, len(columns))
+        X[:, :n_num] = rng.uniform(0, 100, size=(256, n_num))
+        ref = pipe.predict_proba(pd.DataFrame(X, columns=columns))[:, 1]
+        got = FastModel.load(tmp_dir, mmap=False).predict_proba(X)[:, 1]
+        manifest["max_abs_error"] = float(np.max(np.abs(ref - got)))
+        if manifest["max_abs_error"] > 1e-5:
+            raise ValueError(f"Fast artifact diverges from the pipeline (max error {manifest['max_abs_error']:.3g})")
+        # Manifest last: its presence marks a complete artifact
+        _write_manifest(tmp_dir, manifest)
+        if os.path.exists(out_dir):
+            old_dir = tempfile.mkdtemp(prefix=os.path.basename(out_dir) + ".", suffix=".old", dir=parent)
+            os.replace(out_dir, os.path.join(old_dir, "artifact"))
+            os.replace(tmp_dir, out_dir)
+            shutil.rmtree(old_dir, ignore_errors=True)
+        else:
+            os.replace(tmp_dir, out_dir)
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    return manifest
+
+
+def _write_manifest(path: str, manifest: dict) -> None:
+    with open(os.path.join(path, MANIFEST), "w", encoding="utf-8") as fh:
+        json.dump(manifest, fh, ensure_ascii=False, indent=2)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Fast-start artifact tools for the churn DS service")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    exp = sub.add_parser("export", help="Convert a joblib pipeline into a memory-mappable artifact")
+    exp.add_argument("--model", default=os.path.join(os.getenv("CHURN_MODEL_DIR", "/models"), "pipeline_churn_v2.joblib"))
+    exp.add_argument("--out", default=None, help="Output directory (default: <model>.fast next to the joblib)")
+    exp.add_argument("--version", default=None, help="model_version reported by the service (default v2.0)")
+    args = parser.parse_args(argv)
+
+    if args.cmd == "export":
+        out = args.out or fast_artifact_path(os.path.dirname(args.model), os.path.basename(args.model))
+        manifest = export(args.model, out, args.version)
+        print(f"Exported {manifest['kind']} artifact {manifest['model_version']} to {out} "
+              f"(max abs error {manifest['max_abs_error']:.2e})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+# Production serving config for the DS service: `gunicorn -c gunicorn.conf.py app:app`
+import gc
+import glob
+import multiprocessing
+import os
+import tempfile
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+
+# One process per core by default; DS_THREADS > 1 switches to threaded workers
+workers = int(os.getenv("DS_WORKERS", str(multiprocessing.cpu_count())))
+threads = int(os.getenv("DS_THREADS", "1"))
+worker_class = "gthread" if threads > 1 else "sync"
+
+# Load the joblib model once in the master; forked workers share its pages copy-on-write
+preload_app = True
+# Load synchronously in the master; each worker warms up after the fork (post_worker_init)
+os.environ.setdefault("DS_STARTUP", "preload")
+
+# Keep each worker's native thread pools at one thread so N workers don't oversubscribe the box.
+# Must be set before the app (and numpy/xgboost) is imported by the preload.
+os.environ.setdefault("OMP_NUM_THREADS", os.getenv("DS_WORKER_THREADS", "1"))
+os.environ.setdefault("OPENBLAS_NUM_THREADS", os.getenv("DS_WORKER_THREADS", "1"))
+
+# Metrics from every worker are merged through files in this dir (prometheus_client multiprocess mode).
+# Stale files from a previous run would be summed into this one; on_starting clears them.
+os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", os.path.join(tempfile.gettempdir(), "ds-prometheus"))
+os.makedirs(os.environ["PROMETHEUS_MULTIPROC_DIR"], exist_ok=True)
+
+# /admin/reload reaches a single worker: it publishes the new artifact in this file, every worker's
+# watcher follows it and recycled workers (forked from the master's preloaded bundle) apply it at start.
+# on_starting clears it so a restart begins from the configured artifact; a HUP keeps it.
+os.environ.setdefault("DS_MODEL_STATE", os.path.join(tempfile.gettempdir(), "ds-model-state.json"))
+os.environ.setdefault("DS_MODEL_WATCH_SECONDS", "5")
+
+# Worker recycling bounds slow leaks; jitter avoids all workers restarting at once
+max_requests = int(os.getenv("DS_MAX_REQUESTS", "10000"))
+max_requests_jitter = int(os.getenv("DS_MAX_REQUESTS_JITTER", "1000"))
+
+timeout = int(os.getenv("DS_TIMEOUT", "120"))
+graceful_timeout = int(os.getenv("DS_GRACEFUL_TIMEOUT", "30"))
+keepalive = 5
+
+accesslog = "-"
+errorlog = "-"
+loglevel = os.getenv("DS_LOG_LEVEL", "info")
+
+
+def on_starting(server):
+    # Once per master start. Not at module level: a HUP re-reads this file and would wipe
+    # the live counters and the model published by /admin/reload.
+    for stale in glob.glob(os.path.join(os.environ["PROMETHEUS_MULTIPROC_DIR"], "*.db")):
+        os.remove(stale)
+    if os.path.exists(os.environ["DS_MODEL_STATE"]):
+        os.remove(os.environ["DS_MODEL_STATE"])
+
+
+def pre_fork(server, worker):
+    # Move everything the preload created to the permanent generation so the
+    # cyclic GC in workers doesn't touch (and un-share) the model's pages
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    server.log.info("DS worker %s started (pid %s)", worker.age, worker.pid)
+
+
+def post_worker_init(worker):
+    import app as ds_app
+    # The master keeps the preloaded bundle: catch up with the last /admin/reload first
+    ds_app.sync_model_state()
+    # Warm up in the worker (not the master) so native thread pools are created after the fork
+    ds_app.warm_up()
+    # Threads don't survive fork: every worker runs its own model watcher (DS_MODEL_WATCH_SECONDS)
+    ds_app.start_model_watcher()
+    # Jobs left unfinished by a previous run continue from their last checkpoint
+    ds_app.start_job_runner()
+
+
+def child_exit(server, worker):
+    try:
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
+    except ImportError:
+        pass
@@ -0,0 +1,219 @@
+"""Resumable batch scoring jobs checkpointed on local disk.
+
+Layout of a job under the jobs dir (DS_JOBS_DIR):
+
+    <job_id>/input.csv              the uploaded CSV, as received
+    <job_id>/meta.json              state and progress, rewritten atomically after every chunk
+    <job_id>/chunks/000000.ndjson   one scored chunk; its presence is the checkpoint
+    <job_id>/lock                   flock'd by the process running the job
+
+Every Gunicorn worker shares the directory, so any worker can answer status and result
+requests, and a job interrupted by a restart continues from its last finished chunk. A job
+whose worker went away while the others kept serving (recycled by max_requests) is picked
+up again by the worker that answers its next status poll.
+"""
+import os
+import csv
+import json
+import time
+import uuid
+import shutil
+import itertools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import BinaryIO, Callable, Iterator, List, Optional
+
+try:
+    import fcntl
+except ImportError:  # non-POSIX: no cross-process guard, fine for a single dev server
+    fcntl = None
+
+ScoreFn = Callable[[List[dict], int], List[dict]]
+
+ACTIVE_STATES = ("queued", "running")
+
+
+class JobStore:
+    def __init__(self, root: str, workers: int = 1):
+        self.root = root
+        self.workers = max(1, workers)
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._pid = None
+        # Jobs submitted to this process's executor and not finished yet
+        self._pending: set = set()
+        self._lock = threading.Lock()
+
+    # Paths
+
+    @staticmethod
+    def valid_id(job_id: str) -> bool:
+        return len(job_id) == 32 and all(c in "0123456789abcdef" for c in job_id)
+
+    def _dir(self, job_id: str) -> str:
+        return os.path.join(self.root, job_id)
+
+    def input_path(self, job_id: str) -> str:
+        return os.path.join(self._dir(job_id), "input.csv")
+
+    def _chunk_path(self, job_id: str, index: int) -> str:
+        return os.path.join(self._dir(job_id), "chunks", f"{index:06d}.ndjson")
+
+    # Metadata
+
+    def meta(self, job_id: str) -> Optional[dict]:
+        if not self.valid_id(job_id):
+            return None
+        try:
+            with open(os.path.join(self._dir(job_id), "meta.json"), encoding="utf-8") as fh:
+                return json.load(fh)
+        except (OSError, ValueError):
+            return None
+
+    def _write_meta(self, meta: dict) -> None:
+        meta["updated_at"] = time.time()
+        path = os.path.join(self._dir(meta["job_id"]), "meta.json")
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as fh:
+            json.dump(meta, fh)
+        os.replace(tmp, path)
+
+    # Lifecycle
+
+    def create(self, src: BinaryIO, chunk_size: int) -> dict:
+        job_id = uuid.uuid4().hex
+        os.makedirs(os.path.join(self._dir(job_id), "chunks"))
+        with open(self.input_path(job_id), "wb") as fh:
+            shutil.copyfileobj(src, fh, 1024 * 1024)
+        meta = {
+            "job_id": job_id, "state": "queued", "chunk_size": chunk_size,
+            "total_rows": None, "rows_done": 0, "chunks_done": 0,
+            "created_at": time.time(), "started_at": None, "finished_at": None, "error": None,
+        }
+        self._write_meta(meta)
+        return meta
+
+    def delete(self, job_id: str) -> bool:
+        if self.meta(job_id) is None:
+            return False
+        shutil.rmtree(self._dir(job_id), ignore_errors=True)
+        return True
+
+    def submit(self, job_id: str, score: ScoreFn) -> None:
+        with self._lock:
+            # Threads don't survive fork: one executor per serving process
+            if self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="ds-job")
+                self._pending = set()
+            self._pending.add(job_id)
+            self._executor.submit(self._run_locked, job_id, score)
+
+    def resume(self, score: ScoreFn) -> List[str]:
+        """Re-submit jobs left queued or running by a previous process."""
+        if not os.path.isdir(self.root):
+            return []
+        resumed = []
+        for job_id in sorted(os.listdir(self.root)):
+            meta = self.meta(job_id)
+            if meta is not None and meta["state"] in ACTIVE_STATES:
+                self.submit(job_id, score)
+                resumed.append(job_id)
+        return resumed
+
+    def reclaim(self, job_id: str, score: ScoreFn) -> bool:
+        """Re-submit an active job that no process holds the lock of (its worker is gone)."""
+        meta = self.meta(job_id)
+        if meta is None or meta["state"] not in ACTIVE_STATES or fcntl is None:
+            return False
+        with self._lock:
+            if self._pid == os.getpid() and job_id in self._pending:
+                return False  # waiting for a free thread here
+        try:
+            with open(os.path.join(self._dir(job_id), "lock"), "a") as lock:
+                # Probe only: released when the file is closed
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            return False  # running in another process, or deleted
+        self.submit(job_id, score)
+        return True
+
+    def _run_locked(self, job_id: str, score: ScoreFn) -> None:
+        try:
+            try:
+                lock = open(os.path.join(self._dir(job_id), "lock"), "a")
+            except OSError:
+                return  # deleted meanwhile
+            with lock:
+                if fcntl is not None:
+                    try:
+                        fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    except OSError:
+                        return  # another worker is already running it
+                self._run(job_id, score)
+        finally:
+            with self._lock:
+                self._pending.discard(job_id)
+
+    def _run(self, job_id: str, score: ScoreFn) -> None:
+        meta = self.meta(job_id)
+        if meta is None or meta["state"] not in ACTIVE_STATES:
+            return
+        chunk_size = meta["chunk_size"]
+        try:
+            # Checkpoint: the chunks already on disk, counted from the start
+            done = 0
+            while os.path.exists(self._chunk_path(job_id, done)):
+                done += 1
+            if meta["total_rows"] is None:
+                with open(self.input_path(job_id), encoding="utf-8-sig", newline="") as fh:
+                    # Same row definition as the scoring loop: DictReader skips blank lines
+                    meta["total_rows"] = sum(1 for _ in csv.DictReader(fh))
+            meta.update(state="running", chunks_done=done,
+                        rows_done=min(done * chunk_size, meta["total_rows"]), error=None)
+            meta["started_at"] = meta["started_at"] or time.time()
+            self._write_meta(meta)
+
+            with open(self.input_path(job_id), encoding="utf-8-sig", newline="") as fh:
+                reader = csv.DictReader(fh)
+                rows = itertools.islice(reader, done * chunk_size, None)
+                while True:
+                    chunk = list(itertools.islice(rows, chunk_size))
+                    if not chunk:
+                        break
+                    items = score(chunk, done * chunk_size)
+                    path = self._chunk_path(job_id, done)
+                    tmp = f"{path}.tmp"
+                    with open(tmp, "w", encoding="utf-8") as out:
+                        for item in items:
+                            out.write(json.dumps(item, ensure_ascii=False))
+                            out.write("\n")
+                    os.replace(tmp, path)
+                    done += 1
+                    meta.update(chunks_done=done, rows_done=meta["rows_done"] + len(chunk))
+                    if self.meta(job_id) is None:
+                        return  # deleted while running
+                    self._write_meta(meta)
+            meta.update(state="done", finished_at=time.time())
+            self._write_meta(meta)
+        except Exception as e:
+            print(f"Job {job_id} failed: {e}")
+            if os.path.isdir(self._dir(job_id)):
+                meta.update(state="failed", error=str(e), finished_at=time.time())
+                self._write_meta(meta)
+
+    # Results
+
+    def iter_items(self, job_id: str, offset: int = 0) -> Iterator[dict]:
+        """Scored rows from `offset` on, in file order, reading only the chunks needed."""
+        meta = self.meta(job_id)
+        if meta is None:
+            return
+        chunk_size = meta["chunk_size"]
+        index, skip = divmod(offset, chunk_size)
+        for i in range(index, meta["chunks_done"]):
+            with open(self._chunk_path(job_id, i), encoding="utf-8") as fh:
+                for line in itertools.islice(fh, skip if i == index else 0, None):
+                    yield json.loads(line)
+
+    def page(self, job_id: str, offset: int, limit: int) -> List[dict]:
+        return list(itertools.islice(self.iter_items(job_id, offset), limit))
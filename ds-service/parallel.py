@@ -0,0 +1,271 @@
+"""Multi-process scoring of large canonical CSVs through shared-memory shards.
+
+The parent only slices the input into shards of whole lines and copies each one into a
+`multiprocessing.shared_memory` block. Every worker process loads the model once (pool
+initializer), then parses, validates, encodes and scores its shard with the same code as
+/predict/csv and writes the formatted result lines into a shared-memory block of its own.
+The parent copies those back out in input order, so the output is byte-for-byte what the
+single-process path produces. At most `2 x workers` shards are in flight, which bounds the
+memory of the parent and of every worker by the shard size.
+
+    python parallel.py --csv big.csv --out scored.csv --workers 32
+    python parallel.py --csv big.csv --format ndjson --shard-rows 50000 > scored.ndjson
+
+The service uses it for /predict/csv when DS_PARALLEL_WORKERS > 0.
+Records must be one per line (the canonical CSV never quotes newlines).
+"""
+import os
+import io
+import sys
+import csv
+import time
+import argparse
+import threading
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from contextlib import redirect_stdout
+from multiprocessing import get_context, shared_memory, util
+from typing import BinaryIO, Deque, Iterator, List, Optional, Tuple
+
+DEFAULT_SHARD_ROWS = int(os.getenv("DS_SHARD_ROWS", "20000"))
+FORMATS = ("csv", "ndjson")
+
+
+class MissingColumnsError(ValueError):
+    def __init__(self, missing: List[str]):
+        super().__init__(f"Faltan columnas canónicas en el CSV: {', '.join(missing)}")
+        self.missing = missing
+
+
+# Inside a worker: the service module, imported (and its model loaded) by _init_worker
+_core = None
+
+
+def _init_worker(artifact: Optional[str], version: Optional[str]) -> None:
+    global _core
+    # One single-threaded process per core
+    os.environ.setdefault("OMP_NUM_THREADS", "1")
+    os.environ.setdefault("DS_XGB_THREADS", "1")
+    os.environ["DS_STARTUP"] = "sync"
+    os.environ["DS_CACHE_SIZE"] = "0"
+    if version:
+        os.environ["CHURN_MODEL_VERSION"] = version
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        # Inherited from the service: remove this process's live gauge files when it exits, like
+        # Gunicorn's child_exit does for its workers (its counters stay in the totals)
+        util.Finalize(None, _mark_dead, args=(os.getpid(),), exitpriority=10)
+    with redirect_stdout(sys.stderr):
+        import app
+        app.wait_until_ready()
+        # Same artifact as the parent's bundle when that is not the default one
+        if artifact and artifact != app.V2_ARTIFACT:
+            app._swap_bundle(app.build_bundle(artifact=artifact, version=version))
+    _core = app
+
+
+def _mark_dead(pid: int) -> None:
+    try:
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(pid)
+    except ImportError:
+        pass
+
+
+def _score_shard(name: str, size: int, header: bytes, first_row: int, fmt: str) -> Tuple[str, int, int, int]:
+    """Score one shard; returns (result block name, result size, rows, rejected rows)."""
+    app = _core
+    shm = shared_memory.SharedMemory(name=name)
+    try:
+        text = (header + bytes(shm.buf[:size])).decode("utf-8-sig")
+    finally:
+        shm.close()
+    rows = [app._normalize_features(r) for r in csv.DictReader(io.StringIO(text, newline=""))]
+    bundle = app.current_bundle()
+    outs, errors = app.score_valid(rows, bundle)
+    items = app.row_items(outs, errors, bundle.version, first_row)
+    if fmt == "csv":
+        buf = io.StringIO()
+        writer = csv.writer(buf)
+        for item in items:
+            writer.writerow(app._csv_result_row(item["row"], item))
+        data = buf.getvalue().encode("utf-8")
+    else:
+        data = "".join(app.json.dumps(item, ensure_ascii=False) + "\n" for item in items).encode("utf-8")
+    out = shared_memory.SharedMemory(create=True, size=max(1, len(data)))
+    out.buf[:len(data)] = data
+    out.close()
+    return out.name, len(data), len(rows), len(errors)
+
+
+def iter_shards(src: BinaryIO, shard_rows: int) -> Iterator[Tuple[bytes, int]]:
+    """(raw lines, row count) for consecutive shards of `shard_rows` records."""
+    lines: List[bytes] = []
+    for line in src:
+        if not line.strip():
+            continue
+        lines.append(line if line.endswith(b"\n") else line + b"\n")
+        if len(lines) >= shard_rows:
+            yield b"".join(lines), len(lines)
+            lines = []
+    if lines:
+        yield b"".join(lines), len(lines)
+
+
+def _to_shared(data: bytes) -> shared_memory.SharedMemory:
+    shm = shared_memory.SharedMemory(create=True, size=max(1, len(data)))
+    shm.buf[:len(data)] = data
+    return shm
+
+
+def _take(name: str, size: int) -> bytes:
+    shm = shared_memory.SharedMemory(name=name)
+    try:
+        return bytes(shm.buf[:size])
+    finally:
+        shm.close()
+        shm.unlink()
+
+
+class ParallelScorer:
+    """Process pool that scores canonical CSV shards; one model load per worker."""
+
+    def __init__(self, workers: int, shard_rows: int = DEFAULT_SHARD_ROWS, artifact: Optional[str] = None,
+                 version: Optional[str] = None, start_method: Optional[str] = None):
+        self.workers = max(1, workers)
+        self.shard_rows = max(1, shard_rows)
+        self.artifact = artifact
+        self.version = version
+        # spawn: workers never inherit the parent's threads or locks (Gunicorn workers are threaded)
+        self._context = get_context(start_method or os.getenv("DS_PARALLEL_START", "spawn"))
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._active = 0
+        self._retired = False
+
+    def start(self) -> None:
+        with self._lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(self.workers, mp_context=self._context, initializer=_init_worker,
+                                                 initargs=(self.artifact, self.version))
+
+    def shutdown(self) -> None:
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=True, cancel_futures=True)
+
+    def retire(self) -> None:
+        """Stop the workers once the runs already streaming on them have finished."""
+        with self._lock:
+            self._retired = True
+            idle = self._active == 0
+        if idle:
+            self.shutdown()
+
+    def score_csv(self, src: BinaryIO, fmt: str = "csv", stats: Optional[dict] = None) -> Iterator[bytes]:
+        """Result bytes (header first for CSV) in input order; MissingColumnsError on a bad header.
+
+        `stats`, when given, receives the running "rows" and "rejected" counts.
+        """
+        import app
+        if fmt not in FORMATS:
+            raise ValueError(f"Formato no soportado: {fmt}")
+        header = src.readline()
+        fieldnames = next(csv.reader([header.decode("utf-8-sig")]), [])
+        missing = [c for c in app.CANONICAL_FIELDS if c not in fieldnames]
+        if missing:
+            raise MissingColumnsError(missing)
+        self.start()
+        stats = stats if stats is not None else {}
+        stats.update(rows=0, rejected=0)
+        with self._lock:
+            pool = self._pool
+            self._active += 1
+        if fmt == "csv":
+            buf = io.StringIO()
+            csv.writer(buf).writerow(app.CSV_RESULT_COLUMNS)
+            yield buf.getvalue().encode("utf-8")
+
+        pending: Deque[Tuple[Future, shared_memory.SharedMemory]] = deque()
+        first_row = 0
+        try:
+            for data, count in iter_shards(src, self.shard_rows):
+                shm = _to_shared(data)
+                pending.append((pool.submit(_score_shard, shm.name, len(data), header, first_row, fmt), shm))
+                first_row += count
+                # Bounded in-flight work: wait for the oldest shard before reading more
+                while len(pending) >= 2 * self.workers:
+                    yield _collect(pending.popleft(), stats)
+            while pending:
+                yield _collect(pending.popleft(), stats)
+        finally:
+            # Consumer gone early (e.g. the client disconnected): shards already running still
+            # create a result block, which nobody will _take, so unlink it when they finish
+            for future, shm in pending:
+                if not future.cancel():
+                    future.add_done_callback(_discard)
+                shm.close()
+                shm.unlink()
+            with self._lock:
+                self._active -= 1
+                idle = self._retired and self._active == 0
+            if idle:
+                self.shutdown()
+
+
+def _discard(future: Future) -> None:
+    if future.cancelled() or future.exception() is not None:
+        return
+    name = future.result()[0]
+    try:
+        shm = shared_memory.SharedMemory(name=name)
+    except FileNotFoundError:
+        return
+    shm.close()
+    shm.unlink()
+
+
+def _collect(entry: Tuple[Future, shared_memory.SharedMemory], stats: dict) -> bytes:
+    future, shm = entry
+    try:
+        name, size, rows, rejected = future.result()
+    finally:
+        shm.close()
+        shm.unlink()
+    stats["rows"] += rows
+    stats["rejected"] += rejected
+    return _take(name, size)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Score a large canonical CSV on every core")
+    parser.add_argument("--csv", required=True, help="Canonical CSV to score")
+    parser.add_argument("--out", default=None, help="Write the results here (default: stdout)")
+    parser.add_argument("--format", choices=FORMATS, default="csv")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--shard-rows", type=int, default=DEFAULT_SHARD_ROWS, help="Rows per shard")
+    parser.add_argument("--artifact", default=None, help="Model artifact in CHURN_MODEL_DIR (default: v2)")
+    parser.add_argument("--version", default=None, help="model_version to report")
+    args = parser.parse_args(argv)
+
+    scorer = ParallelScorer(args.workers, args.shard_rows, args.artifact, args.version)
+    stats: dict = {}
+    started = time.perf_counter()
+    out = open(args.out, "wb") if args.out else sys.stdout.buffer
+    # The service logs with print(); keep stdout for the results
+    with redirect_stdout(sys.stderr):
+        try:
+            with open(args.csv, "rb") as src:
+                for chunk in scorer.score_csv(src, args.format, stats):
+                    out.write(chunk)
+        finally:
+            if args.out:
+                out.close()
+            scorer.shutdown()
+    elapsed = time.perf_counter() - started
+    print(f"Scored {stats['rows']} rows ({stats['rejected']} rejected) with {scorer.workers} workers "
+          f"in {elapsed:.2f}s ({stats['rows'] / elapsed:,.0f} rows/s)", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""Canonical input schema of the DS service, checked a whole batch at a time.
+
+Same rules as the API's ChurnRequest (README, "Validación de entrada"): case-sensitive
+enums, SeniorCitizen 0|1, tenure integer >= 0, charges >= 0 without currency symbols.
+TotalCharges null/blank is normalized to 0.0 before validation (option A).
+
+`SCHEMA.validate(rows)` checks column by column: enums by set membership, numerics parsed
+into one float array and range-checked with NumPy. It returns a boolean mask of valid rows
+and an error map {row: {field: message}} that only holds the rows that failed.
+"""
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+YES_NO = ("Yes", "No")
+SERVICE = ("Yes", "No", "No internet service")
+
+ENUMS: Dict[str, Tuple[str, ...]] = {
+    "gender": ("Male", "Female"),
+    "Partner": YES_NO,
+    "Dependents": YES_NO,
+    "PhoneService": YES_NO,
+    "MultipleLines": ("No", "Yes", "No phone service"),
+    "InternetService": ("DSL", "Fiber optic", "No"),
+    "OnlineSecurity": SERVICE,
+    "OnlineBackup": SERVICE,
+    "DeviceProtection": SERVICE,
+    "TechSupport": SERVICE,
+    "StreamingTV": SERVICE,
+    "StreamingMovies": SERVICE,
+    "Contract": ("Month-to-month", "One year", "Two year"),
+    "PaperlessBilling": YES_NO,
+    "PaymentMethod": ("Electronic check", "Mailed check", "Bank transfer (automatic)", "Credit card (automatic)"),
+}
+
+# field -> (minimum, maximum or None, integer only, message)
+NUMBERS: Dict[str, Tuple[float, Optional[float], bool, str]] = {
+    "SeniorCitizen": (0, 1, True, "SeniorCitizen debe ser 0 o 1"),
+    "tenure": (0, None, True, "tenure debe ser un entero ≥ 0"),
+    "MonthlyCharges": (0.0, None, False, "MonthlyCharges debe ser número ≥ 0 sin símbolos"),
+    "TotalCharges": (0.0, None, False, "TotalCharges debe ser número ≥ 0 sin símbolos"),
+}
+
+
+def _enum_message(field: str, allowed: Sequence[str]) -> str:
+    # Same wording as the API's @Pattern messages
+    if len(allowed) == 2:
+        return f"{field} debe ser '{allowed[0]}' o '{allowed[1]}'"
+    return f"{field} valores: " + ",".join(f"'{v}'" for v in allowed)
+
+
+def _missing(values: list) -> np.ndarray:
+    return np.fromiter((v is None or v == "" for v in values), dtype=bool, count=len(values))
+
+
+def _parse_numbers(values: list) -> np.ndarray:
+    """Column as floats; missing or unparseable entries (and booleans) become NaN."""
+    try:
+        # Fast path: numbers and numeric strings in one conversion (None -> NaN)
+        if bool not in set(map(type, values)):
+            return np.array(values, dtype=np.float64)
+    except (TypeError, ValueError):
+        pass
+    out = np.full(len(values), np.nan)
+    for i, v in enumerate(values):
+        if v is None or v == "" or type(v) is bool:
+            continue
+        try:
+            out[i] = float(v)
+        except (TypeError, ValueError):
+            pass
+    return out
+
+
+def _members(values: list, allowed: frozenset) -> np.ndarray:
+    # Only a str can equal one of the allowed strings, so membership alone is exact
+    try:
+        return np.fromiter(map(allowed.__contains__, values), dtype=bool, count=len(values))
+    except TypeError:  # unhashable values (lists, objects) in the column
+        return np.fromiter((type(v) is str and v in allowed for v in values), dtype=bool, count=len(values))
+
+
+class BatchValidator:
+    """Schema compiled into one check per column; see the module docstring."""
+
+    def __init__(self, enums: Dict[str, Tuple[str, ...]], numbers: Dict[str, Tuple[float, Optional[float], bool, str]]):
+        self.enums = [(field, frozenset(allowed), _enum_message(field, allowed)) for field, allowed in enums.items()]
+        self.numbers = list(numbers.items())
+
+    def _reject(self, errors: Dict[int, Dict[str, str]], valid: np.ndarray, bad: np.ndarray, field: str,
+                message: str, missing: Optional[np.ndarray] = None) -> None:
+        for i in np.flatnonzero(bad).tolist():
+            errors.setdefault(i, {})[field] = (f"{field} es obligatorio"
+                                               if missing is not None and missing[i] else message)
+        valid &= ~bad
+
+    def validate(self, rows: List[dict]) -> Tuple[np.ndarray, Dict[int, Dict[str, str]]]:
+        n = len(rows)
+        valid = np.ones(n, dtype=bool)
+        errors: Dict[int, Dict[str, str]] = {}
+        for field, allowed, message in self.enums:
+            column = [r.get(field) for r in rows]
+            ok = _members(column, allowed)
+            if not ok.all():
+                self._reject(errors, valid, ~ok, field, message, _missing(column))
+        for field, (low, high, integer, message) in self.numbers:
+            column = [r.get(field) for r in rows]
+            x = _parse_numbers(column)
+            with np.errstate(invalid="ignore"):
+                bad = ~np.isfinite(x) | (x < low)
+                if high is not None:
+                    bad |= x > high
+                if integer:
+                    bad |= x != np.floor(x)
+            if bad.any():
+                self._reject(errors, valid, bad, field, message, _missing(column))
+        return valid, errors
+
+
+SCHEMA = BatchValidator(ENUMS, NUMBERS)
@@ -0,0 +1,39 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SERVICE_DIR = os.path.dirname(HERE)
+
+# Set before the app module is imported: it reads its configuration at import time
+os.environ.setdefault("CHURN_MODEL_DIR", os.path.join(SERVICE_DIR, "..", "models"))
+os.environ.setdefault("DS_STARTUP", "sync")
+os.environ.setdefault("DS_JOBS_DIR", tempfile.mkdtemp(prefix="ds-jobs-test-"))
+os.environ.setdefault("DS_ADMIN_TOKEN", "test-token")
+sys.path.insert(0, SERVICE_DIR)
+
+
+@pytest.fixture(scope="session")
+def ds_app():
+    import app
+    app.wait_until_ready()
+    return app
+
+
+@pytest.fixture
+def client(ds_app):
+    return ds_app.app.test_client()
+
+
+@pytest.fixture
+def valid_row():
+    return {
+        "gender": "Female", "SeniorCitizen": 0, "Partner": "Yes", "Dependents": "No", "tenure": 12,
+        "PhoneService": "Yes", "MultipleLines": "No", "InternetService": "Fiber optic",
+        "OnlineSecurity": "No", "OnlineBackup": "No", "DeviceProtection": "No", "TechSupport": "No",
+        "StreamingTV": "No", "StreamingMovies": "No", "Contract": "Month-to-month",
+        "PaperlessBilling": "Yes", "PaymentMethod": "Electronic check",
+        "MonthlyCharges": 70.35, "TotalCharges": 844.2,
+    }
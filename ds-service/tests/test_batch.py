@@ -0,0 +1,20 @@
+import pytest
+
+
+@pytest.mark.parametrize("payload", [{"items": []}, {"features": []}, []])
+def test_empty_batch_returns_empty_result(client, payload):
+    resp = client.post("/predict/batch", json=payload)
+    assert resp.status_code == 200
+    assert resp.get_json() == {"items": [], "total": 0, "cancelaciones": 0, "rejected": 0, "errors": {}}
+
+
+@pytest.mark.parametrize("payload", [{"items": None}, {"items": [1, 2]}, {"other": []}])
+def test_malformed_batch_is_rejected(client, payload):
+    assert client.post("/predict/batch", json=payload).status_code == 400
+
+
+def test_items_and_bare_list_score_the_same(client, valid_row):
+    wrapped = client.post("/predict/batch", json={"items": [valid_row, valid_row]}).get_json()
+    bare = client.post("/predict/batch", json=[valid_row, valid_row]).get_json()
+    assert wrapped["total"] == bare["total"] == 2
+    assert [it["probabilidad"] for it in wrapped["items"]] == [it["probabilidad"] for it in bare["items"]]
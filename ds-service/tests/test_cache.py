@@ -0,0 +1,42 @@
+import pytest
+
+
+@pytest.fixture
+def cache(ds_app):
+    ds_app.PREDICTION_CACHE.clear()
+    yield ds_app.PREDICTION_CACHE
+    ds_app.PREDICTION_CACHE.clear()
+
+
+def test_model_scores_are_cached(ds_app, cache, valid_row):
+    bundle = ds_app.current_bundle()
+    first = ds_app.score_batch([valid_row], bundle)
+    hits = cache.hits
+    assert ds_app.score_batch([valid_row], bundle) == first
+    assert cache.hits == hits + 1
+
+
+def test_heuristic_fallback_is_not_cached(ds_app, cache, valid_row, monkeypatch):
+    bundle = ds_app.current_bundle()
+    # The model fails for every row: all of them are scored by the heuristic
+    monkeypatch.setattr(ds_app, "predict_batch_with_model", lambda rows, bundle: None)
+    fallback = ds_app.score_batch([valid_row], bundle)
+    assert fallback == [ds_app.heuristic_score(valid_row)]
+    assert len(cache) == 0
+    monkeypatch.undo()
+    assert ds_app.score_batch([valid_row], bundle) == ds_app.predict_batch_with_model([valid_row], bundle)
+
+
+def test_reload_invalidates_cache_with_same_version(ds_app, cache, valid_row):
+    old = ds_app.current_bundle()
+    ds_app.score_batch([valid_row], old)
+    assert len(cache) == 1
+    ok, _ = ds_app.reload_model(version=old.version)
+    assert ok
+    new = ds_app.current_bundle()
+    assert new.version == old.version and new.generation != old.generation
+    assert len(cache) == 0
+    # A request still running on the old bundle refills the cache after the swap
+    stale = ("No va a cancelar", 0.0, ["stale"])
+    cache.put(cache.key(valid_row, old.generation), stale)
+    assert ds_app.score_batch([valid_row], new) != [stale]
@@ -0,0 +1,64 @@
+"""BatchResults from dashboard/app.py: the page itself needs a live API, so only the
+definitions above the page body are loaded."""
+import os
+
+import pytest
+
+pytest.importorskip("streamlit")
+pytest.importorskip("pyarrow")
+
+DASHBOARD = os.path.join(os.path.dirname(__file__), "..", "..", "dashboard", "app.py")
+PAGE_START = "\napi_url = get_api_base_url()"
+
+
+@pytest.fixture(scope="module")
+def dashboard():
+    with open(DASHBOARD, encoding="utf-8") as fh:
+        source = fh.read()
+    ns = {"__name__": "dashboard_app", "__file__": DASHBOARD}
+    exec(compile(source[:source.index(PAGE_START)], DASHBOARD, "exec"), ns)
+    return ns
+
+
+def _item(risk="Alto", prob=0.8, top=("Contract", "tenure")):
+    return {"prevision": "Va a cancelar", "probabilidad": prob,
+            "prediction": {"risk_level": risk, "will_churn": 1, "confidence_score": prob},
+            "business_logic": {"suggested_action": "Contactar"}, "topFeatures": list(top),
+            "metadata": {"model_version": "v2.0"}}
+
+
+REJECTED = {"errors": {"tenure": "tenure debe ser un entero ≥ 0"}}
+REJECTED_TEXT = "tenure: tenure debe ser un entero ≥ 0"
+
+
+@pytest.fixture(params=["parquet", "frames"])
+def results(request, dashboard):
+    results = dashboard["BatchResults"]()
+    if request.param == "frames":
+        results.dir = None
+    return results
+
+
+def test_round_trip_with_all_rejected_chunk(dashboard, results):
+    to_frame = dashboard["items_to_frame"]
+    results.put(0, to_frame([_item(), _item("Bajo", 0.1)], 0))
+    results.put(1, to_frame([REJECTED] * 2, 2))
+    df = results.load()
+    assert df["row"].tolist() == [0, 1, 2, 3]
+    assert df["errors"].tolist()[2:] == [REJECTED_TEXT] * 2
+    assert df["probabilidad"].isna().tolist() == [False, False, True, True]
+    assert results.risk_levels() == ["Alto", "Bajo"]
+    assert results.load(["Alto"])["row"].tolist() == [0]
+
+
+def test_round_trip_with_many_distinct_top_features(dashboard, results):
+    to_frame = dashboard["items_to_frame"]
+    # A narrow dictionary index first, then one that needs more than int8
+    results.put(0, to_frame([_item(top=("Contract",))], 0))
+    results.put(1, to_frame([_item(top=(f"f{i}",)) for i in range(200)], 1))
+    df = results.load(sort="desc")
+    assert len(df) == 201
+    assert set(df["top_features"].astype(str)) == {f"f{i}" for i in range(200)} | {"Contract"}
+    header = results.csv_file().readline().decode("utf-8").strip().split(",")
+    assert header[:3] == ["row", "prevision", "probabilidad"]
+
@@ -0,0 +1,47 @@
+import numpy as np
+
+from evaluate import evaluate_scores
+
+
+def _csv(fields, rows):
+    lines = [",".join(fields + ["Churn"])]
+    lines += [",".join(str(r[f]) for f in fields) + "," + r["Churn"] for r in rows]
+    return ("\n".join(lines) + "\n").encode("utf-8")
+
+
+def test_evaluate_scores_empty_input_has_zeroed_counts():
+    report = evaluate_scores(np.zeros(0, dtype=bool), np.zeros(0), thresholds=[0.3, 0.5])
+    assert report["total"] == 0
+    assert report["roc_auc"] is None and report["brier"] is None
+    assert [(r["tp"], r["fp"], r["fn"], r["tn"]) for r in report["thresholds"]] == [(0, 0, 0, 0)] * 2
+
+
+def test_evaluate_scores_counts_at_thresholds():
+    y = [True, False, True, False]
+    p = [0.9, 0.6, 0.4, 0.1]
+    report = evaluate_scores(y, p, thresholds=[0.5])
+    row = report["thresholds"][0]
+    assert (row["tp"], row["fp"], row["fn"], row["tn"]) == (1, 1, 1, 1)
+    assert report["roc_auc"] == 0.75
+
+
+def test_evaluate_endpoint_header_only(client, ds_app):
+    resp = client.post("/evaluate", data=_csv(ds_app.CANONICAL_FIELDS, []), content_type="text/csv")
+    assert resp.status_code == 200
+    body = resp.get_json()
+    assert body["total"] == 0 and body["rejected"] == 0
+
+
+def test_evaluate_endpoint_all_rows_rejected(client, ds_app, valid_row):
+    bad = dict(valid_row, tenure=-1, Churn="Yes")
+    resp = client.post("/evaluate", data=_csv(ds_app.CANONICAL_FIELDS, [bad, bad]), content_type="text/csv")
+    assert resp.status_code == 200
+    body = resp.get_json()
+    assert body["total"] == 0 and body["rejected"] == 2
+    assert "tenure" in body["errors"]["0"]
+
+
+def test_evaluate_endpoint_without_label_column(client, ds_app, valid_row):
+    data = (",".join(ds_app.CANONICAL_FIELDS) + "\n").encode("utf-8")
+    resp = client.post("/evaluate", data=data, content_type="text/csv")
+    assert resp.status_code == 400
@@ -0,0 +1,43 @@
+import fcntl
+import io
+import os
+import time
+
+
+def _csv(ds_app, rows):
+    lines = [",".join(ds_app.CANONICAL_FIELDS)]
+    lines += [",".join(str(r[f]) for f in ds_app.CANONICAL_FIELDS) for r in rows]
+    return io.BytesIO(("\n".join(lines) + "\n").encode("utf-8"))
+
+
+def _stranded_job(ds_app, valid_row):
+    # As left by a worker recycled mid-run: state running, nobody holding the lock
+    meta = ds_app.JOBS.create(_csv(ds_app, [valid_row] * 5), 2)
+    meta.update(state="running", total_rows=5, started_at=time.time())
+    ds_app.JOBS._write_meta(meta)
+    return meta["job_id"]
+
+
+def _wait_done(client, job_id, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        body = client.get(f"/jobs/{job_id}").get_json()
+        if body["state"] == "done":
+            return body
+        time.sleep(0.05)
+    raise AssertionError(f"job {job_id} did not finish: {body}")
+
+
+def test_status_poll_resumes_stranded_job(client, ds_app, valid_row):
+    job_id = _stranded_job(ds_app, valid_row)
+    body = _wait_done(client, job_id)
+    assert body["rows_done"] == 5 and body["progress"] == 1.0
+    assert len(ds_app.JOBS.page(job_id, 0, 10)) == 5
+
+
+def test_job_locked_by_another_process_is_not_reclaimed(ds_app, valid_row):
+    job_id = _stranded_job(ds_app, valid_row)
+    with open(os.path.join(ds_app.JOBS_DIR, job_id, "lock"), "a") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        assert not ds_app.JOBS.reclaim(job_id, ds_app._score_job_chunk)
+    assert ds_app.JOBS.reclaim(job_id, ds_app._score_job_chunk)
@@ -0,0 +1,23 @@
+def test_predict_scores_invalid_row_by_default(client, valid_row):
+    resp = client.post("/predict", json=dict(valid_row, tenure=-1))
+    assert resp.status_code == 200
+    assert "probabilidad" in resp.get_json()
+
+
+def test_predict_strict_rejects_invalid_row(client, ds_app, valid_row, monkeypatch):
+    monkeypatch.setattr(ds_app, "STRICT_PREDICT", True)
+    resp = client.post("/predict", json=dict(valid_row, tenure=-1, gender="female"))
+    assert resp.status_code == 400
+    body = resp.get_json()
+    assert body["error"] == ds_app.INVALID_INPUT_ERROR
+    assert set(body["errors"]) == {"tenure", "gender"}
+    assert client.post("/predict", json=valid_row).status_code == 200
+
+
+def test_batch_rejects_only_invalid_rows(client, valid_row):
+    resp = client.post("/predict/batch", json={"items": [valid_row, dict(valid_row, SeniorCitizen=2)]})
+    assert resp.status_code == 200
+    body = resp.get_json()
+    assert body["total"] == 1 and body["rejected"] == 1
+    assert [it["row"] for it in body["items"]] == [0]
+    assert "SeniorCitizen" in body["errors"]["1"]
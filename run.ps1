@@ -107,8 +107,8 @@ if ($Build) {
 }
 Compose -Docker $docker -ComposeFile $composeFile -CommandArgs $composeArgs
 
-Write-Host "Waiting for DS health (http://127.0.0.1:8000/health)..." -ForegroundColor Cyan
-$ds = Wait-HttpOk -Url "http://localhost:8000/health"
+Write-Host "Waiting for DS readiness (http://127.0.0.1:8000/health/ready)..." -ForegroundColor Cyan
+$ds = Wait-HttpOk -Url "http://localhost:8000/health/ready"
 Write-Host "DS status: $($ds.status)" -ForegroundColor Green
 
 Write-Host "Waiting for API TCP readiness (localhost:8080)..." -ForegroundColor Cyan